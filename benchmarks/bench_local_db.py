@@ -0,0 +1,132 @@
+# benchmarks/bench_local_db.py
+"""
+File: bench_local_db.py
+Description:
+  Times the local SQLite hot paths (permission lookups, pending-request checks, session
+  start/end and backlog scans) on a synthetic database, first with the original v1 schema
+  and default pragmas, then after the migrations and connection tuning in create_local_db.
+  Usage: python -m benchmarks.bench_local_db [--users N] [--requests N] [--sessions N] [--iterations N]
+"""
+
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from create_local_db import MIGRATIONS, configure_connection, migrate
+
+MACHINE_IDS = [f"M{n:03d}" for n in range(40)]
+
+
+def populate(conn, users, requests, sessions):
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO Users (csu_id, uid, name) VALUES (?, ?, ?)",
+        ((str(800000000 + n), f"{n:08X}", f"User {n}") for n in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO Machine (machine_id, machine_type, machine_name) VALUES (?, ?, ?)",
+        ((m, "mill", m) for m in MACHINE_IDS)
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO Machine_Permissions (csu_id, machine_id, permission_status) VALUES (?, ?, 'active')",
+        ((str(800000000 + rng.randrange(users)), rng.choice(MACHINE_IDS)) for _ in range(users * 4))
+    )
+    conn.executemany(
+        "INSERT INTO Access_Requests (csu_id, machine_id, status, synced) VALUES (?, ?, ?, ?)",
+        ((str(800000000 + rng.randrange(users)), rng.choice(MACHINE_IDS),
+          rng.choice(["approved", "denied", "under review"]), 1) for _ in range(requests))
+    )
+    conn.executemany(
+        "INSERT INTO Machine_Usage (session_id, csu_id, machine_id, start_time, end_time, synced) "
+        "VALUES (?, ?, ?, '2025-01-01 08:00:00', '2025-01-01 09:00:00', 1)",
+        ((f"S{n}", str(800000000 + rng.randrange(users)), rng.choice(MACHINE_IDS)) for n in range(sessions))
+    )
+    conn.commit()
+
+
+def run_queries(conn, users, sessions, iterations):
+    rng = random.Random(7)
+    timings = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        timings[name] = (time.perf_counter() - start) / iterations * 1000
+
+    def csu():
+        return str(800000000 + rng.randrange(users))
+
+    timed("permission lookup", lambda: conn.execute(
+        "SELECT 1 FROM Machine_Permissions WHERE csu_id = ? AND machine_id = ?", (csu(), rng.choice(MACHINE_IDS))
+    ).fetchone())
+    timed("permitted ids for machine", lambda: conn.execute(
+        "SELECT csu_id FROM Machine_Permissions WHERE machine_id = ?", (rng.choice(MACHINE_IDS),)
+    ).fetchall())
+    timed("pending request check", lambda: conn.execute(
+        "SELECT 1 FROM Access_Requests WHERE csu_id = ? AND machine_id = ? AND status = 'under review'",
+        (csu(), rng.choice(MACHINE_IDS))
+    ).fetchone())
+    timed("unsynced requests scan", lambda: conn.execute(
+        "SELECT rowid FROM Access_Requests WHERE synced = 0 LIMIT 200"
+    ).fetchall())
+    timed("unsynced sessions scan", lambda: conn.execute(
+        "SELECT rowid FROM Machine_Usage WHERE synced = 0 AND end_time IS NOT NULL LIMIT 200"
+    ).fetchall())
+
+    def session_cycle():
+        session_id = f"B{rng.randrange(1 << 30)}"
+        conn.execute(
+            "INSERT INTO Machine_Usage (session_id, csu_id, machine_id, start_time) VALUES (?, ?, ?, datetime('now'))",
+            (session_id, csu(), MACHINE_IDS[0])
+        )
+        conn.commit()
+        conn.execute(
+            "UPDATE Machine_Usage SET end_time = datetime('now') WHERE session_id = ?", (session_id,)
+        )
+        conn.commit()
+
+    timed("session start+end", session_cycle)
+    return timings
+
+
+def bench(tuned, args):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        if tuned:
+            configure_connection(conn)
+            migrate(conn)
+        else:
+            MIGRATIONS[0][2](conn)
+        populate(conn, args.users, args.requests, args.sessions)
+        timings = run_queries(conn, args.users, args.sessions, args.iterations)
+        conn.close()
+        return timings
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SQLite hot-path benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    before = bench(False, args)
+    after = bench(True, args)
+    print(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<28}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
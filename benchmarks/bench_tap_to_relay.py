@@ -0,0 +1,216 @@
+# benchmarks/bench_tap_to_relay.py
+"""
+File: bench_tap_to_relay.py
+Description:
+  End-to-end benchmark of a card tap: RFIDReader.check_presence -> validate_card -> start_session
+  -> LCD render -> force_end_session -> outbox push to Azure. Runs the real station code on
+  the simulated hardware backend, against a local SQLite dataset of configurable size and
+  the MySQL stand-in with injected round-trip latency. Uploaded sessions are deleted locally,
+  so Machine_Usage starts as an offline backlog of recent unsynced sessions, which is
+  uploaded (and timed) before the taps. Reports p50/p95/p99 per phase and exits non-zero
+  when a --budget is exceeded, so CI can catch regressions.
+  Usage: python -m benchmarks.bench_tap_to_relay [--users 50000] [--usage-rows 5000] [--iterations 200]
+         python -m benchmarks.bench_tap_to_relay --quick --budget tap_to_relay=150 --budget validate=20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import atexit
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ["read", "validate", "validate_denied", "tap_to_relay", "start_session", "lcd", "end_session", "azure_push"]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def card_uid(csu_id):
+    # Users.uid as the reader computes it for the simulated card of csu_id
+    from hal.sim_mfrc522 import SimCard
+    num = 0
+    for byte in SimCard(csu_id).uid:
+        num = num * 256 + byte
+    return str(num)
+
+
+def populate(db, machine_id, users, usage_rows, permitted_ratio, known_uid_ratio, seed=1):
+    rng = random.Random(seed)
+    csu_ids = [str(830000000 + n) for n in range(users)]
+    permitted = set(rng.sample(csu_ids, int(users * permitted_ratio)))
+    other_machines = [f"bench-{n}" for n in range(20)]
+    now = datetime.now()
+    with db.transaction():
+        db.cursor.executemany(
+            "INSERT INTO Users (csu_id, uid, name) VALUES (?, ?, ?)",
+            ((csu_id, card_uid(csu_id) if rng.random() < known_uid_ratio else None, f"User {csu_id}") for csu_id in csu_ids)
+        )
+        db.cursor.executemany(
+            "INSERT OR IGNORE INTO Machine_Permissions (csu_id, machine_id, permission_status) VALUES (?, ?, 'active')",
+            [(csu_id, machine_id) for csu_id in permitted]
+            + [(rng.choice(csu_ids), rng.choice(other_machines)) for _ in range(users)]
+        )
+        # Sessions from the last three days of an offline stretch, ended but not yet uploaded
+        starts = (now - timedelta(minutes=rng.randrange(60, 3 * 24 * 60)) for _ in range(usage_rows))
+        db.cursor.executemany(
+            "INSERT INTO Machine_Usage (session_id, csu_id, machine_id, start_time, end_time, duration, synced) "
+            "VALUES (?, ?, ?, ?, ?, 60, 0)",
+            (
+                (f"backlog-{n}", rng.choice(csu_ids), machine_id,
+                 start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"))
+                for n, start in enumerate(starts)
+            )
+        )
+    return csu_ids, permitted
+
+
+def run(args):
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.mkdtemp(prefix="emec-bench-")
+    atexit.register(shutil.rmtree, workdir, True)
+    os.chdir(workdir)
+    os.makedirs("data", exist_ok=True)
+    logging.basicConfig(level=logging.WARNING)
+
+    from utils import hardware
+    hardware.set_backend(hardware.BACKEND_SIM)
+
+    from config.constants import MACHINE_ID, RELAY_PIN
+    from db import azure_sync
+    from db.azure_pool import AzureConnectionPool
+    from db.local_db import get_local_db
+    from db.auth_cache import auth_cache
+    from db.outbox import OutboxWorker
+    from rfid.validator import validate_card
+    from relay.session_manager import SessionManager
+    from benchmarks.mysql_standin import MySQLStandIn
+
+    server = MySQLStandIn(rtt=args.rtt_ms / 1000)
+    azure_sync.azure_pool = AzureConnectionPool(server.connect)
+
+    db = get_local_db()
+    db.insert_machine_if_missing(MACHINE_ID, "Bench", "bench")
+    start = time.perf_counter()
+    csu_ids, permitted = populate(db, MACHINE_ID, args.users, args.usage_rows, 1 - args.deny_ratio, args.known_uid_ratio)
+    print(f"Dataset: {args.users} users, {args.usage_rows} backlog sessions in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    azure_sync.push_session_backlog()
+    print(f"Backlog upload: {args.usage_rows} sessions in {time.perf_counter() - start:.2f}s, {server.round_trips} round trips")
+
+    start = time.perf_counter()
+    auth_cache.rebuild()
+    print(f"Auth cache warm-up: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    field = hardware.get("mfrc522")
+    reader = hardware.get_reader()
+    gpio = hardware.get_gpio()
+    lcd = hardware.get_lcd()
+    session_mgr = SessionManager()
+    outbox = OutboxWorker()
+    rng = random.Random(args.seed)
+    allowed, denied = sorted(permitted), sorted(set(csu_ids) - permitted)
+    timings = {phase: [] for phase in PHASES}
+
+    def timed(phase, fn, *fn_args):
+        start = time.perf_counter()
+        result = fn(*fn_args)
+        timings[phase].append((time.perf_counter() - start) * 1000)
+        return result
+
+    for _ in range(args.iterations):
+        pool = denied if denied and rng.random() < args.deny_ratio else allowed
+        field.place(rng.choice(pool))
+        tapped = time.monotonic()
+        # The reader service polls check_presence; the sector read only runs for unknown UIDs
+        scan = timed("read", reader.check_presence)
+        if not scan:
+            field.remove()
+            continue
+        uid, csu_id = scan
+
+        start = time.perf_counter()
+        decision = validate_card(str(csu_id), uid)
+        timings["validate" if decision.csu_id else "validate_denied"].append((time.perf_counter() - start) * 1000)
+        if decision.csu_id:
+            timed("start_session", session_mgr.start_session, decision.csu_id, decision.display_name)
+            closed = [t for t, pin, value in gpio.history if pin == RELAY_PIN and value and t >= tapped]
+            timings["tap_to_relay"].append((closed[0] - tapped) * 1000)
+            timed("lcd", lcd.flush)
+            field.remove()
+            timed("end_session", session_mgr.force_end_session)
+        else:
+            field.remove()
+        timed("azure_push", outbox.drain_once, db)
+
+    return timings, server
+
+
+def report(timings, server):
+    print(f"{'phase':<17}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    summary = {}
+    for phase in PHASES:
+        values = timings[phase]
+        if not values:
+            continue
+        summary[phase] = {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+        row = summary[phase]
+        print(f"{phase:<17}{row['n']:>6}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['p99']:>10.2f}{row['max']:>10.2f}")
+    print(f"Azure round trips: {server.round_trips}, connections opened: {server.connections}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tap-to-relay latency benchmark")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--usage-rows", type=int, default=5000, help="unsynced sessions in the offline backlog")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--deny-ratio", type=float, default=0.1, help="fraction of taps by users without permission")
+    parser.add_argument("--known-uid-ratio", type=float, default=0.9, help="fraction of users whose card UID is already stored")
+    parser.add_argument("--rtt-ms", type=float, default=20, help="injected Azure round-trip time")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="small dataset for CI")
+    parser.add_argument("--budget", action="append", default=[], metavar="PHASE=MS",
+                        help="fail if the phase's p95 exceeds MS (repeatable)")
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args()
+    if args.quick:
+        args.users, args.usage_rows, args.iterations, args.rtt_ms = 2000, 500, 60, 5
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    timings, server = run(args)
+    summary = report(timings, server)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    failed = []
+    for budget in args.budget:
+        phase, limit = budget.split("=")
+        p95 = summary.get(phase, {}).get("p95")
+        if p95 is not None and p95 > float(limit):
+            failed.append(f"{phase} p95 {p95:.2f} ms > {limit} ms")
+    if failed:
+        raise SystemExit("Budget exceeded: " + "; ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/import_time.py
+"""
+File: import_time.py
+Description:
+  Import-time profile for the station. Imports a module (main by default) in a fresh
+  interpreter under -X importtime, prints the slowest imports by cumulative time, and
+  fails if importing pulled in any hardware driver.
+  Usage: python -m benchmarks.import_time [--module main] [--top 15]
+"""
+
+import sys
+import argparse
+import subprocess
+
+HARDWARE_MODULES = ["RPi", "RPi.GPIO", "mfrc522", "smbus", "lcd.RGB1602"]
+
+
+def profile(module):
+    probe = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps([m for m in {HARDWARE_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self_us |   cumulative_us | module"
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        timings.append((int(cumulative_us), int(self_us), name.strip()))
+    return timings, result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings, loaded = profile(args.module)
+    total = max(cumulative for cumulative, _, _ in timings)
+    print(f"import {args.module}: {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, self_us, name in sorted(timings, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    if loaded != "[]":
+        raise SystemExit(f"Hardware modules imported at load time: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
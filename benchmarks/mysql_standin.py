@@ -0,0 +1,136 @@
+# benchmarks/mysql_standin.py
+"""
+File: mysql_standin.py
+Description:
+  Local stand-in for the Azure MySQL server used by the benchmarks. It speaks enough of the
+  pymysql connection/DictCursor API for db/azure_sync.py, stores data in an in-memory SQLite
+  database with the station schema, and sleeps for a configurable round-trip time on every
+  statement so network cost shows up in the timings. executemany() counts as one round
+  trip, matching pymysql's multi-row INSERT batching.
+"""
+
+import re
+import time
+import zlib
+import sqlite3
+import threading
+from create_local_db import schema
+
+_DUPLICATE_KEY = re.compile(r"ON DUPLICATE KEY UPDATE.*", re.S)
+
+
+class _BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= value
+
+    def finalize(self):
+        return self.value
+
+
+def _concat_ws(sep, *values):
+    return sep.join(str(value) for value in values if value is not None)
+
+
+def _translate(query):
+    query = query.replace("%s", "?")
+    if _DUPLICATE_KEY.search(query):
+        query = _DUPLICATE_KEY.sub("", query).replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+    return query
+
+
+class MySQLStandIn:
+    def __init__(self, rtt=0.02, connect_rtts=3):
+        # connect_rtts: round trips for TCP + TLS + auth when a connection is opened
+        self.rtt = rtt
+        self.connect_rtts = connect_rtts
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        # MySQL functions the sync queries use
+        self.db.create_function("CRC32", 1, lambda value: None if value is None else zlib.crc32(str(value).encode()))
+        self.db.create_function("CONCAT_WS", -1, _concat_ws)
+        self.db.create_aggregate("BIT_XOR", 1, _BitXor)
+        self.db.executescript(schema)
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.connections = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+
+    def connect(self):
+        self.connections += 1
+        for _ in range(self.connect_rtts):
+            self.round_trip()
+        return StandInConnection(self)
+
+
+class StandInConnection:
+    def __init__(self, server):
+        self.server = server
+        self.open = True
+
+    def cursor(self, cursorclass=None):
+        return StandInCursor(self.server)
+
+    def ping(self, reconnect=False):
+        self.server.round_trip()
+
+    def begin(self):
+        self.server.round_trip()
+
+    def commit(self):
+        self.server.round_trip()
+
+    def rollback(self):
+        self.server.round_trip()
+
+    def close(self):
+        self.open = False
+
+
+class StandInCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def _run(self, query, args):
+        with self.server.lock:
+            cursor = self.server.db.execute(_translate(query), tuple(args))
+            self.rows = [dict(row) for row in cursor.fetchall()] if cursor.description else []
+            self.rowcount = cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+
+    def execute(self, query, args=()):
+        self.server.round_trip()
+        self._run(query, args)
+        return self.rowcount
+
+    def executemany(self, query, seq_of_args):
+        self.server.round_trip()
+        total = 0
+        for args in seq_of_args:
+            self._run(query, args)
+            total += self.rowcount
+        self.rowcount = total
+        return total
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        self.rows = []
@@ -6,8 +6,6 @@ Description:
   and default hardware constants used across the EMEC Access Management System.
 """
 
-from dotenv import load_dotenv
-load_dotenv()
 import os
 import json
 
@@ -21,7 +19,6 @@ def get_cpu_serial():
     except:
         return "0000000000000000"
 
-DEVICE_ID = get_cpu_serial()
 
 # === Load Config from JSON ===
 def load_machine_config():
@@ -36,7 +33,6 @@ def load_machine_config():
     except:
         return ("UNKNOWN", "Unnamed Machine", "Unknown Type")
 
-MACHINE_ID, MACHINE_NAME, MACHINE_TYPE = load_machine_config()
 
 
 # === Relay and Card Constants ===
@@ -44,17 +40,98 @@ RELAY_PIN = 11
 CARD_POLL_INTERVAL = 0.5  # seconds
 CARD_GRACE_PERIOD_DEFAULT = 10  # fallback if not in system_settings
 LCD_LINE_DELAY = 2  # seconds
+CARD_REMOVAL_TIMEOUT = 3  # seconds a card must stay off the reader before it counts as removed
+STARTUP_RETRY_INTERVAL = 5  # seconds between startup attempts while checks fail
+
+# === RFID Reader Service ===
+RFID_IRQ_PIN = None  # BOARD pin wired to the MFRC522 IRQ line; None = polling only
+RFID_POLL_FAST = 0.05  # seconds between polls right after a card event
+RFID_POLL_IDLE = CARD_POLL_INTERVAL  # slowest poll interval once idle
+RFID_POLL_BACKOFF = 1.5  # interval multiplier per quiet poll
+RFID_REMOVAL_MISSES = 2  # consecutive empty reads before a card-removed event
+RFID_UID_VERIFY_RATE = float(os.getenv("EMEC_UID_VERIFY_RATE", "0.05"))  # share of known-UID taps that still read the sector; 1 = always
 LOCAL_DB_PATH = "data/local.db"
+SYNC_CHUNK_SIZE = 500  # rows per batch when streaming a full Azure pull
+BACKLOG_BATCH_SIZE = 200  # rows per multi-row statement when uploading local backlogs
 
 # === Azure Environment Variables ===
-AZURE_ENV_KEYS = {
-    "host": os.getenv("AZURE_HOST"),
-    "user": os.getenv("AZURE_USER"),
-    "password": os.getenv("AZURE_PASSWORD"),
-    "database": os.getenv("AZURE_DATABASE"),
-    "ssl_ca": os.getenv("AZURE_SSL_CA")
+def load_azure_env():
+    from dotenv import load_dotenv
+    load_dotenv()
+    return {
+        "host": os.getenv("AZURE_HOST"),
+        "user": os.getenv("AZURE_USER"),
+        "password": os.getenv("AZURE_PASSWORD"),
+        "database": os.getenv("AZURE_DATABASE"),
+        "ssl_ca": os.getenv("AZURE_SSL_CA"),
+        "port": int(os.getenv("AZURE_PORT", "3306"))
+    }
+
+# === Azure Connection Pool ===
+AZURE_POOL_SIZE = 2
+AZURE_POOL_IDLE_TIMEOUT = 300  # seconds before an idle connection is closed
+AZURE_POOL_MAX_LIFETIME = 3600  # seconds before a connection is recycled
+AZURE_POOL_PING_AFTER = 30  # ping connections idle longer than this before reuse
+
+# === Outbound Sync Queue ===
+OUTBOX_POLL_INTERVAL = 5  # seconds between outbox drains when idle
+OUTBOX_RETRY_BASE = 2  # seconds, doubled per failed attempt
+OUTBOX_RETRY_MAX = 300  # cap on retry backoff
+
+# === Background Sync Scheduler ===
+SYNC_INTERVAL_DEFAULT = 300  # seconds; fallback if sync_interval_seconds not in system_settings
+SYNC_JITTER = 0.2  # +/- fraction of the interval randomised per station
+SYNC_MAX_BACKOFF = 3600  # cap on the retry interval after repeated failures
+SYNC_SCOPE = os.getenv("EMEC_SYNC_SCOPE", "machine")  # "machine" pulls only rows this station checks; "all" mirrors every table
+
+# === Heartbeat ===
+HEARTBEAT_INTERVAL_DEFAULT = 60  # seconds; fallback if heartbeat_interval_seconds not in system_settings
+
+# === Offline Mode ===
+OFFLINE_MAX_STALENESS_HOURS = 24  # fallback if offline_max_staleness_hours not in system_settings
+OFFLINE_RECONNECT_INTERVAL = 30  # seconds between connectivity probes while offline
+
+# === Snapshot Distribution ===
+SNAPSHOT_URL = os.getenv("EMEC_SNAPSHOT_URL")  # base URL of the snapshot server; None = bootstrap from Azure
+SNAPSHOT_KEY = os.getenv("EMEC_SNAPSHOT_KEY")  # shared secret manifests are signed with; without it stations only fetch over HTTPS
+SNAPSHOT_TIMEOUT = 30  # seconds per snapshot HTTP request
+SNAPSHOT_STATE_PATH = "data/snapshot.json"  # manifest of the last snapshot installed on this station
+SNAPSHOT_KEEP = 3  # builds kept per scope on the server so in-flight downloads don't vanish
+
+# === Hardware Backend ===
+HARDWARE_BACKEND = os.getenv("EMEC_HARDWARE", "pi")  # "pi" drives the real pins; "sim" uses hal/ simulators
+CARD_SCRIPT_PATH = os.getenv("EMEC_CARD_SCRIPT")  # JSON card script replayed against the simulated reader
+
+# Simulated bus latencies in seconds, per driver call
+SIM_LATENCY = {
+    "gpio_write": 0.00001,  # memory-mapped GPIO register write
+    "i2c_write": 0.0003,  # write_byte_data at 100 kHz: 3 bytes + ACKs
+    "rfid_request": 0.002,  # REQA/WUPA answered by a card
+    "rfid_timeout": 0.006,  # REQA/WUPA with no card in the field
+    "rfid_anticoll": 0.001,
+    "rfid_select": 0.001,
+    "rfid_auth": 0.004,  # 3-pass Crypto1 authentication
+    "rfid_read": 0.003,  # one 16-byte block
 }
 
+# === Network Probe ===
+NETWORK_PROBE_TIMEOUT = 3  # seconds allowed per startup network check
+PUBLIC_IP_URL = "https://ifconfig.me/ip"
+PUBLIC_IP_TTL = 3600  # seconds a looked-up public IP is reused
+
+# === Logging ===
+LOG_PATH = "logs/sync.log"  # JSON lines, rotated daily
+LOG_BACKUP_DAYS = 7
+LOG_LEVEL = os.getenv("EMEC_LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("EMEC_LOG_LEVELS", "")  # per-logger overrides, e.g. "azure_sync=DEBUG,rfid=WARNING"
+LOG_QUEUE_SIZE = 1000  # records buffered for the background writer
+LOG_DEBUG_HIGH_WATER = 0.5  # queue fill fraction above which DEBUG records are dropped
+LOG_BLOCK_TIMEOUT = 0.05  # seconds a WARNING+ record may wait for queue space before being dropped
+
+# === Metrics Endpoint ===
+METRICS_BIND = os.getenv("EMEC_METRICS_BIND", "0.0.0.0")  # scraped by the fleet's Prometheus
+METRICS_PORT = int(os.getenv("EMEC_METRICS_PORT", "9108"))  # 0 disables the endpoint
+
 # === Required Settings from system_settings table ===
 REQUIRED_SYSTEM_SETTINGS = [
     "grace_period_seconds"
@@ -70,11 +147,33 @@ STATUS_IN_USE = "in use"
 LCD_MESSAGES = {
     "start": ["All Clear.", "Welcome to EMEC!"],
     "startup_next": ["Scan CSU ID", "to start"],
-    "maintenance": [f"{MACHINE_NAME}", "Out of order"],
+    "maintenance": ["{machine_name}", "Out of order"],
     "internet_error": ["No Internet", "Connection"],
     "azure_error": ["Azure Error", "Check conn."],
-    "sync_error": ["Sync failed", "Check conn."]
+    "sync_error": ["Sync failed", "Check conn."],
+    "offline": ["Offline mode", "Using local data"]
 }
 
 
+# === Lazily loaded values ===
+# DEVICE_ID, the machine config and the Azure settings are read from /proc/cpuinfo,
+# config/config.json and .env on first access rather than at import.
+def _load_machine_values():
+    machine_id, machine_name, machine_type = load_machine_config()
+    return {"MACHINE_ID": machine_id, "MACHINE_NAME": machine_name, "MACHINE_TYPE": machine_type}
+
+_LAZY_LOADERS = {
+    "DEVICE_ID": lambda: {"DEVICE_ID": get_cpu_serial()},
+    "MACHINE_ID": _load_machine_values,
+    "MACHINE_NAME": _load_machine_values,
+    "MACHINE_TYPE": _load_machine_values,
+    "AZURE_ENV_KEYS": lambda: {"AZURE_ENV_KEYS": load_azure_env()},
+}
 
+def __getattr__(name):
+    loader = _LAZY_LOADERS.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Cached as real module globals, so __getattr__ only runs once per value
+    globals().update(loader())
+    return globals()[name]
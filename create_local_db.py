@@ -8,6 +8,9 @@ Description:
 
 import sqlite3
 import os
+import logging
+
+logger = logging.getLogger("local_db")
 
 DB_PATH = "data/local.db"
 os.makedirs("data", exist_ok=True)
@@ -78,7 +81,8 @@ CREATE TABLE IF NOT EXISTS Access_Requests (
     requested_on TEXT,
     status TEXT DEFAULT 'under review',
     reviewed_by TEXT,
-    reviewed_at TEXT
+    reviewed_at TEXT,
+    synced INTEGER DEFAULT 1 -- rows pulled from Azure are already there; local inserts set 0
 );
 
 -- MACHINE USAGE
@@ -90,7 +94,8 @@ CREATE TABLE IF NOT EXISTS Machine_Usage (
     machine_type TEXT,
     start_time TEXT,
     end_time TEXT,
-    duration INTEGER
+    duration INTEGER,
+    synced INTEGER DEFAULT 0
 );
 
 -- SYSTEM SETTINGS
@@ -100,12 +105,141 @@ CREATE TABLE IF NOT EXISTS System_Settings (
     description TEXT,
     last_updated TEXT
 );
+
+-- SYNC STATE (per-table high-water marks for incremental Azure pulls)
+CREATE TABLE IF NOT EXISTS Sync_State (
+    table_name TEXT PRIMARY KEY,
+    checksum TEXT,
+    high_water TEXT,
+    scope TEXT, -- machine_id the rows were filtered to, or 'all'
+    last_synced TEXT
+);
+
+-- SYNC OUTBOX (pending pushes to Azure, one row per kind/key)
+CREATE TABLE IF NOT EXISTS Sync_Outbox (
+    outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    version INTEGER DEFAULT 1,
+    created_at REAL,
+    next_attempt_at REAL,
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    UNIQUE (kind, item_key)
+);
 """
 
+# Connection settings applied to every local connection. WAL lets the reader, sync and
+# outbox threads read while another writes, and synchronous=NORMAL drops the per-commit fsync
+# of the rollback journal while staying crash-safe under WAL.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+def _add_column(conn, table, column, definition, backfill=None):
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        if backfill:
+            conn.execute(backfill)
+
+def _migrate_base_schema(conn):
+    conn.executescript(schema)
+
+def _migrate_synced_columns(conn):
+    _add_column(conn, "Access_Requests", "synced", "INTEGER DEFAULT 1",
+                "UPDATE Access_Requests SET synced = 0 WHERE status = 'under review'")
+    _add_column(conn, "Machine_Usage", "synced", "INTEGER DEFAULT 0")
+
+def _migrate_indexes(conn):
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_access_requests_lookup ON Access_Requests (csu_id, machine_id, status);
+        CREATE INDEX IF NOT EXISTS idx_access_requests_status ON Access_Requests (status);
+        CREATE INDEX IF NOT EXISTS idx_access_requests_synced ON Access_Requests (synced);
+        CREATE INDEX IF NOT EXISTS idx_machine_usage_session ON Machine_Usage (session_id);
+        CREATE INDEX IF NOT EXISTS idx_machine_usage_synced ON Machine_Usage (synced);
+        CREATE INDEX IF NOT EXISTS idx_machine_permissions_machine ON Machine_Permissions (machine_id);
+        CREATE INDEX IF NOT EXISTS idx_sync_outbox_due ON Sync_Outbox (next_attempt_at);
+    """)
+
+def _migrate_sync_scope(conn):
+    _add_column(conn, "Sync_State", "scope", "TEXT", "UPDATE Sync_State SET scope = 'all'")
+
+def _migrate_prune_usage(conn):
+    # Sessions Azure has acknowledged are deleted after upload; clear the ones kept before
+    conn.execute("DELETE FROM Machine_Usage WHERE synced = 1")
+
+def _migrate_row_hashes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Sync_Row_Hash (
+            table_name TEXT,
+            row_key TEXT, -- JSON list of the primary key values as strings
+            row_hash INTEGER, -- Azure's CRC32 of the row when it was last applied
+            PRIMARY KEY (table_name, row_key)
+        )
+    """)
+
+def _migrate_local_request_ids(conn):
+    # Requests not yet uploaded move to negative placeholder ids; Azure assigns the real one
+    conn.execute("UPDATE Access_Requests SET request_id = -request_id WHERE synced = 0 AND request_id > 0")
+
+def _migrate_drop_high_water(conn):
+    # Row hashes replaced the high-water marks; rebuild Sync_State without the column, keeping
+    # its rows (ALTER TABLE DROP COLUMN needs SQLite 3.35)
+    conn.executescript("""
+        BEGIN;
+        CREATE TABLE Sync_State_new (
+            table_name TEXT PRIMARY KEY,
+            checksum TEXT,
+            scope TEXT,
+            last_synced TEXT
+        );
+        INSERT INTO Sync_State_new (table_name, checksum, scope, last_synced)
+            SELECT table_name, checksum, scope, last_synced FROM Sync_State;
+        DROP TABLE Sync_State;
+        ALTER TABLE Sync_State_new RENAME TO Sync_State;
+        COMMIT;
+    """)
+
+# Ordered schema migrations; PRAGMA user_version records the last one applied.
+# Append new entries, never edit released ones.
+MIGRATIONS = [
+    (1, "base schema", _migrate_base_schema),
+    (2, "synced markers", _migrate_synced_columns),
+    (3, "secondary indexes", _migrate_indexes),
+    (4, "sync scope", _migrate_sync_scope),
+    (5, "prune uploaded sessions", _migrate_prune_usage),
+    (6, "sync row hashes", _migrate_row_hashes),
+    (7, "local request ids", _migrate_local_request_ids),
+    (8, "drop sync high-water marks", _migrate_drop_high_water),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def configure_connection(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def connect_local_db(path=DB_PATH, **kwargs):
+    return configure_connection(sqlite3.connect(path, **kwargs))
+
+def migrate(conn):
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        apply(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        logger.info(f"[DB] Local DB migrated to v{version} ({description})")
+    return conn
+
 def create_local_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.executescript(schema)
-    conn.commit()
+    conn = connect_local_db(DB_PATH)
+    migrate(conn)
     conn.close()
-    print(f"Local DB created at {DB_PATH}")
+    logger.info(f"[DB] Local DB created at {DB_PATH}")
@@ -0,0 +1,183 @@
+# db/auth_cache.py
+"""
+File: auth_cache.py
+Description:
+  In-memory authorization cache for card validation.
+  Holds users (by CSU ID and card UID), this machine's permissions, access levels, pending
+  requests and lab hours so a scan resolves without touching SQLite. Sections are rebuilt
+  after each Azure sync for the tables that sync reports as changed; a single user's refresh
+  only patches that user's entries.
+"""
+
+import logging
+import threading
+from config import constants
+from db.local_db import get_local_db
+from db.azure_sync import add_sync_listener
+from utils import metrics
+
+logger = logging.getLogger("auth_cache")
+
+# Which cache sections depend on which synced tables
+SECTION_TABLES = {
+    "users": "Users",
+    "permissions": "Machine_Permissions",
+    "levels": "User_Access",
+    "requests": "Access_Requests",
+    "hours": "System_Settings",
+}
+
+
+class AuthCache:
+    def __init__(self, machine_id=None):
+        self._machine_id = machine_id
+        self.users = None
+        self.users_by_uid = None
+        self.permissions = None
+        self.levels = None
+        self.requests = None
+        self.hours = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def machine_id(self):
+        # Read on use: the module singleton is created at import, before the config is loaded
+        return self._machine_id or constants.MACHINE_ID
+
+    def _load_section(self, db, section):
+        if section == "users":
+            users = {str(row["csu_id"]): dict(row) for row in db.get_all_users()}
+            by_uid = {str(user["uid"]): csu_id for csu_id, user in users.items() if user.get("uid")}
+            self.users, self.users_by_uid = users, by_uid
+        elif section == "permissions":
+            self.permissions = {str(csu_id) for csu_id in db.get_permitted_csu_ids(self.machine_id)}
+        elif section == "levels":
+            levels = {}
+            for row in db.get_all_user_levels():
+                levels.setdefault(str(row["csu_id"]), set()).add(row["level_name"])
+            self.levels = levels
+        elif section == "requests":
+            self.requests = {str(csu_id) for csu_id in db.get_pending_request_csu_ids(self.machine_id)}
+        elif section == "hours":
+            self.hours = db.get_open_close_times()
+
+    def rebuild(self, sections=None, db=None):
+        sections = sections or list(SECTION_TABLES)
+        db = db or get_local_db()
+        with self._lock:
+            for section in sections:
+                self._load_section(db, section)
+        logger.info(f"[CACHE] Rebuilt: {', '.join(sections)}")
+
+    def invalidate(self, tables=None):
+        with self._lock:
+            for section, table in SECTION_TABLES.items():
+                if tables is None or table in tables:
+                    setattr(self, section, None)
+
+    def on_sync(self, changes, full, csu_id=None):
+        if full:
+            self.rebuild()
+            return
+        changed = [section for section, table in SECTION_TABLES.items() if changes.get(table)]
+        if changed and csu_id is not None:
+            self.refresh_user(csu_id, changed)
+        elif changed:
+            self.rebuild(changed)
+
+    def refresh_user(self, csu_id, sections, db=None):
+        # Re-reads one user's entries in the loaded sections; unloaded ones load lazily later
+        db = db or get_local_db()
+        csu_id = str(csu_id)
+        with self._lock:
+            if "users" in sections and self.users is not None:
+                old = self.users.pop(csu_id, None)
+                if old and old.get("uid"):
+                    self.users_by_uid.pop(str(old["uid"]), None)
+                row = db.get_user(csu_id)
+                if row:
+                    self.users[csu_id] = dict(row)
+                    if row["uid"]:
+                        self.users_by_uid[str(row["uid"])] = csu_id
+            if "permissions" in sections and self.permissions is not None:
+                self._toggle(self.permissions, csu_id, db.has_permission(csu_id, self.machine_id))
+            if "levels" in sections and self.levels is not None:
+                levels = db.get_user_levels(csu_id)
+                if levels:
+                    self.levels[csu_id] = levels
+                else:
+                    self.levels.pop(csu_id, None)
+            if "requests" in sections and self.requests is not None:
+                self._toggle(self.requests, csu_id, db.access_request_exists(csu_id, self.machine_id))
+        logger.info(f"[CACHE] Refreshed {csu_id}: {', '.join(sections)}")
+
+    @staticmethod
+    def _toggle(members, csu_id, present):
+        if present:
+            members.add(csu_id)
+        else:
+            members.discard(csu_id)
+
+    def _section(self, section):
+        value = getattr(self, section)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        self.rebuild([section])
+        return getattr(self, section)
+
+    def get_user(self, csu_id):
+        return self._section("users").get(str(csu_id))
+
+    def get_csu_id_by_uid(self, uid):
+        self._section("users")
+        return self.users_by_uid.get(str(uid))
+
+    def has_permission(self, csu_id):
+        return str(csu_id) in self._section("permissions")
+
+    def user_has_level(self, csu_id, level_name):
+        return level_name in self._section("levels").get(str(csu_id), ())
+
+    def access_request_exists(self, csu_id):
+        return str(csu_id) in self._section("requests")
+
+    def get_open_close_times(self):
+        return self._section("hours")
+
+    # Local writes made during validation, mirrored so the cache stays current until the next sync
+    def note_access_request(self, csu_id):
+        if self.requests is not None:
+            self.requests.add(str(csu_id))
+
+    def note_user_uid(self, csu_id, uid):
+        user = self.users.get(str(csu_id)) if self.users is not None else None
+        if user is not None:
+            user["uid"] = str(uid)
+            self.users_by_uid[str(uid)] = str(csu_id)
+
+    def forget_user_uid(self, csu_id, uid):
+        user = self.users.get(str(csu_id)) if self.users is not None else None
+        if user is not None and str(user.get("uid")) == str(uid):
+            user["uid"] = None
+        if self.users_by_uid is not None and self.users_by_uid.get(str(uid)) == str(csu_id):
+            del self.users_by_uid[str(uid)]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+auth_cache = AuthCache()
+add_sync_listener(auth_cache.on_sync)
+metrics.gauge(
+    "emec_auth_cache_lookups", "Auth cache lookups since start by result",
+    lambda: [({"result": "hit"}, auth_cache.hits), ({"result": "miss"}, auth_cache.misses)]
+)
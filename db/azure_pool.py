@@ -0,0 +1,95 @@
+# db/azure_pool.py
+"""
+File: azure_pool.py
+Description:
+  Keeps a small pool of long-lived Azure MySQL connections so sync calls reuse an
+  established TLS session instead of reconnecting for every push or pull.
+  Connections are pinged after sitting idle and retired after an idle timeout or max lifetime.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from config.constants import (
+    AZURE_POOL_SIZE, AZURE_POOL_IDLE_TIMEOUT, AZURE_POOL_MAX_LIFETIME, AZURE_POOL_PING_AFTER
+)
+
+logger = logging.getLogger("azure_pool")
+
+
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class AzureConnectionPool:
+    def __init__(self, connect, max_size=AZURE_POOL_SIZE, idle_timeout=AZURE_POOL_IDLE_TIMEOUT,
+                 max_lifetime=AZURE_POOL_MAX_LIFETIME, ping_after=AZURE_POOL_PING_AFTER):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _close(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, pooled, now):
+        return (now - pooled.created_at >= self.max_lifetime
+                or now - pooled.last_used >= self.idle_timeout)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return _PooledConnection(self._connect())
+
+            now = time.monotonic()
+            if self._is_expired(pooled, now):
+                self._close(pooled)
+                continue
+
+            if now - pooled.last_used >= self.ping_after:
+                try:
+                    pooled.conn.ping(reconnect=False)
+                except Exception as e:
+                    logger.warning(f"[POOL] Dropping dead Azure connection: {e}")
+                    self._close(pooled)
+                    continue
+            return pooled
+
+    def release(self, pooled, broken=False):
+        pooled.last_used = time.monotonic()
+        if broken or time.monotonic() - pooled.created_at >= self.max_lifetime:
+            self._close(pooled)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(pooled)
+                return
+        self._close(pooled)
+
+    @contextmanager
+    def connection(self):
+        pooled = self.acquire()
+        try:
+            yield pooled.conn
+        except Exception:
+            self.release(pooled, broken=True)
+            raise
+        self.release(pooled)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._close(pooled)
@@ -7,197 +7,586 @@ Description:
 """
 
 import pymysql
-import sqlite3
 import logging
 import os
-from config.constants import AZURE_ENV_KEYS, LOCAL_DB_PATH
-from db.local_db import LocalDB
+import json
+import sqlite3
+import threading
+import contextlib
+from datetime import datetime
+from config import constants
+from config.constants import LOCAL_DB_PATH, SYNC_CHUNK_SIZE, BACKLOG_BATCH_SIZE
+from db.local_db import get_local_db
+from create_local_db import connect_local_db, migrate
+from db.azure_pool import AzureConnectionPool
+from utils import metrics
 
 logger = logging.getLogger("azure_sync")
 
+AZURE_SECONDS = metrics.histogram("emec_azure_seconds", "Azure push/pull latency by operation")
+AZURE_FAILURES = metrics.counter("emec_azure_failures_total", "Failed Azure pushes and pulls by operation")
+
 def get_azure_connection():
+    azure = constants.AZURE_ENV_KEYS
     return pymysql.connect(
-        host=AZURE_ENV_KEYS["host"],
-        user=AZURE_ENV_KEYS["user"],
-        password=AZURE_ENV_KEYS["password"],
-        db=AZURE_ENV_KEYS["database"],
-        ssl={"ca": AZURE_ENV_KEYS["ssl_ca"]},
-        cursorclass=pymysql.cursors.DictCursor
+        host=azure["host"],
+        port=azure["port"],
+        user=azure["user"],
+        password=azure["password"],
+        db=azure["database"],
+        ssl={"ca": azure["ssl_ca"]},
+        cursorclass=pymysql.cursors.DictCursor,
+        autocommit=True
     )
 
-def sync_local_from_azure():
-    conn_local = sqlite3.connect(LOCAL_DB_PATH)
-    cursor_local = conn_local.cursor()
+# Callbacks run as fn(changes, full, csu_id) after every committed pull, e.g. to refresh
+# caches. csu_id is set when only that user's rows were refreshed.
+_sync_listeners = []
 
-    conn_azure = get_azure_connection()
-    cursor_azure = conn_azure.cursor()
+def add_sync_listener(fn):
+    _sync_listeners.append(fn)
+
+def notify_sync_listeners(changes, full, csu_id=None):
+    for fn in _sync_listeners:
+        try:
+            fn(changes, full, csu_id)
+        except Exception as e:
+            logger.error(f"[SYNC] Sync listener failed: {e}")
+
+# Shared by every push/pull below. Connections run in autocommit mode so a single-statement
+# push is one round trip; multi-statement writes wrap themselves in begin()/commit().
+azure_pool = AzureConnectionPool(get_azure_connection)
+
+# Primary key for each pulled table, and the columns stations write and push themselves
+# ("local"). Those are left out of the row hashes below, so a station's status push doesn't
+# make every other station re-pull the table.
+# join/scope narrow a table to this machine when SYNC_SCOPE is "machine"; the table is
+# aliased as t and %s binds MACHINE_ID. Tables without a scope are pulled whole. A scoped
+# station only sees its own Access_Requests, which is safe because Azure assigns every
+# request_id (see push_access_requests); local ids are never sent.
+_PERMITTED = "Machine_Permissions p ON p.csu_id = t.csu_id"
+
+SYNC_TABLES = {
+    "Users": {"key": ["csu_id"], "local": ["last_used", "is_active"], "join": _PERMITTED, "scope": "p.machine_id = %s"},
+    "User_Access": {"key": ["csu_id", "level_name"], "join": _PERMITTED, "scope": "p.machine_id = %s"},
+    "Access_Levels": {"key": ["level_name"]},
+    "Access_Requests": {"key": ["request_id"], "scope": "t.machine_id = %s"},
+    "Machine_Permissions": {"key": ["csu_id", "machine_id"], "scope": "t.machine_id = %s"},
+    "System_Settings": {"key": ["setting"]},
+    "Machine": {"key": ["machine_id"], "local": ["device_ip", "last_heartbeat"], "scope": "t.machine_id = %s"},
+}
+
+# Tables that also collect local rows; rows with synced = 0 survive pulls until uploaded
+KEEP_UNSYNCED = {"Access_Requests"}
+
+def sync_scope():
+    # The machine to scope pulls to, or None to mirror every table
+    return constants.MACHINE_ID if constants.SYNC_SCOPE == "machine" else None
+
+def _get_sync_state(cursor_local):
+    cursor_local.execute("SELECT table_name, checksum, scope FROM Sync_State")
+    return {row[0]: {"checksum": row[1], "scope": row[2]} for row in cursor_local.fetchall()}
+
+def _save_sync_state(cursor_local, table, checksum, scope):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cursor_local.execute(
+        "INSERT OR REPLACE INTO Sync_State (table_name, checksum, scope, last_synced) VALUES (?, ?, ?, ?)",
+        (table, checksum, scope or "all", now)
+    )
+
+# Builds the SELECT for a pulled table, filtered server-side to the scoped machine's rows.
+# Returns (query, args) for a cursor.execute.
+def scoped_select(table, spec, scope, columns="t.*", where=None, args=()):
+    query = f"SELECT {columns} FROM {table} t"
+    clauses, params = [], []
+    if scope and spec.get("scope"):
+        if spec.get("join"):
+            query += f" JOIN {spec['join']}"
+        clauses.append(spec["scope"])
+        params.append(scope)
+    if where:
+        clauses.append(where)
+        params.extend(args)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, tuple(params)
+
+# Change detection. Azure computes a CRC32 per row over the pulled columns (minus "local"),
+# and Sync_Row_Hash keeps the hash of every row last applied. A table's checksum is the count,
+# sum and XOR of its scoped row hashes: one aggregate query decides whether it changed, and a
+# changed table fetches only the rows whose hash differs.
+def _hash_columns(cursor_local, table, spec):
+    cursor_local.execute(f"PRAGMA table_info({table})")
+    skip = {"synced", *spec.get("local", ())}
+    return [row[1] for row in cursor_local.fetchall() if row[1] not in skip]
+
+def _row_hash_sql(columns):
+    return "CRC32(CONCAT_WS('|', " + ", ".join(f"IFNULL(t.{col}, '<null>')" for col in columns) + "))"
+
+def row_key(values):
+    return json.dumps([str(value) for value in values], separators=(",", ":"))
+
+def table_checksum(row_hashes):
+    count = total = xor = 0
+    for row_hash in row_hashes:
+        count += 1
+        total += row_hash
+        xor ^= row_hash
+    return f"{count}:{total}:{xor}"
 
-    tables = ['Users', 'User_Access','Access_Levels', 'Access_Requests', 'Machine_Permissions', 'System_Settings', 'Machine']
+def _remote_checksum(cursor_azure, table, spec, columns, scope):
+    row_hash = _row_hash_sql(columns)
+    cursor_azure.execute(*scoped_select(
+        table, spec, scope, columns=f"COUNT(*) AS n, SUM({row_hash}) AS s, BIT_XOR({row_hash}) AS x"
+    ))
+    row = cursor_azure.fetchone()
+    return f"{row['n']}:{int(row['s'] or 0)}:{int(row['x'] or 0)}"
+
+def _keys_in(key_cols, count):
+    if len(key_cols) == 1:
+        return f"t.{key_cols[0]} IN ({', '.join(['%s'] * count)})"
+    row = "(" + ", ".join(["%s"] * len(key_cols)) + ")"
+    return f"({', '.join(f't.{col}' for col in key_cols)}) IN ({', '.join([row] * count)})"
+
+def _upsert_rows(cursor_local, table, rows):
+    if not rows:
+        return 0
+    keys = list(rows[0].keys())
+    placeholders = ", ".join(["?"] * len(keys))
+    query = f"INSERT OR REPLACE INTO {table} ({', '.join(keys)}) VALUES ({placeholders})"
+    cursor_local.executemany(query, [tuple(row[k] for k in keys) for row in rows])
+    return len(rows)
+
+def _missing_keys(cursor_local, table, key_cols, remote_keys):
+    pending = " WHERE synced = 1" if table in KEEP_UNSYNCED else ""
+    cursor_local.execute(f"SELECT {', '.join(key_cols)} FROM {table}{pending}")
+    return [tuple(row) for row in cursor_local.fetchall() if tuple(str(v) for v in row) not in remote_keys]
+
+# Pulls run in two phases. The fetch phase reads Azure into a scratch SQLite file beside the
+# target (path + ".pull") without opening a transaction on the target, however slow Azure is.
+# The apply phase then copies the staged rows across in one short write transaction.
+_pull_lock = threading.Lock()
+_apply_guard = contextlib.nullcontext
+
+def set_apply_guard(fn):
+    # fn() returns the context manager the apply phase runs under; the sync scheduler installs
+    # one that waits out session starts/ends and holds new ones off until the apply commits
+    global _apply_guard
+    _apply_guard = fn
+
+def _open_stage(path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn_stage = sqlite3.connect(path, isolation_level=None)
+    conn_stage.execute("PRAGMA journal_mode = OFF")
+    conn_stage.execute("PRAGMA synchronous = OFF")
+    conn_stage.execute("CREATE TABLE Pull_Deletes (table_name TEXT, row_key TEXT)")
+    conn_stage.execute("CREATE TABLE Pull_Hashes (table_name TEXT, row_key TEXT, row_hash INTEGER)")
+    return conn_stage
+
+def _stage_table(cursor_local, cursor_stage, table):
+    cursor_local.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    cursor_stage.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor_stage.execute(cursor_local.fetchone()[0])
+    cursor_stage.execute("DELETE FROM Pull_Deletes WHERE table_name = ?", (table,))
+    cursor_stage.execute("DELETE FROM Pull_Hashes WHERE table_name = ?", (table,))
+
+def _stage_hashes(cursor_stage, table, hashes):
+    cursor_stage.executemany(
+        "INSERT INTO Pull_Hashes (table_name, row_key, row_hash) VALUES (?, ?, ?)",
+        [(table, key, row_hash) for key, row_hash in hashes.items()]
+    )
+
+# Streams the Azure table through an unbuffered cursor in SYNC_CHUNK_SIZE batches into the
+# stage. Returns (rows, checksum).
+def _fetch_full(cursor_local, cursor_stage, conn_azure, table, spec, columns, scope):
+    _stage_table(cursor_local, cursor_stage, table)
+    key_cols = spec["key"]
+    hashes = {}
+
+    cursor_stream = conn_azure.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor_stream.execute(*scoped_select(table, spec, scope, columns=f"t.*, {_row_hash_sql(columns)} AS _row_hash"))
+        while True:
+            rows = cursor_stream.fetchmany(SYNC_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                hashes[row_key(row[col] for col in key_cols)] = row.pop("_row_hash")
+            _upsert_rows(cursor_stage, table, rows)
+    finally:
+        cursor_stream.close()
+
+    _stage_hashes(cursor_stage, table, hashes)
+    return len(hashes), table_checksum(hashes.values())
+
+# Lists every scoped key with its row hash, then fetches only the rows that are new or whose
+# hash differs from the one applied last time. Returns (rows_changed, checksum).
+def _fetch_delta(cursor_local, cursor_stage, cursor_azure, table, spec, columns, scope):
+    key_cols = spec["key"]
+    key_select = ", ".join(f"t.{col}" for col in key_cols)
+    cursor_azure.execute(*scoped_select(table, spec, scope, columns=f"{key_select}, {_row_hash_sql(columns)} AS row_hash"))
+    remote = {row_key(row[col] for col in key_cols): row["row_hash"] for row in cursor_azure.fetchall()}
+
+    cursor_local.execute("SELECT row_key, row_hash FROM Sync_Row_Hash WHERE table_name = ?", (table,))
+    applied = dict(cursor_local.fetchall())
+    cursor_local.execute(f"SELECT {', '.join(key_cols)} FROM {table}")
+    present = {row_key(row) for row in cursor_local.fetchall()}
+    changed = [key for key, row_hash in remote.items() if key not in present or applied.get(key) != row_hash]
+
+    _stage_table(cursor_local, cursor_stage, table)
+    for start in range(0, len(changed), SYNC_CHUNK_SIZE):
+        batch = [json.loads(key) for key in changed[start:start + SYNC_CHUNK_SIZE]]
+        cursor_azure.execute(*scoped_select(
+            table, spec, scope, where=_keys_in(key_cols, len(batch)), args=[value for key in batch for value in key]
+        ))
+        _upsert_rows(cursor_stage, table, cursor_azure.fetchall())
+    _stage_hashes(cursor_stage, table, {key: remote[key] for key in changed})
+
+    stale = _missing_keys(cursor_local, table, key_cols, {tuple(json.loads(key)) for key in remote})
+    cursor_stage.executemany(
+        "INSERT INTO Pull_Deletes (table_name, row_key) VALUES (?, ?)", [(table, row_key(key)) for key in stale]
+    )
+    return len(changed) + len(stale), table_checksum(remote.values())
 
-    for table in tables:
+# Fetch phase. Reads Azure (and the target, to diff against) and writes only to the stage.
+# Returns (plan, failed); plan lists (table, action, checksum, scope) per table to apply,
+# action being "skip", "delta" or "full".
+def _fetch_tables(cursor_local, cursor_stage, conn_azure, sync_state, mode, changes, scope):
+    cursor_azure = conn_azure.cursor()
+    plan, failed = [], []
+    for table, spec in SYNC_TABLES.items():
         try:
-            cursor_azure.execute(f"SELECT * FROM {table}")
-            rows = cursor_azure.fetchall()
-
-            cursor_local.execute(f"DELETE FROM {table}")
-            if rows:
-                keys = rows[0].keys()
-                placeholders = ", ".join(["?"] * len(keys))
-                query = f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({placeholders})"
-                for row in rows:
-                    cursor_local.execute(query, tuple(row.values()))
-            logger.info(f"[SYNC] Pulled {len(rows)} rows from Azure -> {table}")
+            table_scope = scope if spec.get("scope") else None
+            columns = _hash_columns(cursor_local, table, spec)
+            state = sync_state.get(table)
+            if state and state["scope"] != (table_scope or "all"):
+                # Checksums from another scope say nothing about this one
+                state = None
+
+            if mode == "delta" and state:
+                checksum = _remote_checksum(cursor_azure, table, spec, columns, table_scope)
+                if checksum == state["checksum"]:
+                    changes[table] = 0
+                    plan.append((table, "skip", checksum, table_scope))
+                else:
+                    changes[table], checksum = _fetch_delta(cursor_local, cursor_stage, cursor_azure, table, spec, columns, table_scope)
+                    plan.append((table, "delta", checksum, table_scope))
+            else:
+                changes[table], checksum = _fetch_full(cursor_local, cursor_stage, conn_azure, table, spec, columns, table_scope)
+                plan.append((table, "full", checksum, table_scope))
         except Exception as e:
             logger.error(f"[SYNC] ERROR syncing table {table}: {e}")
+            AZURE_FAILURES.inc(op="pull_table", table=table)
+            failed.append(table)
+    return plan, failed
+
+# Apply phase. One write transaction on the target, touching only SQLite.
+def _apply_stage(cursor_local, stage_path, plan, mode, changes):
+    cursor_local.execute("ATTACH DATABASE ? AS pull", (stage_path,))
+    try:
+        with _apply_guard():
+            cursor_local.execute("BEGIN IMMEDIATE")
+            try:
+                for table, action, checksum, scope in plan:
+                    if action == "full":
+                        # Local rows still waiting for upload are kept. Their negative placeholder
+                        # ids never clash with Azure's, so the copy below cannot replace them.
+                        pending = " WHERE synced = 1" if table in KEEP_UNSYNCED else ""
+                        cursor_local.execute(f"DELETE FROM main.{table}{pending}")
+                        cursor_local.execute("DELETE FROM main.Sync_Row_Hash WHERE table_name = ?", (table,))
+                    if action != "skip":
+                        cursor_local.execute(f"INSERT OR REPLACE INTO main.{table} SELECT * FROM pull.{table}")
+                        key_cols = SYNC_TABLES[table]["key"]
+                        where = " AND ".join(f"{col} = ?" for col in key_cols)
+                        if table in KEEP_UNSYNCED:
+                            where += " AND synced = 1"
+                        cursor_local.execute("SELECT row_key FROM pull.Pull_Deletes WHERE table_name = ?", (table,))
+                        stale = [row[0] for row in cursor_local.fetchall()]
+                        cursor_local.executemany(f"DELETE FROM main.{table} WHERE {where}", [json.loads(key) for key in stale])
+                        cursor_local.executemany(
+                            "DELETE FROM main.Sync_Row_Hash WHERE table_name = ? AND row_key = ?", [(table, key) for key in stale]
+                        )
+                        cursor_local.execute(
+                            "INSERT OR REPLACE INTO main.Sync_Row_Hash (table_name, row_key, row_hash) "
+                            "SELECT table_name, row_key, row_hash FROM pull.Pull_Hashes WHERE table_name = ?", (table,)
+                        )
+                    _save_sync_state(cursor_local, table, checksum, scope)
+                cursor_local.execute("COMMIT")
+            except Exception:
+                cursor_local.execute("ROLLBACK")
+                raise
+    finally:
+        cursor_local.execute("DETACH DATABASE pull")
+    for table, *_ in plan:
+        logger.info(f"[SYNC] {mode.capitalize()} pull: {changes[table]} rows changed -> {table}")
+
+# Pulls into the SQLite file at path, restricted to scope (a machine_id, or None for every
+# row). Incremental unless full=True or the file has no Sync_State yet. Returns (changes, mode).
+# Pulls are serialized by _pull_lock. While Azure is being read the target has no open
+# transaction, so the station's writes to it never queue behind the network.
+def pull_to_path(path, scope, full=False):
+    with _pull_lock:
+        stage_path = f"{path}.pull"
+        conn_local = connect_local_db(path, isolation_level=None)
+        try:
+            cursor_local = conn_local.cursor()
+            migrate(conn_local)
+
+            sync_state = _get_sync_state(cursor_local)
+            mode = "full" if full or not sync_state else "delta"
+            changes = {}
+
+            conn_stage = _open_stage(stage_path)
+            try:
+                pooled = azure_pool.acquire()
+                try:
+                    plan, failed = _fetch_tables(cursor_local, conn_stage.cursor(), pooled.conn, sync_state, mode, changes, scope)
+                except Exception:
+                    azure_pool.release(pooled, broken=True)
+                    raise
+                # A table that failed mid-stream may leave the connection unusable
+                azure_pool.release(pooled, broken=bool(failed))
+            finally:
+                conn_stage.close()
+
+            _apply_stage(cursor_local, stage_path, plan, mode, changes)
+        finally:
+            conn_local.close()
+            if os.path.exists(stage_path):
+                os.remove(stage_path)
+    return {table: changes[table] for table, *_ in plan}, mode
 
-    conn_local.commit()
-    conn_local.close()
-    conn_azure.close()
+# Incremental by default: tables whose checksum is unchanged are skipped, changed ones
+# are applied as upserts/deletes of the differing rows. full=True (or an empty Sync_State) reloads every table.
+# With SYNC_SCOPE = "machine" only this machine's permissions, the users they name, their
+# access levels and this machine's requests are pulled. Returns {table: rows_changed}.
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="pull")
+def sync_local_from_azure(full=False):
+    changes, mode = pull_to_path(LOCAL_DB_PATH, sync_scope(), full)
+    notify_sync_listeners(changes, mode == "full")
+    return changes
 
-def sync_session_to_azure(session_id):
+# Tables holding rows for a single user, refreshed after that user raises an access request
+USER_SCOPED_TABLES = ["Users", "User_Access", "Machine_Permissions", "Access_Requests"]
+
+def _text(value):
+    return None if value is None else str(value)
+
+# Writes only the user's rows that differ from the local copy (ignoring "local" columns) and
+# deletes the ones Azure no longer has. Returns how many rows changed.
+def _apply_user_rows(cursor_local, table, spec, csu_id, rows):
+    key_cols = spec["key"]
+    skip = set(spec.get("local", ()))
+    cursor_local.execute(f"SELECT * FROM {table} WHERE csu_id = ?", (str(csu_id),))
+    names = [d[0] for d in cursor_local.description]
+    local = {}
+    for values in cursor_local.fetchall():
+        row = dict(zip(names, values))
+        local[row_key(row[col] for col in key_cols)] = row
+
+    changed = []
+    for row in rows:
+        current = local.pop(row_key(row[col] for col in key_cols), None)
+        if current is None or any(_text(current.get(k)) != _text(v) for k, v in row.items() if k not in skip):
+            changed.append(row)
+    # Keep local requests that have not reached Azure yet
+    stale = [tuple(row[col] for col in key_cols) for row in local.values() if row.get("synced", 1)]
+    where = " AND ".join(f"{col} = ?" for col in key_cols)
+    cursor_local.executemany(f"DELETE FROM {table} WHERE {where}", stale)
+    return _upsert_rows(cursor_local, table, changed) + len(stale)
+
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="refresh_user")
+def refresh_user_from_azure(csu_id):
     try:
-        conn_local = sqlite3.connect(LOCAL_DB_PATH)
-        cur = conn_local.cursor()
-        cur.execute("SELECT session_id, csu_id, machine_id, machine_type, start_time, end_time, duration FROM Machine_Usage WHERE session_id = ?", (session_id,))
-        row = cur.fetchone()
-        if not row:
-            return
+        scope = sync_scope()
+        # Under the pull lock so a periodic pull fetched earlier can't overwrite these rows
+        with _pull_lock:
+            with azure_pool.connection() as conn_azure:
+                cursor_azure = conn_azure.cursor()
+                pulled = {}
+                for table in USER_SCOPED_TABLES:
+                    cursor_azure.execute(*scoped_select(table, SYNC_TABLES[table], scope, where="t.csu_id = %s", args=(csu_id,)))
+                    pulled[table] = cursor_azure.fetchall()
 
-        conn_azure = get_azure_connection()
-        cursor_az = conn_azure.cursor()
-        cursor_az.execute(
-            "REPLACE INTO Machine_Usage (session_id, csu_id, machine_id, machine_type, start_time, end_time, duration) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            row
-        )
-        conn_azure.commit()
-        conn_azure.close()
+            db = get_local_db()
+            changes = {}
+            with db.transaction():
+                for table, rows in pulled.items():
+                    changes[table] = _apply_user_rows(db.cursor, table, SYNC_TABLES[table], csu_id, rows)
 
-        cur.execute("DELETE FROM Machine_Usage WHERE session_id = ?", (session_id,))
-        conn_local.commit()
-        conn_local.close()
-        logger.info(f"[SYNC] Session {session_id} synced and removed locally.")
+        if any(changes.values()):
+            notify_sync_listeners(changes, False, csu_id=csu_id)
+        logger.info(f"[SYNC] Refreshed permissions for {csu_id}: {changes}")
+        return True
     except Exception as e:
-        logger.error(f"[SYNC] Session sync failed: {e}")
+        logger.error(f"[SYNC] Permission refresh failed for {csu_id}: {e}")
+        return False
 
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="push_machine_status")
 def push_machine_status(machine_id):
-    db = LocalDB()
-    machine = db.get_machine(machine_id)
+    machine = get_local_db().get_machine(machine_id)
     if not machine:
         logger.warning(f"[SYNC] Machine {machine_id} not found locally.")
-        return
+        return True
 
     try:
-        conn = get_azure_connection()
-        cur = conn.cursor()
-
-        cur.execute(
-            """
-            INSERT INTO Machine (machine_id, machine_name, machine_type, device_ip, machine_status, last_heartbeat, device_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                machine_name=VALUES(machine_name),
-                machine_type=VALUES(machine_type),
-                device_ip=VALUES(device_ip),
-                machine_status=VALUES(machine_status),
-                last_heartbeat=VALUES(last_heartbeat),
-                device_id=VALUES(device_id)
-            """,
-            (
-                machine["machine_id"],
-                machine["machine_name"],
-                machine["machine_type"],
-                machine["device_ip"] if "device_ip" in machine.keys() else None,
-                machine["machine_status"],
-                machine["last_heartbeat"],
-                machine["device_id"] if "device_id" in machine.keys() else None
+        with azure_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO Machine (machine_id, machine_name, machine_type, device_ip, machine_status, last_heartbeat, device_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    machine_name=VALUES(machine_name),
+                    machine_type=VALUES(machine_type),
+                    device_ip=VALUES(device_ip),
+                    machine_status=VALUES(machine_status),
+                    last_heartbeat=VALUES(last_heartbeat),
+                    device_id=VALUES(device_id)
+                """,
+                (
+                    machine["machine_id"],
+                    machine["machine_name"],
+                    machine["machine_type"],
+                    machine["device_ip"] if "device_ip" in machine.keys() else None,
+                    machine["machine_status"],
+                    machine["last_heartbeat"],
+                    machine["device_id"] if "device_id" in machine.keys() else None
+                )
             )
-        )
-
-        conn.commit()
-        conn.close()
         logger.info(f"[SYNC] Machine status pushed for {machine_id}")
+        return True
     except Exception as e:
         logger.error(f"[SYNC] Machine status push failed: {e}")
+        return False
 
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="push_user_status")
 def push_user_status(csu_id):
-    db = LocalDB()
-    user = db.get_user(csu_id)
+    user = get_local_db().get_user(csu_id)
     if not user:
         logger.warning(f"[SYNC] User {csu_id} not found locally.")
-        return
+        return True
 
     try:
-        conn = get_azure_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE Users SET is_active=%s, last_used=%s WHERE csu_id=%s",
-            (user["is_active"], user["last_used"], csu_id)
-        )
-        conn.commit()
-        conn.close()
+        with azure_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE Users SET is_active=%s, last_used=%s WHERE csu_id=%s",
+                (user["is_active"], user["last_used"], csu_id)
+            )
         logger.info(f"[SYNC] User status pushed for {csu_id}")
+        return True
     except Exception as e:
         logger.error(f"[SYNC] User status push failed: {e}")
+        return False
 
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="push_user_update")
 def push_user_update(csu_id):
     try:
-        conn_local = sqlite3.connect(LOCAL_DB_PATH)
-        conn_local.row_factory = sqlite3.Row
-        cur = conn_local.cursor()
-        cur.execute("SELECT csu_id, uid, name, last_used, is_active FROM Users WHERE csu_id = ?", (csu_id,))
-        row = cur.fetchone()
-        conn_local.close()
+        row = get_local_db().get_user(csu_id)
 
         if not row:
             logger.warning(f"[SYNC] No local user found with CSU ID {csu_id}")
-            return
-
-        conn = get_azure_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE Users SET uid = %s, name = %s, last_used = %s, is_active = %s
-            WHERE csu_id = %s
-        """, (
-            row["uid"],
-            row["name"],
-            row["last_used"],
-            row["is_active"],
-            row["csu_id"]
-        ))
-        conn.commit()
-        conn.close()
+            return True
+
+        with azure_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE Users SET uid = %s, name = %s, last_used = %s, is_active = %s
+                WHERE csu_id = %s
+            """, (
+                row["uid"],
+                row["name"],
+                row["last_used"],
+                row["is_active"],
+                row["csu_id"]
+            ))
         logger.info(f"[SYNC] UID and info pushed for {csu_id}")
+        return True
     except Exception as e:
         logger.error(f"[SYNC] Failed to push user update for {csu_id}: {e}")
+        return False
+
+# Uploads rows with synced = 0 in BACKLOG_BATCH_SIZE chunks. executemany turns each chunk into
+# a single multi-row INSERT/REPLACE, and rows are marked synced (or, with delete=True, removed)
+# only after Azure accepts them.
+def _push_unsynced(table, columns, upsert_sql, where="synced = 0", delete=False):
+    db = get_local_db()
+    total = 0
+    while True:
+        rows = db.get_unsynced(table, columns, where, limit=BACKLOG_BATCH_SIZE)
+        if not rows:
+            return total
+
+        with azure_pool.connection() as conn_azure:
+            conn_azure.cursor().executemany(upsert_sql, [tuple(row)[1:] for row in rows])
+
+        if delete:
+            db.delete_rows(table, [row[0] for row in rows])
+        else:
+            db.mark_synced(table, [row[0] for row in rows])
+        total += len(rows)
+
+_REQUEST_COLUMNS = ["uid", "csu_id", "machine_id", "machine_type", "requested_on", "status", "reviewed_by", "reviewed_at"]
 
+# Requests are inserted without request_id so Azure assigns it, and the local row is then
+# re-keyed to that id. A request Azure already has (same user, machine and time) is matched
+# instead of inserted, so an upload cut off before the re-key is never duplicated.
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="push_access_requests")
 def push_access_requests():
     try:
-        conn_local = sqlite3.connect(LOCAL_DB_PATH)
-        cur = conn_local.cursor()
-        cur.execute("SELECT request_id, uid, csu_id, machine_id, machine_type, requested_on, status, reviewed_by, reviewed_at FROM Access_Requests WHERE status = 'under review'")
-        requests = cur.fetchall()
-        if not requests:
-            return
-
-        conn_azure = get_azure_connection()
-        cur_az = conn_azure.cursor()
-
-        for row in requests:
-            cur_az.execute("""
-                INSERT INTO Access_Requests (request_id, uid, csu_id, machine_id, machine_type, requested_on, status, reviewed_by, reviewed_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                uid=VALUES(uid),
-                machine_id=VALUES(machine_id),
-                machine_type=VALUES(machine_type),
-                requested_on=VALUES(requested_on),
-                status=VALUES(status),
-                reviewed_by=VALUES(reviewed_by),
-                reviewed_at=VALUES(reviewed_at)
-            """, row)
-
-        conn_azure.commit()
-        conn_azure.close()
-        logger.info(f"[SYNC] Access requests synced to Azure")
+        db = get_local_db()
+        sent = 0
+        while True:
+            rows = db.get_unsynced("Access_Requests", ["request_id", *_REQUEST_COLUMNS], limit=BACKLOG_BATCH_SIZE)
+            if not rows:
+                break
+            with azure_pool.connection() as conn_azure:
+                cur = conn_azure.cursor()
+                for row in rows:
+                    cur.execute(
+                        "SELECT request_id FROM Access_Requests WHERE csu_id = %s AND machine_id = %s AND requested_on = %s",
+                        (row["csu_id"], row["machine_id"], row["requested_on"])
+                    )
+                    existing = cur.fetchone()
+                    if existing:
+                        request_id = existing["request_id"]
+                    else:
+                        cur.execute(
+                            f"INSERT INTO Access_Requests ({', '.join(_REQUEST_COLUMNS)}) "
+                            f"VALUES ({', '.join(['%s'] * len(_REQUEST_COLUMNS))})",
+                            tuple(row[col] for col in _REQUEST_COLUMNS)
+                        )
+                        request_id = cur.lastrowid
+                    db.settle_access_request(row["request_id"], request_id)
+                    sent += 1
+        if sent:
+            logger.info(f"[SYNC] {sent} access requests synced to Azure")
+        return True
     except Exception as e:
         logger.error(f"[SYNC] Access request sync failed: {e}")
+        return False
+
+@metrics.instrument(AZURE_SECONDS, AZURE_FAILURES, op="push_session_backlog")
+def push_session_backlog():
+    try:
+        sent = _push_unsynced(
+            "Machine_Usage",
+            ["session_id", "csu_id", "machine_id", "machine_type", "start_time", "end_time", "duration"],
+            "REPLACE INTO Machine_Usage (session_id, csu_id, machine_id, machine_type, start_time, end_time, duration) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            where="synced = 0 AND end_time IS NOT NULL",
+            # Azure keeps the usage history; the station only needs sessions not yet uploaded
+            delete=True
+        )
+        if sent:
+            logger.info(f"[SYNC] {sent} sessions synced to Azure")
+        return True
+    except Exception as e:
+        logger.error(f"[SYNC] Session sync failed: {e}")
+        return False
+
+def upload_backlog():
+    # Both run even if the first fails
+    results = [push_access_requests(), push_session_backlog()]
+    return all(results)
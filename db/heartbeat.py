@@ -0,0 +1,47 @@
+# db/heartbeat.py
+"""
+File: heartbeat.py
+Description:
+  Background heartbeat for this machine. Stamps Machine.last_heartbeat locally on a fixed cadence
+  and pushes the machine row to Azure once per interval, so the dashboard can tell an idle healthy
+  station from a dead one. Status changes between beats are carried by that single push.
+"""
+
+import logging
+import threading
+from config import constants
+from config.constants import HEARTBEAT_INTERVAL_DEFAULT
+from db.local_db import get_local_db
+from db.azure_sync import push_machine_status
+
+logger = logging.getLogger("heartbeat")
+
+
+class HeartbeatWorker(threading.Thread):
+    def __init__(self, machine_id=None, interval=HEARTBEAT_INTERVAL_DEFAULT):
+        super().__init__(name="heartbeat", daemon=True)
+        self.machine_id = machine_id or constants.MACHINE_ID
+        self.interval = interval
+        self.last_push_ok = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def beat(self, db):
+        db.update_machine_heartbeat(self.machine_id)
+        self.last_push_ok = push_machine_status(self.machine_id)
+        try:
+            self.interval = int(db.get_setting("heartbeat_interval_seconds", default=self.interval))
+        except (TypeError, ValueError):
+            pass
+
+    def run(self):
+        db = get_local_db()
+        logger.info("[HEARTBEAT] Worker started.")
+        while not self._stop_event.is_set():
+            try:
+                self.beat(db)
+            except Exception as e:
+                logger.error(f"[HEARTBEAT] Beat failed: {e}")
+            self._stop_event.wait(self.interval)
@@ -8,27 +8,78 @@ Description:
 
 import sqlite3
 import os
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from config.constants import LOCAL_DB_PATH
-from create_local_db import create_local_db
+from utils import metrics
+from create_local_db import create_local_db, connect_local_db, migrate
 from config.constants import (
     STATUS_NEUTRAL, STATUS_IN_USE, STATUS_OFFLINE, STATUS_MAINTENANCE
 )
 
+logger = logging.getLogger("local_db")
+
+QUERY_SECONDS = metrics.histogram("emec_local_db_seconds", "LocalDB call latency, including lock wait")
+
+
+def _synchronized(method):
+    # One connection is shared by the station loop and the background workers, so each call
+    # holds the lock for its execute/fetch pair
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                return method(self, *args, **kwargs)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start, method=method.__name__)
+    return wrapper
+
 
 class LocalDB:
     def __init__(self):
         if not os.path.exists(LOCAL_DB_PATH):
             create_local_db()
 
-        self.conn = sqlite3.connect(LOCAL_DB_PATH)
+        self.conn = connect_local_db(LOCAL_DB_PATH, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        migrate(self.conn)
         self.cursor = self.conn.cursor()
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self):
+        # Groups several calls into one commit. The lock is held throughout, so other threads
+        # never see (or commit) half of the group. Nested blocks join the outer one.
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except Exception:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                with QUERY_SECONDS.time(method="commit"):
+                    self.conn.commit()
+
+    def _commit(self):
+        if self._depth == 0:
+            self.conn.commit()
 
+    @_synchronized
     def get_machine(self, machine_id):
         self.cursor.execute("SELECT * FROM Machine WHERE machine_id = ?", (machine_id,))
         return self.cursor.fetchone()
 
+    @_synchronized
     def insert_machine_if_missing(self, machine_id, machine_name, machine_type):
         self.cursor.execute("SELECT * FROM Machine WHERE machine_id = ?", (machine_id,))
         if not self.cursor.fetchone():
@@ -36,33 +87,39 @@ class LocalDB:
                 INSERT INTO Machine (machine_id, machine_name, machine_type, machine_status)
                 VALUES (?, ?, ?, ?)
             """, (machine_id, machine_name, machine_type, STATUS_NEUTRAL))
-            self.conn.commit()
+            self._commit()
 
+    @_synchronized
     def update_machine_status(self, machine_id, status):
         if (status != STATUS_MAINTENANCE):
             self.cursor.execute("UPDATE Machine SET machine_status = ? WHERE machine_id = ?", (status, machine_id))
-            self.conn.commit()
+            self._commit()
         else:
             logger.warning(f"{machine_id} is in maintenance mode, status update skipped.")
 
+    @_synchronized
     def update_machine_ip(self, machine_id, device_ip):
         self.cursor.execute("UPDATE Machine SET device_ip = ? WHERE machine_id = ?", (device_ip, machine_id))
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def update_machine_device(self, machine_id, device_id):
         self.cursor.execute("UPDATE Machine SET device_id = ? WHERE machine_id = ?", (device_id, machine_id))
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def update_machine_heartbeat(self, machine_id):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute("UPDATE Machine SET last_heartbeat = ? WHERE machine_id = ?", (now, machine_id))
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def get_setting(self, key, default=None):
         self.cursor.execute("SELECT value FROM System_Settings WHERE setting = ?", (key,))
         row = self.cursor.fetchone()
         return row["value"] if row else default
 
+    @_synchronized
     def get_open_close_times(self):
         self.cursor.execute(
             "SELECT setting, value FROM System_Settings WHERE setting IN ('lab_open_time', 'lab_close_time')"
@@ -70,10 +127,12 @@ class LocalDB:
         settings = {row['setting']: row['value'] for row in self.cursor.fetchall()}
         return settings.get('lab_open_time'), settings.get('lab_close_time')
 
+    @_synchronized
     def get_user(self, csu_id):
         self.cursor.execute("SELECT * FROM Users WHERE csu_id = ?", (csu_id,))
         return self.cursor.fetchone()
 
+    @_synchronized
     def has_permission(self, csu_id, machine_id):
         self.cursor.execute(
             "SELECT 1 FROM Machine_Permissions WHERE csu_id = ? AND machine_id = ?",
@@ -81,6 +140,7 @@ class LocalDB:
         )
         return self.cursor.fetchone() is not None
 
+    @_synchronized
     def access_request_exists(self, csu_id, machine_id):
         self.cursor.execute(
             "SELECT 1 FROM Access_Requests WHERE csu_id = ? AND machine_id = ? AND status = 'under review'",
@@ -88,6 +148,7 @@ class LocalDB:
         )
         return self.cursor.fetchone() is not None
 
+    @_synchronized
     def insert_access_request(self, csu_id, machine_id, uid_fallback):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute("SELECT uid FROM Users WHERE csu_id = ?", (csu_id,))
@@ -98,28 +159,36 @@ class LocalDB:
         machine = self.cursor.fetchone()
         machine_type = machine["machine_type"] if machine else None
 
+        # Until Azure assigns the real id, a local request takes a negative placeholder so it can
+        # never clash with a request_id pulled from Azure
         self.cursor.execute("""
             INSERT INTO Access_Requests (
-                uid, csu_id, machine_id, machine_type,
-                status, requested_on
-            ) VALUES (?, ?, ?, ?, 'under review', ?)
+                request_id, uid, csu_id, machine_id, machine_type,
+                status, requested_on, synced
+            ) VALUES (
+                (SELECT MIN(IFNULL(MIN(request_id), 0), 0) - 1 FROM Access_Requests),
+                ?, ?, ?, ?, 'under review', ?, 0
+            )
         """, (uid, csu_id, machine_id, machine_type, now))
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def mark_user_active(self, csu_id):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute(
             "UPDATE Users SET is_active = 1, last_used = ? WHERE csu_id = ?", (now, csu_id,)
         )
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def mark_user_inactive(self, csu_id):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute(
             "UPDATE Users SET is_active = 0, last_used = ? WHERE csu_id = ?", (now, csu_id,)
         )
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def insert_session(self, session_id, csu_id, machine_id):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute("SELECT machine_type FROM Machine WHERE machine_id = ?", (machine_id,))
@@ -131,8 +200,9 @@ class LocalDB:
             "VALUES (?, ?, ?, ?, ?)",
             (session_id, csu_id, machine_id, machine_type, now)
         )
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def end_session(self, session_id):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.cursor.execute("""
@@ -141,17 +211,25 @@ class LocalDB:
                 duration = ((strftime('%s',?) - strftime('%s', start_time)) / 60)
             WHERE session_id = ?
         """, (now, now, session_id,))
-        self.conn.commit()
+        self._commit()
 
+    @_synchronized
     def ensure_user_uid(self, csu_id, uid):
         self.cursor.execute("SELECT uid FROM Users WHERE csu_id = ?", (csu_id,))
         result = self.cursor.fetchone()
         if result and (result["uid"] is None or result["uid"].strip() == ""):
             self.cursor.execute("UPDATE Users SET uid = ? WHERE csu_id = ?", (str(uid), csu_id))
-            self.conn.commit()
+            self._commit()
             return True
         return False
 
+    @_synchronized
+    def clear_user_uid(self, csu_id, uid):
+        self.cursor.execute("UPDATE Users SET uid = NULL WHERE csu_id = ? AND uid = ?", (csu_id, str(uid)))
+        self._commit()
+        return self.cursor.rowcount > 0
+
+    @_synchronized
     def user_has_level(self, csu_id, level_name):
         self.cursor.execute(
             "SELECT 1 FROM User_Access WHERE csu_id = ? AND level_name = ?",
@@ -159,5 +237,161 @@ class LocalDB:
         )
         return self.cursor.fetchone() is not None
 
+    @_synchronized
+    def get_user_levels(self, csu_id):
+        self.cursor.execute("SELECT level_name FROM User_Access WHERE csu_id = ?", (csu_id,))
+        return {row["level_name"] for row in self.cursor.fetchall()}
+
+    @_synchronized
+    def get_all_users(self):
+        self.cursor.execute("SELECT * FROM Users")
+        return self.cursor.fetchall()
+
+    @_synchronized
+    def get_permitted_csu_ids(self, machine_id):
+        self.cursor.execute("SELECT csu_id FROM Machine_Permissions WHERE machine_id = ?", (machine_id,))
+        return [row["csu_id"] for row in self.cursor.fetchall()]
+
+    @_synchronized
+    def get_all_user_levels(self):
+        self.cursor.execute("SELECT csu_id, level_name FROM User_Access")
+        return self.cursor.fetchall()
+
+    @_synchronized
+    def get_pending_request_csu_ids(self, machine_id):
+        self.cursor.execute(
+            "SELECT csu_id FROM Access_Requests WHERE machine_id = ? AND status = 'under review'", (machine_id,)
+        )
+        return [row["csu_id"] for row in self.cursor.fetchall()]
+
+    @_synchronized
+    def enqueue_outbox(self, kind, item_key):
+        # Repeated updates for the same key collapse into one row; the version bump tells
+        # the worker the state changed while it was pushing.
+        now = time.time()
+        self.cursor.execute("""
+            INSERT INTO Sync_Outbox (kind, item_key, created_at, next_attempt_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (kind, item_key) DO UPDATE SET version = version + 1
+        """, (kind, str(item_key), now, now))
+        self._commit()
+
+    @_synchronized
+    def get_due_outbox(self, limit=20):
+        self.cursor.execute(
+            "SELECT * FROM Sync_Outbox WHERE next_attempt_at <= ? ORDER BY outbox_id LIMIT ?",
+            (time.time(), limit)
+        )
+        return self.cursor.fetchall()
+
+    @_synchronized
+    def complete_outbox(self, outbox_id, version):
+        self.cursor.execute("DELETE FROM Sync_Outbox WHERE outbox_id = ? AND version = ?", (outbox_id, version))
+        self._commit()
+
+    @_synchronized
+    def retry_outbox(self, outbox_id, attempts, next_attempt_at, error):
+        self.cursor.execute(
+            "UPDATE Sync_Outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE outbox_id = ?",
+            (attempts, next_attempt_at, error, outbox_id)
+        )
+        self._commit()
+
+    @_synchronized
+    def reset_outbox_backoff(self):
+        self.cursor.execute("UPDATE Sync_Outbox SET next_attempt_at = ?", (time.time(),))
+        self._commit()
+
+    @_synchronized
+    def last_synced(self):
+        self.cursor.execute("SELECT MIN(last_synced) AS last_synced FROM Sync_State")
+        row = self.cursor.fetchone()
+        return row["last_synced"] if row else None
+
+    @_synchronized
+    def outbox_stats(self):
+        self.cursor.execute("SELECT COUNT(*) AS depth, MIN(created_at) AS oldest FROM Sync_Outbox")
+        row = self.cursor.fetchone()
+        oldest_age = time.time() - row["oldest"] if row["oldest"] is not None else 0
+        return row["depth"], oldest_age
+
+    @_synchronized
+    def get_unsynced(self, table, columns, where="synced = 0", limit=None):
+        self.cursor.execute(
+            f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE {where} ORDER BY rowid LIMIT ?",
+            (limit or -1,)
+        )
+        return self.cursor.fetchall()
+
+    @_synchronized
+    def mark_synced(self, table, rowids):
+        self.cursor.executemany(f"UPDATE {table} SET synced = 1 WHERE rowid = ?", [(rowid,) for rowid in rowids])
+        self._commit()
+
+    @_synchronized
+    def settle_access_request(self, local_id, request_id):
+        # Swaps the placeholder id for the one Azure assigned. A pull may already have fetched
+        # the uploaded row under its new id; that copy is the same request and gives way.
+        self.cursor.execute("DELETE FROM Access_Requests WHERE request_id = ? AND synced = 1", (request_id,))
+        self.cursor.execute(
+            "UPDATE Access_Requests SET request_id = ?, synced = 1 WHERE request_id = ?", (request_id, local_id)
+        )
+        self._commit()
+
+    @_synchronized
+    def delete_rows(self, table, rowids):
+        self.cursor.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(rowid,) for rowid in rowids])
+        self._commit()
+
+    @_synchronized
+    def load_snapshot(self, path, tables, keep_unsynced=()):
+        # Replaces each table with the snapshot file's copy in a single transaction, so readers
+        # see either the old data or the new. Rows still waiting for upload (synced = 0) in
+        # keep_unsynced tables are kept. Returns {table: rows_loaded}.
+        if self._depth == 0:
+            self.conn.commit()
+        self.cursor.execute("ATTACH DATABASE ? AS snapshot", (path,))
+        try:
+            loaded = {}
+            with self.transaction():
+                for table in tables:
+                    self.cursor.execute(f"PRAGMA snapshot.table_info({table})")
+                    remote = {row[1] for row in self.cursor.fetchall()}
+                    if not remote:
+                        continue
+                    self.cursor.execute(f"PRAGMA main.table_info({table})")
+                    columns = ", ".join(row[1] for row in self.cursor.fetchall() if row[1] in remote)
+                    pending = " WHERE synced = 1" if table in keep_unsynced else ""
+                    self.cursor.execute(f"DELETE FROM main.{table}{pending}")
+                    self.cursor.execute(
+                        f"INSERT OR REPLACE INTO main.{table} ({columns}) SELECT {columns} FROM snapshot.{table}"
+                    )
+                    loaded[table] = self.cursor.rowcount
+            return loaded
+        finally:
+            self.cursor.execute("DETACH DATABASE snapshot")
+
+    @_synchronized
     def close(self):
         self.conn.close()
+
+
+_shared_db = None
+_shared_lock = threading.Lock()
+
+
+def get_local_db():
+    # Process-wide connection used by every module; close_local_db() on shutdown
+    global _shared_db
+    with _shared_lock:
+        if _shared_db is None:
+            _shared_db = LocalDB()
+        return _shared_db
+
+
+def close_local_db():
+    global _shared_db
+    with _shared_lock:
+        if _shared_db is not None:
+            _shared_db.close()
+            _shared_db = None
@@ -0,0 +1,103 @@
+# db/outbox.py
+"""
+File: outbox.py
+Description:
+  Durable outbound queue for Azure pushes. The hardware loop only enqueues work into the
+  local Sync_Outbox table; a background worker drains it with retries and exponential backoff
+  so session start/end never waits on a cloud round trip.
+"""
+
+import time
+import logging
+import threading
+from config.constants import OUTBOX_POLL_INTERVAL, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX
+from db.local_db import get_local_db
+from utils import metrics
+from db.azure_sync import (
+    push_machine_status, push_user_status, push_user_update, push_access_requests, push_session_backlog,
+    refresh_user_from_azure
+)
+
+logger = logging.getLogger("outbox")
+
+KIND_MACHINE_STATUS = "machine_status"
+KIND_USER_STATUS = "user_status"
+KIND_USER_UPDATE = "user_update"
+KIND_SESSION = "session"
+KIND_ACCESS_REQUESTS = "access_requests"
+KIND_REFRESH_USER = "refresh_user"
+
+HANDLERS = {
+    KIND_MACHINE_STATUS: push_machine_status,
+    KIND_USER_STATUS: push_user_status,
+    KIND_USER_UPDATE: push_user_update,
+    KIND_SESSION: lambda _key: push_session_backlog(),
+    KIND_ACCESS_REQUESTS: lambda _key: push_access_requests(),
+    KIND_REFRESH_USER: refresh_user_from_azure,
+}
+
+_wakeup = threading.Event()
+
+
+def enqueue(kind, item_key="*", db=None):
+    (db or get_local_db()).enqueue_outbox(kind, item_key)
+    _wakeup.set()
+
+
+def outbox_stats():
+    return get_local_db().outbox_stats()
+
+
+metrics.gauge("emec_outbox_depth", "Pending outbox items", lambda: outbox_stats()[0])
+metrics.gauge("emec_outbox_oldest_seconds", "Age of the oldest pending outbox item", lambda: outbox_stats()[1])
+
+
+def backoff_delay(attempts):
+    return min(OUTBOX_RETRY_BASE * (2 ** (attempts - 1)), OUTBOX_RETRY_MAX)
+
+
+class OutboxWorker(threading.Thread):
+    def __init__(self, poll_interval=OUTBOX_POLL_INTERVAL):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def drain_once(self, db):
+        sent = 0
+        for item in db.get_due_outbox():
+            handler = HANDLERS.get(item["kind"])
+            if handler is None:
+                logger.error(f"[OUTBOX] Unknown kind {item['kind']}, dropping")
+                db.complete_outbox(item["outbox_id"], item["version"])
+                continue
+
+            try:
+                ok = handler(item["item_key"])
+                error = None if ok else "push returned failure"
+            except Exception as e:
+                ok, error = False, str(e)
+
+            if ok:
+                db.complete_outbox(item["outbox_id"], item["version"])
+                sent += 1
+            else:
+                attempts = item["attempts"] + 1
+                delay = backoff_delay(attempts)
+                db.retry_outbox(item["outbox_id"], attempts, time.time() + delay, error)
+                logger.warning(f"[OUTBOX] {item['kind']} {item['item_key']} failed (attempt {attempts}), retry in {delay}s")
+        return sent
+
+    def run(self):
+        db = get_local_db()
+        logger.info("[OUTBOX] Worker started.")
+        while not self._stop_event.is_set():
+            try:
+                self.drain_once(db)
+            except Exception as e:
+                logger.error(f"[OUTBOX] Drain failed: {e}")
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
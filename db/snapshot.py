@@ -0,0 +1,322 @@
+# db/snapshot.py
+"""
+File: snapshot.py
+Description:
+  Fleet bootstrap from prebuilt SQLite snapshots.
+  The builder pulls Azure once into a master mirror (incrementally after the first run), then
+  derives a snapshot per machine and/or one for the whole lab, each VACUUMed, gzip-compressed,
+  checksummed and published with a manifest under <out>/<scope>/. Stations fetch their
+  scope's manifest, skip the download when the version is unchanged, verify the file and load
+  it in one local transaction. The snapshot carries Sync_State, so the next Azure sync is a
+  delta rather than a full pull. Any static file server can host the output.
+  The file checksum is only as trustworthy as the manifest it came in, so with EMEC_SNAPSHOT_KEY
+  set the builder signs each manifest (HMAC-SHA256) and stations reject any manifest whose
+  signature doesn't match. Without a key, stations only fetch over HTTPS.
+  Usage: python -m db.snapshot build --out /srv/emec-snapshots --machine M1 --machine M2 [--lab] [--interval 600]
+         python -m db.snapshot fetch [--url https://snapshots.local]
+"""
+
+import os
+import hmac
+import json
+import time
+import gzip
+import shutil
+import sqlite3
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from config import constants
+from config.constants import LOCAL_DB_PATH, SNAPSHOT_TIMEOUT, SNAPSHOT_STATE_PATH, SNAPSHOT_KEEP
+from create_local_db import SCHEMA_VERSION, migrate
+from db.local_db import get_local_db
+from db.azure_sync import (
+    SYNC_TABLES, KEEP_UNSYNCED, pull_to_path, sync_scope, scoped_select,
+    row_key, table_checksum, notify_sync_listeners
+)
+
+logger = logging.getLogger("snapshot")
+
+MASTER_PATH = "data/snapshot-master.db"  # full mirror kept by the builder; never published
+MANIFEST_NAME = "manifest.json"
+LAB_SCOPE = "all"
+
+# Tables a snapshot replaces on the station; everything else (usage, outbox) stays local
+SNAPSHOT_TABLES = list(SYNC_TABLES) + ["Sync_State", "Sync_Row_Hash"]
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_version(conn):
+    # Hash of the rows themselves, so a rebuild with unchanged data keeps its version
+    digest = hashlib.sha256()
+    for table, spec in SYNC_TABLES.items():
+        digest.update(table.encode())
+        for row in conn.execute(f"SELECT * FROM snap.{table} ORDER BY {', '.join(spec['key'])}"):
+            digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()[:16]
+
+
+def _signature(manifest, key):
+    if not key:
+        return None
+    body = json.dumps({k: v for k, v in manifest.items() if k != "signature"}, sort_keys=True, separators=(",", ":"))
+    return hmac.new(key.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+# Raises unless the manifest provably came from the builder: a valid signature when a key is
+# configured, otherwise an HTTPS connection to the server.
+def _check_manifest_source(manifest, base_url, key):
+    if key:
+        if not hmac.compare_digest(str(manifest.get("signature") or ""), _signature(manifest, key)):
+            raise ValueError("manifest signature mismatch")
+    elif not base_url.lower().startswith("https://"):
+        raise ValueError("refusing an unsigned manifest over plain HTTP; set EMEC_SNAPSHOT_KEY or serve over HTTPS")
+
+
+def _read_manifest(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Copies one scope's rows out of the master mirror into a fresh database at path and writes
+# the Sync_State a station would have after pulling that scope itself. Returns {table: rows}.
+def _derive(master_path, path, machine_id):
+    snap = sqlite3.connect(path)
+    migrate(snap)
+    snap.execute("PRAGMA journal_mode = DELETE")
+    snap.close()
+
+    conn = sqlite3.connect(master_path, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS snap", (path,))
+        last_synced = dict(conn.execute("SELECT table_name, last_synced FROM main.Sync_State"))
+        rows = {}
+        conn.execute("BEGIN")
+        for table, spec in SYNC_TABLES.items():
+            query, args = scoped_select(table, spec, machine_id)
+            conn.execute(f"INSERT INTO snap.{table} {query.replace('%s', '?')}", args)
+            rows[table] = conn.execute(f"SELECT COUNT(*) FROM snap.{table}").fetchone()[0]
+
+            # Row hashes don't depend on scope, so the scope's checksum is rebuilt from the
+            # master's hashes of the rows it kept
+            applied = dict(conn.execute("SELECT row_key, row_hash FROM main.Sync_Row_Hash WHERE table_name = ?", (table,)))
+            keys = [row_key(row) for row in conn.execute(f"SELECT {', '.join(spec['key'])} FROM snap.{table}")]
+            hashes = {key: applied[key] for key in keys if key in applied}
+            conn.executemany(
+                "INSERT INTO snap.Sync_Row_Hash (table_name, row_key, row_hash) VALUES (?, ?, ?)",
+                [(table, key, row_hash) for key, row_hash in hashes.items()]
+            )
+            checksum = table_checksum(hashes.values()) if len(hashes) == len(keys) else None
+            table_scope = machine_id if machine_id and spec.get("scope") else None
+            conn.execute(
+                "INSERT INTO snap.Sync_State (table_name, checksum, scope, last_synced) VALUES (?, ?, ?, ?)",
+                (table, checksum, table_scope or LAB_SCOPE, last_synced.get(table))
+            )
+        conn.execute("COMMIT")
+        version = _content_version(conn)
+        synced_at = conn.execute("SELECT MIN(last_synced) FROM snap.Sync_State").fetchone()[0]
+        conn.execute("DETACH DATABASE snap")
+    finally:
+        conn.close()
+
+    snap = sqlite3.connect(path)
+    snap.execute("VACUUM")
+    snap.close()
+    return rows, version, synced_at
+
+
+def _prune(scope_dir, keep):
+    builds = sorted(
+        (entry for entry in os.scandir(scope_dir) if entry.name.startswith("snapshot-")),
+        key=lambda entry: entry.stat().st_mtime, reverse=True
+    )
+    for entry in builds[keep:]:
+        os.remove(entry.path)
+
+
+def publish_snapshot(master_path, out_dir, machine_id=None, keep=SNAPSHOT_KEEP, key=None):
+    key = key or constants.SNAPSHOT_KEY
+    label = machine_id or LAB_SCOPE
+    scope_dir = os.path.join(out_dir, label)
+    os.makedirs(scope_dir, exist_ok=True)
+    build_path = os.path.join(scope_dir, ".build.db")
+    if os.path.exists(build_path):
+        os.remove(build_path)
+
+    try:
+        rows, version, synced_at = _derive(master_path, build_path, machine_id)
+        manifest_path = os.path.join(scope_dir, MANIFEST_NAME)
+        current = _read_manifest(manifest_path)
+        if current and current["version"] == version and current.get("signature") == _signature(current, key):
+            logger.info(f"[SNAPSHOT] {label}: unchanged at {version}")
+            return current
+
+        file_name = f"snapshot-{version}.db.gz"
+        with open(build_path, "rb") as src, gzip.open(os.path.join(scope_dir, f"{file_name}.tmp"), "wb", compresslevel=9) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(os.path.join(scope_dir, f"{file_name}.tmp"), os.path.join(scope_dir, file_name))
+
+        manifest = {
+            "version": version,
+            "scope": label,
+            "file": file_name,
+            "sha256": _file_sha256(os.path.join(scope_dir, file_name)),
+            "size": os.path.getsize(os.path.join(scope_dir, file_name)),
+            "raw_size": os.path.getsize(build_path),
+            "schema_version": SCHEMA_VERSION,
+            "synced_at": synced_at,
+            "built_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "rows": rows,
+        }
+        if key:
+            manifest["signature"] = _signature(manifest, key)
+        # Published last: stations never see a manifest for a file that isn't there yet
+        _write_atomic(manifest_path, json.dumps(manifest, indent=2).encode())
+        _prune(scope_dir, keep)
+        logger.info(
+            f"[SNAPSHOT] {label}: published {version} "
+            f"({manifest['raw_size']} -> {manifest['size']} bytes, {sum(rows.values())} rows)"
+        )
+        return manifest
+    finally:
+        if os.path.exists(build_path):
+            os.remove(build_path)
+
+
+def build_snapshots(out_dir, machine_ids=(), lab=False, all_machines=False, full=False, master_path=MASTER_PATH, key=None):
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(master_path) or ".", exist_ok=True)
+    start = time.monotonic()
+    changes, mode = pull_to_path(master_path, None, full)
+    logger.info(f"[SNAPSHOT] Master {mode} pull: {sum(changes.values())} rows changed in {time.monotonic() - start:.1f}s")
+
+    machine_ids = list(machine_ids)
+    if all_machines:
+        conn = sqlite3.connect(master_path)
+        machine_ids += [row[0] for row in conn.execute("SELECT machine_id FROM Machine") if row[0] not in machine_ids]
+        conn.close()
+    scopes = machine_ids + ([None] if lab else [])
+    return {scope or LAB_SCOPE: publish_snapshot(master_path, out_dir, scope, key=key) for scope in scopes}
+
+
+def _installed_manifest():
+    return _read_manifest(SNAPSHOT_STATE_PATH)
+
+
+# Station side. Returns True when a snapshot was loaded; False when skipped or failed, in which
+# case the regular Azure sync still brings the station up to date.
+def install_snapshot(base_url=None, db=None, timeout=SNAPSHOT_TIMEOUT, key=None):
+    base_url = base_url or constants.SNAPSHOT_URL
+    key = key or constants.SNAPSHOT_KEY
+    if not base_url:
+        return False
+    import urllib.request  # ~40 ms to import; only needed when a snapshot server is configured
+    base_url = base_url.rstrip("/")
+    label = sync_scope() or LAB_SCOPE
+    work_dir = os.path.dirname(LOCAL_DB_PATH) or "."
+    download_path = os.path.join(work_dir, "snapshot.download")
+    db_path = os.path.join(work_dir, "snapshot.db")
+    db = db or get_local_db()
+
+    try:
+        with urllib.request.urlopen(f"{base_url}/{label}/{MANIFEST_NAME}", timeout=timeout) as response:
+            manifest = json.load(response)
+        _check_manifest_source(manifest, base_url, key)
+
+        installed = _installed_manifest()
+        last_synced = db.last_synced()
+        if last_synced and installed and installed.get("version") == manifest["version"]:
+            logger.info(f"[SNAPSHOT] {label} snapshot {manifest['version']} already installed")
+            return False
+        if manifest["schema_version"] > SCHEMA_VERSION:
+            logger.warning(f"[SNAPSHOT] Snapshot schema v{manifest['schema_version']} is newer than v{SCHEMA_VERSION}, skipping")
+            return False
+        if last_synced and manifest.get("synced_at") and manifest["synced_at"] <= last_synced:
+            logger.info(f"[SNAPSHOT] Local data ({last_synced}) is newer than snapshot ({manifest['synced_at']})")
+            return False
+
+        start = time.monotonic()
+        digest = hashlib.sha256()
+        with urllib.request.urlopen(f"{base_url}/{label}/{manifest['file']}", timeout=timeout) as response, \
+                open(download_path, "wb") as f:
+            for block in iter(lambda: response.read(1 << 16), b""):
+                digest.update(block)
+                f.write(block)
+        if digest.hexdigest() != manifest["sha256"]:
+            raise ValueError(f"checksum mismatch for {manifest['file']}")
+
+        with gzip.open(download_path, "rb") as src, open(db_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        loaded = db.load_snapshot(db_path, SNAPSHOT_TABLES, keep_unsynced=KEEP_UNSYNCED)
+        _write_atomic(SNAPSHOT_STATE_PATH, json.dumps(manifest, indent=2).encode())
+
+        notify_sync_listeners({table: rows for table, rows in loaded.items() if table in SYNC_TABLES}, True)
+        logger.info(
+            f"[SNAPSHOT] Installed {label} snapshot {manifest['version']} "
+            f"({manifest['size']} bytes, {sum(loaded.values())} rows) in {time.monotonic() - start:.2f}s"
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"[SNAPSHOT] Snapshot install failed, falling back to Azure sync: {e}")
+        return False
+    finally:
+        for path in (download_path, db_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or fetch local DB snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="pull Azure and publish snapshots")
+    build.add_argument("--out", required=True, help="directory served to stations")
+    build.add_argument("--machine", action="append", default=[], help="machine_id to build a snapshot for (repeatable)")
+    build.add_argument("--all-machines", action="store_true", help="one snapshot per machine in Azure")
+    build.add_argument("--lab", action="store_true", help="also build the unscoped lab snapshot")
+    build.add_argument("--master", default=MASTER_PATH, help="builder's full Azure mirror (keep outside --out)")
+    build.add_argument("--full", action="store_true", help="reload the master mirror from scratch")
+    build.add_argument("--interval", type=float, help="rebuild every INTERVAL seconds")
+    fetch = commands.add_parser("fetch", help="install the latest snapshot on this station")
+    fetch.add_argument("--url", help="snapshot server base URL (default EMEC_SNAPSHOT_URL)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "fetch":
+        install_snapshot(args.url)
+        return
+
+    while True:
+        try:
+            build_snapshots(args.out, args.machine, args.lab, args.all_machines, args.full, args.master)
+        except Exception as e:
+            logger.error(f"[SNAPSHOT] Build failed: {e}")
+            if not args.interval:
+                raise
+        if not args.interval:
+            return
+        args.full = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
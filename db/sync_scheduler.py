@@ -0,0 +1,117 @@
+# db/sync_scheduler.py
+"""
+File: sync_scheduler.py
+Description:
+  Runs incremental Azure pulls in the background on a jittered interval so permission changes
+  reach idle stations without a restart, while spreading the fleet's load on the shared database.
+  Pulls wait while a session is starting or ending, and back off exponentially on failure.
+  Every pull's apply phase, whoever started it, waits the same way.
+"""
+
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from config.constants import SYNC_INTERVAL_DEFAULT, SYNC_JITTER, SYNC_MAX_BACKOFF
+from db.local_db import get_local_db
+from db.azure_sync import sync_local_from_azure, upload_backlog, set_apply_guard
+from utils import metrics
+
+logger = logging.getLogger("sync_scheduler")
+
+
+class SyncScheduler(threading.Thread):
+    def __init__(self, interval=SYNC_INTERVAL_DEFAULT, jitter=SYNC_JITTER, max_backoff=SYNC_MAX_BACKOFF):
+        super().__init__(name="sync-scheduler", daemon=True)
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.last_success = None
+        self.last_error = None
+        self._critical = 0
+        self._applying = False
+        self._critical_lock = threading.Condition()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stop_event = threading.Event()
+
+    @contextmanager
+    def critical(self):
+        # Session start/end paths hold this so a pull never competes with them for the local DB
+        with self._critical_lock:
+            self._critical_lock.wait_for(lambda: not self._applying)
+            self._critical += 1
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            with self._critical_lock:
+                self._critical -= 1
+                if self._critical == 0:
+                    self._idle.set()
+                    self._critical_lock.notify_all()
+
+    @contextmanager
+    def quiet(self):
+        # A pull's apply phase: waits for _idle, then holds new session starts/ends off
+        # until its write transaction is done
+        with self._critical_lock:
+            self._critical_lock.wait_for(self._idle.is_set)
+            self._applying = True
+        try:
+            yield
+        finally:
+            with self._critical_lock:
+                self._applying = False
+                self._critical_lock.notify_all()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _load_interval(self):
+        try:
+            return int(get_local_db().get_setting("sync_interval_seconds", default=self.interval))
+        except (TypeError, ValueError):
+            return self.interval
+
+    def next_delay(self):
+        base = min(self.interval * (2 ** self.failures), self.max_backoff) if self.failures else self.interval
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def sync_once(self):
+        self._idle.wait()
+        try:
+            # Upload first so the pull does not race local rows that are still pending
+            upload_backlog()
+            changes = sync_local_from_azure()
+            self.failures = 0
+            self.last_success = time.time()
+            self.last_error = None
+            logger.info(f"[SCHEDULER] Periodic sync done: {sum(changes.values())} rows changed")
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"[SCHEDULER] Periodic sync failed ({self.failures} in a row): {e}")
+            return False
+
+    def run(self):
+        # Random first delay so stations restarting together don't pull at the same moment
+        self.interval = self._load_interval()
+        if self._stop_event.wait(random.uniform(0, self.interval)):
+            return
+        while not self._stop_event.is_set():
+            self.sync_once()
+            self.interval = self._load_interval()
+            self._stop_event.wait(self.next_delay())
+
+
+sync_scheduler = SyncScheduler()
+set_apply_guard(sync_scheduler.quiet)
+metrics.gauge("emec_sync_consecutive_failures", "Periodic syncs failed in a row", lambda: sync_scheduler.failures)
+metrics.gauge(
+    "emec_sync_last_success_timestamp", "Unix time of the last successful periodic sync",
+    lambda: sync_scheduler.last_success or 0
+)
@@ -0,0 +1,99 @@
+# hal/card_script.py
+"""
+File: card_script.py
+Description:
+  Scripted card traffic for the simulated MFRC522. A script is a list of steps, each
+  placing or removing a card after a delay. Steps can be written by hand, loaded from JSON
+  or generated as steady taps or bursts. Placement times are recorded so tap-to-relay
+  latency can be computed against SimGPIO's output history.
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger("card_script")
+
+PLACE = "place"
+REMOVE = "remove"
+
+# delay: seconds after the previous step
+Step = namedtuple("Step", ["delay", "action", "csu_id", "uid"])
+
+
+def tap(csu_id, hold=2.0, gap=1.0, uid=None):
+    return [Step(gap, PLACE, csu_id, uid), Step(hold, REMOVE, csu_id, uid)]
+
+
+def steady(csu_ids, hold=2.0, gap=1.0):
+    steps = []
+    for csu_id in csu_ids:
+        steps += tap(csu_id, hold, gap)
+    return steps
+
+
+def bursty(csu_ids, bursts=5, burst_size=4, burst_gap=10.0, tap_gap=(0.05, 0.3), hold=(0.2, 1.0), seed=None):
+    # Clusters of quick taps, some of which swap cards without lifting the first one
+    rng = random.Random(seed)
+    steps = []
+    for burst in range(bursts):
+        gap = burst_gap if burst else 0
+        for _ in range(burst_size):
+            csu_id = rng.choice(csu_ids)
+            steps.append(Step(gap, PLACE, csu_id, None))
+            if rng.random() < 0.75:
+                steps.append(Step(rng.uniform(*hold), REMOVE, csu_id, None))
+            gap = rng.uniform(*tap_gap)
+        steps.append(Step(rng.uniform(*hold), REMOVE, None, None))
+    return steps
+
+
+def load_script(path):
+    # [{"delay": 1.0, "action": "place", "csu_id": 830000001}, {"delay": 3, "action": "remove"}, ...]
+    with open(path, "r") as f:
+        return [
+            Step(float(item.get("delay", 0)), item["action"], item.get("csu_id"), item.get("uid"))
+            for item in json.load(f)
+        ]
+
+
+class CardScript(threading.Thread):
+    def __init__(self, field, steps, repeat=1):
+        super().__init__(name="card-script", daemon=True)
+        self.field = field
+        self.steps = list(steps)
+        self.repeat = repeat
+        self.placed = []
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        for _ in range(self.repeat):
+            for step in self.steps:
+                if self._stop_event.wait(step.delay):
+                    self.finished.set()
+                    return
+                if step.action == PLACE:
+                    self.field.place(step.csu_id, step.uid)
+                    self.placed.append((time.monotonic(), step.csu_id))
+                else:
+                    self.field.remove()
+        logger.info(f"[SIM] Card script finished: {len(self.placed)} taps")
+        self.finished.set()
+
+
+def tap_to_relay(placed, gpio_history, relay_pin):
+    # For each tap, seconds until the relay next went HIGH before the following tap; None if it never did
+    closes = [t for t, pin, value in gpio_history if pin == relay_pin and value]
+    latencies = []
+    for index, (placed_at, _) in enumerate(placed):
+        next_tap = placed[index + 1][0] if index + 1 < len(placed) else float("inf")
+        hit = next((t for t in closes if placed_at <= t < next_tap), None)
+        latencies.append(None if hit is None else hit - placed_at)
+    return latencies
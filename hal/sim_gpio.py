@@ -0,0 +1,70 @@
+# hal/sim_gpio.py
+"""
+File: sim_gpio.py
+Description:
+  Simulated RPi.GPIO for off-Pi runs. Exposes the subset of the module API the station uses,
+  keeps pin levels, and timestamps every output change so tests can measure when the relay
+  actually switched. Edge callbacks registered with add_event_detect fire through trigger().
+"""
+
+import time
+import threading
+from config.constants import SIM_LATENCY
+
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_UP = 22
+PUD_DOWN = 21
+FALLING = 32
+RISING = 31
+
+
+class SimGPIO:
+    BOARD, BCM, OUT, IN, LOW, HIGH = BOARD, BCM, OUT, IN, LOW, HIGH
+    PUD_UP, PUD_DOWN, FALLING, RISING = PUD_UP, PUD_DOWN, FALLING, RISING
+
+    def __init__(self, latency=None):
+        self.latency = SIM_LATENCY["gpio_write"] if latency is None else latency
+        self.mode = None
+        self.pins = {}
+        self.callbacks = {}
+        self.history = []
+        self._lock = threading.Lock()
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.pins.setdefault(pin, HIGH if pull_up_down == PUD_UP else LOW)
+            if initial is not None:
+                self.pins[pin] = initial
+
+    def output(self, pin, value):
+        time.sleep(self.latency)
+        with self._lock:
+            self.pins[pin] = value
+            self.history.append((time.monotonic(), pin, value))
+
+    def input(self, pin):
+        return self.pins.get(pin, LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def trigger(self, pin):
+        callback = self.callbacks.get(pin)
+        if callback:
+            callback(pin)
+
+    def cleanup(self):
+        with self._lock:
+            self.pins.clear()
+            self.callbacks.clear()
@@ -0,0 +1,116 @@
+# hal/sim_mfrc522.py
+"""
+File: sim_mfrc522.py
+Description:
+  Simulated MFRC522 for off-Pi runs, with the same method names and status codes as the
+  mfrc522 package. Cards are placed on and removed from the antenna field by tests or the
+  card script, and each call sleeps for its modelled SPI/RF latency. The ISO 14443 card
+  states are modelled, so a card left ACTIVE ignores the next REQA/WUPA and drops back to
+  IDLE just like a real tag.
+"""
+
+import time
+import threading
+from config.constants import SIM_LATENCY
+from rfid.reader import AUTH_KEY, SECTOR
+
+
+class SimCard:
+    def __init__(self, csu_id, uid=None, key=AUTH_KEY):
+        uid = list((uid if uid is not None else int(csu_id) & 0xFFFFFFFF).to_bytes(4, "big"))
+        bcc = uid[0] ^ uid[1] ^ uid[2] ^ uid[3]
+        self.uid = uid + [bcc]
+        self.csu_id = int(csu_id)
+        self.key = list(key)
+        self.state = "idle"
+        # CSU cards store the ID x10 in bytes 3-7 of the sector's first block
+        block = [0] * 16
+        block[3:8] = list((self.csu_id * 10).to_bytes(5, "big"))
+        self.blocks = {SECTOR * 4: block}
+
+
+class SimMFRC522:
+    MI_OK = 0
+    MI_NOTAGERR = 1
+    MI_ERR = 2
+    PICC_REQIDL = 0x26
+    PICC_REQALL = 0x52
+    PICC_AUTHENT1A = 0x60
+    PICC_AUTHENT1B = 0x61
+
+    def __init__(self, latency=None):
+        self.latency = dict(SIM_LATENCY, **(latency or {}))
+        self.card = None
+        self.calls = {}
+        self._authed = False
+        self._lock = threading.Lock()
+
+    def place(self, csu_id, uid=None):
+        with self._lock:
+            self.card = SimCard(csu_id, uid)
+            self._authed = False
+        return self.card
+
+    def remove(self):
+        with self._lock:
+            self.card = None
+            self._authed = False
+
+    def _wait(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        time.sleep(self.latency[op])
+
+    def MFRC522_Request(self, reqMode):
+        card = self.card
+        if card is None:
+            self._wait("rfid_timeout")
+            return (self.MI_NOTAGERR, None)
+        answers = ("idle",) if reqMode == self.PICC_REQIDL else ("idle", "halt")
+        if card.state not in answers:
+            # Unexpected command in READY/ACTIVE: the card returns to IDLE without answering
+            card.state = "idle"
+            self._wait("rfid_timeout")
+            return (self.MI_NOTAGERR, None)
+        card.state = "ready"
+        self._wait("rfid_request")
+        return (self.MI_OK, 0x10)
+
+    def MFRC522_Anticoll(self):
+        card = self.card
+        if card is None or card.state != "ready":
+            self._wait("rfid_timeout")
+            return (self.MI_ERR, [])
+        self._wait("rfid_anticoll")
+        return (self.MI_OK, list(card.uid))
+
+    def MFRC522_SelectTag(self, serNum):
+        card = self.card
+        self._wait("rfid_select")
+        if card is None or list(serNum) != card.uid:
+            return 0
+        card.state = "active"
+        self._authed = False
+        return 8
+
+    def MFRC522_Auth(self, authMode, BlockAddr, Sectorkey, serNum):
+        card = self.card
+        self._wait("rfid_auth")
+        if card is None or card.state != "active" or list(Sectorkey) != card.key:
+            return self.MI_ERR
+        self._authed = True
+        return self.MI_OK
+
+    def MFRC522_Read(self, blockAddr):
+        card = self.card
+        self._wait("rfid_read")
+        if card is None or not self._authed:
+            return None
+        return list(card.blocks.get(blockAddr, [0] * 16))
+
+    def MFRC522_StopCrypto1(self):
+        self._authed = False
+
+    def MFRC522_Halt(self):
+        card = self.card
+        if card is not None:
+            card.state = "halt"
@@ -0,0 +1,30 @@
+# hal/sim_smbus.py
+"""
+File: sim_smbus.py
+Description:
+  Simulated smbus.SMBus for the RGB1602 driver. Each write costs one I2C transaction of
+  latency, and writes are counted per device address so render cost can be compared.
+"""
+
+import time
+import threading
+from config.constants import SIM_LATENCY
+
+
+class SimSMBus:
+    def __init__(self, bus=1, latency=None):
+        self.bus = bus
+        self.latency = SIM_LATENCY["i2c_write"] if latency is None else latency
+        self.writes = {}
+        self.registers = {}
+        self._lock = threading.Lock()
+
+    def write_byte_data(self, addr, reg, value):
+        # The I2C bus carries one transaction at a time
+        with self._lock:
+            time.sleep(self.latency)
+            self.writes[addr] = self.writes.get(addr, 0) + 1
+            self.registers[(addr, reg)] = value
+
+    def total_writes(self):
+        return sum(self.writes.values())
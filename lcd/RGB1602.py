@@ -6,8 +6,6 @@ Description:
 """
 
 import time
-from smbus import SMBus
-b = SMBus(1)
 
 #Device I2C Arress
 LCD_ADDRESS   =  (0x7c>>1)
@@ -59,7 +57,12 @@ LCD_5x8DOTS = 0x00
 
 
 class RGB1602:
-  def __init__(self, col, row):
+  def __init__(self, col, row, bus=None):
+    # bus: anything with write_byte_data(addr, reg, value); defaults to I2C bus 1
+    if bus is None:
+      from smbus import SMBus
+      bus = SMBus(1)
+    self.bus = bus
     self._row = row
     self._col = col
     self._showfunction = LCD_4BITMODE | LCD_1LINE | LCD_5x8DOTS;
@@ -67,13 +70,13 @@ class RGB1602:
 
         
   def command(self,cmd):
-    b.write_byte_data(LCD_ADDRESS,0x80,cmd)
+    self.bus.write_byte_data(LCD_ADDRESS,0x80,cmd)
 
   def write(self,data):
-    b.write_byte_data(LCD_ADDRESS,0x40,data)
+    self.bus.write_byte_data(LCD_ADDRESS,0x40,data)
     
   def setReg(self,reg,data):
-    b.write_byte_data(RGB_ADDRESS,reg,data)
+    self.bus.write_byte_data(RGB_ADDRESS,reg,data)
 
 
   def setRGB(self,r,g,b):
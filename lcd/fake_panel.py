@@ -0,0 +1,41 @@
+# lcd/fake_panel.py
+"""
+File: fake_panel.py
+Description:
+  In-memory stand-in for the RGB1602 panel used in tests and off-Pi runs.
+  Mirrors the character grid and backlight colour and counts the writes that would hit I2C.
+"""
+
+
+class FakePanel:
+    def __init__(self, col=16, row=2):
+        self._col = col
+        self._row = row
+        self.grid = [[" "] * col for _ in range(row)]
+        self.rgb = None
+        self.cursor = (0, 0)
+        self.char_writes = 0
+        self.rgb_writes = 0
+
+    def setRGB(self, r, g, b):
+        self.rgb = (r, g, b)
+        self.rgb_writes += 1
+
+    def setCursor(self, col, row):
+        self.cursor = (col, row)
+
+    def printout(self, arg):
+        col, row = self.cursor
+        for ch in str(arg):
+            if col < self._col:
+                self.grid[row][col] = ch
+            col += 1
+            self.char_writes += 1
+        self.cursor = (col, row)
+
+    def clear(self):
+        self.grid = [[" "] * self._col for _ in range(self._row)]
+        self.cursor = (0, 0)
+
+    def lines(self):
+        return ["".join(row) for row in self.grid]
@@ -4,13 +4,101 @@ File: lcd.py
 Description:
   Provides functions to control the 16x2 LCD display connected to the Raspberry Pi.
   Handles message display, text formatting, and system status updates for the EMEC AMS interface.
+  Frames are rendered by a single background thread that owns the panel and only rewrites
+  the characters and backlight colour that changed, so callers never block on I2C.
 """
 
-from lcd.RGB1602 import RGB1602
+import queue
+import logging
+import threading
+from collections import namedtuple
+from utils import metrics
+
+logger = logging.getLogger("lcd")
+
+LCD_COLS = 16
+LCD_ROWS = 2
+
+COLOR_MAP = {
+    "green": (0, 255, 0),
+    "red": (255, 0, 0),
+    "yellow": (255, 100, 0),
+    "gray": (80, 80, 80),
+    "white": (255, 255, 255)
+}
+
+Frame = namedtuple("Frame", ["lines", "rgb"])
+
+RENDER_SECONDS = metrics.histogram("emec_lcd_render_seconds", "Time to write one frame to the panel")
+FRAMES_SKIPPED = metrics.counter("emec_lcd_frames_skipped_total", "Frames superseded before they were drawn")
+
+
+class DisplayThread(threading.Thread):
+    def __init__(self, panel):
+        super().__init__(name="lcd-display", daemon=True)
+        self.panel = panel
+        self.frames = queue.Queue()
+        self.current = None
+        self.latest = None
+        self.start()
+
+    def submit(self, frame):
+        self.latest = frame
+        self.frames.put(frame)
+
+    def flush(self, timeout=None):
+        done = threading.Event()
+        self.frames.put(done)
+        return done.wait(timeout)
+
+    def _render(self, frame):
+        if self.current is None or frame.rgb != self.current.rgb:
+            self.panel.setRGB(*frame.rgb)
+
+        for row, text in enumerate(frame.lines):
+            old = self.current.lines[row] if self.current else None
+            col = 0
+            while col < LCD_COLS:
+                if old is not None and text[col] == old[col]:
+                    col += 1
+                    continue
+                start = col
+                while col < LCD_COLS and (old is None or text[col] != old[col]):
+                    col += 1
+                self.panel.setCursor(start, row)
+                self.panel.printout(text[start:col])
+        self.current = frame
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            # Only the newest pending frame matters; skip anything it supersedes
+            pending = [item]
+            while True:
+                try:
+                    pending.append(self.frames.get_nowait())
+                except queue.Empty:
+                    break
+
+            frames = [p for p in pending if isinstance(p, Frame)]
+            if len(frames) > 1:
+                FRAMES_SKIPPED.inc(len(frames) - 1)
+            if frames:
+                try:
+                    with RENDER_SECONDS.time():
+                        self._render(frames[-1])
+                except Exception as e:
+                    self.current = None
+                    logger.error(f"[LCD] Render failed: {e}")
+            for p in pending:
+                if isinstance(p, threading.Event):
+                    p.set()
+
 
 class LCD:
-    def __init__(self):
-        self.lcd = RGB1602(16, 2)
+    def __init__(self, panel):
+        # The panel comes from utils.hardware, which picks the real or simulated driver
+        self.display_thread = DisplayThread(panel)
 
     def display(self, line1="", line2="", color="white"):
         if isinstance(line1, str) and '\n' in line1:
@@ -18,25 +106,19 @@ class LCD:
             line1 = parts[0]
             line2 = parts[1] if len(parts) > 1 else ""
 
-        color_map = {
-            "green": (0, 255, 0),
-            "red": (255, 0, 0),
-            "yellow": (255, 100, 0),
-            "gray": (80, 80, 80),
-            "white": (255, 255, 255)
-        }
-
-        rgb = color_map.get(color, (255, 255, 255))
-        self.lcd.setRGB(*rgb)
-
-        self.lcd.clear()
-        self.lcd.setCursor(0, 0)
-        self.lcd.printout(str(line1)[:16])
-        self.lcd.setCursor(0, 1)
-        self.lcd.printout(str(line2)[:16])
+        rgb = COLOR_MAP.get(color, (255, 255, 255))
+        lines = tuple(str(line)[:LCD_COLS].ljust(LCD_COLS) for line in (line1, line2))
+        self.display_thread.submit(Frame(lines, rgb))
 
     def clear(self):
-        self.lcd.clear()
+        latest = self.display_thread.latest
+        rgb = latest.rgb if latest else COLOR_MAP["white"]
+        self.display_thread.submit(Frame(("".ljust(LCD_COLS),) * LCD_ROWS, rgb))
 
     def set_color(self, r, g, b):
-        self.lcd.setRGB(r, g, b)
+        latest = self.display_thread.latest
+        lines = latest.lines if latest else ("".ljust(LCD_COLS),) * LCD_ROWS
+        self.display_thread.submit(Frame(lines, (r, g, b)))
+
+    def flush(self, timeout=None):
+        return self.display_thread.flush(timeout)
@@ -8,78 +8,102 @@ Description:
 """
 
 from utils.startup_check import startup_sequence
-from rfid.reader import RgiFIDReader
+from utils import hardware
+from utils.hardware import get_lcd, get_reader
+from rfid.reader_service import ReaderService
 from rfid.validator import validate_card
 from relay.session_manager import SessionManager
-from lcd.lcd import LCD
-import time
+from relay.station import Station
 import signal
 import sys
-from db.local_db import LocalDB
-from config.constants import CARD_POLL_INTERVAL, MACHINE_ID, STATUS_OFFLINE
+from db.local_db import get_local_db, close_local_db
+from config import constants
+from config.constants import STATUS_OFFLINE, RELAY_PIN, CARD_SCRIPT_PATH, METRICS_BIND, METRICS_PORT
+from utils import metrics
+from utils.metrics import MetricsServer
+from utils.structured_log import setup_logging, stop_logging
 from db.azure_sync import push_machine_status
+from db.outbox import OutboxWorker
+from db.sync_scheduler import sync_scheduler
+from db.heartbeat import HeartbeatWorker
 import logging
-from logging.handlers import TimedRotatingFileHandler
-import os
 
-# Setup logging
-os.makedirs("logs", exist_ok=True)
-handler = TimedRotatingFileHandler(
-    "logs/sync.log", when="D", interval=1, backupCount=7
-)
-formatter = logging.Formatter(
-    '[%(asctime)s] %(levelname)s [%(name)s]: %(message)s',
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-handler.setFormatter(formatter)
-logging.basicConfig(level=logging.INFO, handlers=[handler])
+def start_card_script():
+    # Headless runs: replay a card script against the simulated reader
+    from hal.card_script import CardScript, load_script
+    script = CardScript(hardware.get("mfrc522"), load_script(CARD_SCRIPT_PATH))
+    script.start()
+    logging.getLogger("main").info(f"[SIM] Replaying {len(script.steps)} card steps from {CARD_SCRIPT_PATH}")
+    return script
 
-lcd = LCD()
-reader = RFIDReader()
-session_mgr = SessionManager()
-db = LocalDB()
+def log_tap_latency(script):
+    from hal.card_script import tap_to_relay
+    latencies = [l for l in tap_to_relay(script.placed, hardware.get_gpio().history, RELAY_PIN) if l is not None]
+    if latencies:
+        latencies.sort()
+        logging.getLogger("main").info(
+            f"[SIM] Tap-to-relay over {len(latencies)} grants: "
+            f"median {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+        )
 
-def exit_handler(sig, frame):
-    lcd.display("Shutting down...")
-    db.update_machine_status(MACHINE_ID, STATUS_OFFLINE)
-    db.update_machine_heartbeat(MACHINE_ID)
-    push_machine_status(MACHINE_ID)
-    lcd.clear()
-    sys.exit(0)  
-
-signal.signal(signal.SIGINT, exit_handler)
+def start_metrics(station):
+    metrics.gauge("emec_station_info", "Static station labels", lambda: [({"machine_id": constants.MACHINE_ID}, 1)])
+    metrics.gauge("emec_station_state", "Current station state", lambda: [({"state": station.state}, 1)])
+    try:
+        server = MetricsServer(METRICS_BIND, METRICS_PORT)
+    except OSError as e:
+        logging.getLogger("main").error(f"[METRICS] Endpoint not started: {e}")
+        return None
+    server.start()
+    return server
 
 def main():
-    while True:
-        # PHASE 1 Startup
-        if not startup_sequence():
-            time.sleep(5)
-            continue
-
-        # PHASE 2 Scan for CSU ID
-        while True:
-            scan = reader.read_card()
-            if scan:
-                uid_num, csu_id = scan
-                validated_csu_id, display_name = validate_card(csu_id, uid_num)
-                if validated_csu_id:
-                    break
-                else:
-                    lcd.clear()
-                    startup_sequence()
-            time.sleep(CARD_POLL_INTERVAL)
-
-        # PHASE 3 Start Session
-        session_mgr.start_session(validated_csu_id, display_name)
+    # Everything is built here rather than at import, so importing main touches no hardware
+    setup_logging()
+    lcd = get_lcd()
+    reader_service = ReaderService(get_reader())
+    session_mgr = SessionManager()
+    db = get_local_db()
+    outbox_worker = OutboxWorker()
+    heartbeat_worker = HeartbeatWorker()
+    station = Station(lcd, session_mgr, reader_service, validate=validate_card, startup=startup_sequence)
+    script = None
+    if hardware.backend == hardware.BACKEND_SIM and CARD_SCRIPT_PATH:
+        script = start_card_script()
+    metrics_server = start_metrics(station) if METRICS_PORT else None
 
-        # PHASE 4 Wait for card removal
-        session_mgr.wait_for_card_removal(reader)
+    def exit_handler(sig, frame):
+        # A second Ctrl+C or a SIGTERM during shutdown must not re-enter it
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        lcd.display("Shutting down...")
+        outbox_worker.stop()
+        reader_service.stop()
+        sync_scheduler.stop()
+        heartbeat_worker.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if script:
+            script.stop()
+            log_tap_latency(script)
+        with db.transaction():
+            db.update_machine_status(constants.MACHINE_ID, STATUS_OFFLINE)
+            db.update_machine_heartbeat(constants.MACHINE_ID)
+        push_machine_status(constants.MACHINE_ID)
+        close_local_db()
+        lcd.clear()
+        lcd.flush(timeout=1)
+        stop_logging()
+        sys.exit(0)
 
-        # PHASE 5 Grace Period Logic
-        outcome = session_mgr.handle_grace_period(reader)
+    signal.signal(signal.SIGINT, exit_handler)
+    signal.signal(signal.SIGTERM, exit_handler)  # systemd stop
 
-        # PHASE 6 Restart loop regardless of outcome
-        continue
+    outbox_worker.start()
+    reader_service.start()
+    sync_scheduler.start()
+    heartbeat_worker.start()
+    station.run()
 
 if __name__ == "__main__":
     main()
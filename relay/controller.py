@@ -6,19 +6,23 @@ Description:
   Integrates RFID reading, relay control, and LCD messaging to manage user authentication and machine operation.
 """
 
-import RPi.GPIO as GPIO
 from config.constants import RELAY_PIN
 import time
 
 class RelayController:
-    def __init__(self):
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BOARD)
-        GPIO.setup(RELAY_PIN, GPIO.OUT)
-        GPIO.output(RELAY_PIN, GPIO.LOW)
+    def __init__(self, gpio=None):
+        # gpio: RPi.GPIO or a stand-in with the same API (see hal/sim_gpio.py).
+        # Imported here so importing this module needs no GPIO; use utils.hardware.get_relay()
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.gpio = gpio
+        gpio.setwarnings(False)
+        gpio.setmode(gpio.BOARD)
+        gpio.setup(RELAY_PIN, gpio.OUT)
+        gpio.output(RELAY_PIN, gpio.LOW)
 
     def turn_on(self):
-        GPIO.output(RELAY_PIN, GPIO.HIGH)
+        self.gpio.output(RELAY_PIN, self.gpio.HIGH)
 
     def turn_off(self):
-        GPIO.output(RELAY_PIN, GPIO.LOW)
+        self.gpio.output(RELAY_PIN, self.gpio.LOW)
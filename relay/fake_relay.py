@@ -0,0 +1,21 @@
+# relay/fake_relay.py
+"""
+File: fake_relay.py
+Description:
+  In-memory stand-in for RelayController used in tests and off-Pi runs.
+  Tracks the output state and counts switch operations instead of driving GPIO.
+"""
+
+
+class FakeRelay:
+    def __init__(self):
+        self.on = False
+        self.switches = 0
+
+    def turn_on(self):
+        self.on = True
+        self.switches += 1
+
+    def turn_off(self):
+        self.on = False
+        self.switches += 1
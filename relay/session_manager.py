@@ -9,107 +9,59 @@ Description:
 import time
 import uuid
 import logging
-import RPi.GPIO as GPIO
-from lcd.lcd import LCD
-from config.constants import RELAY_PIN, MACHINE_ID, CARD_GRACE_PERIOD_DEFAULT
-from db.local_db import LocalDB
-from db.azure_sync import sync_session_to_azure, push_user_status, push_machine_status
-from relay.controller import RelayController
+from config import constants
+from config.constants import CARD_GRACE_PERIOD_DEFAULT
+from db.local_db import get_local_db
+from db.outbox import enqueue, KIND_SESSION, KIND_USER_STATUS
+from db.sync_scheduler import sync_scheduler
+from utils.hardware import get_lcd, get_relay
 from config.constants import (
-    STATUS_NEUTRAL, STATUS_IN_USE, STATUS_OFFLINE, STATUS_MAINTENANCE, LCD_LINE_DELAY
+    STATUS_NEUTRAL, STATUS_IN_USE, STATUS_OFFLINE, STATUS_MAINTENANCE
 )
 
 logger = logging.getLogger("session")
 
 class SessionManager:
-    def __init__(self):
-        self.db = LocalDB()
-        self.lcd = LCD()
-        self.relay = RelayController()
+    def __init__(self, lcd=None, relay=None):
+        self.db = get_local_db()
+        self.lcd = lcd or get_lcd()
+        self.relay = relay or get_relay()
         self.active_session_id = None
         self.active_csu_id = None
         self.session_start_time = None
         self.display_name = None
 
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BOARD)
-        GPIO.setup(RELAY_PIN, GPIO.OUT)
-        GPIO.output(RELAY_PIN, GPIO.LOW)
-
     def start_session(self, csu_id, display_name):
-        if not self.active_session_id:
-            self.active_session_id = str(uuid.uuid4())
-            self.session_start_time = time.time()
-            self.db.mark_user_active(csu_id)
-            self.db.insert_session(self.active_session_id, csu_id, MACHINE_ID)
-            logger.info(f"[SESSION] Started: {display_name} ({csu_id}), session_id: {self.active_session_id}")
+        resuming = self.active_session_id is not None
+        session_id = self.active_session_id or str(uuid.uuid4())
+        with sync_scheduler.critical(), self.db.transaction():
+            if not resuming:
+                self.db.mark_user_active(csu_id)
+                self.db.insert_session(session_id, csu_id, constants.MACHINE_ID)
+            self.db.update_machine_status(constants.MACHINE_ID, STATUS_IN_USE)
+            enqueue(KIND_USER_STATUS, csu_id, db=self.db)
+
+        # Only a committed session row switches the machine on
+        if resuming:
+            logger.info("[SESSION] Resumed session within grace period.",
+                        extra={"event": "session_resume", "csu_id": csu_id, "session_id": session_id})
         else:
-            logger.info("[SESSION] Resumed session within grace period.")
-
+            self.active_session_id = session_id
+            self.session_start_time = time.time()
+            logger.info(
+                f"[SESSION] Started: {display_name} ({csu_id}), session_id: {session_id}",
+                extra={"event": "session_start", "csu_id": csu_id, "session_id": session_id}
+            )
         self.active_csu_id = csu_id
         self.display_name = display_name
-        self.db.update_machine_status(MACHINE_ID, STATUS_IN_USE)
-        self.db.update_machine_heartbeat(MACHINE_ID)
-        push_user_status(csu_id)
-        push_machine_status(MACHINE_ID)
 
         self.relay.turn_on()
         self.lcd.clear()
         self.lcd.display(display_name[:16], "in use", color="green")
 
 
-    def wait_for_card_removal(self, reader):
-        absence_start = None
-        while True:
-            scan = reader.read_card()
-            if scan:
-                uid, csu_id = scan
-                if csu_id == self.active_csu_id:
-                    absence_start = None
-                else:
-                    logger.info("[SESSION] New card detected mid-session.")
-                    self.lcd.clear()
-                    self.lcd.display("New card mid-sesh", "Resetting...", color="red")
-                    time.sleep(LCD_LINE_DELAY)
-                    self.force_end_session()
-                    break
-            else:
-                if absence_start is None:
-                    absence_start = time.time()
-                elif time.time() - absence_start >= 3:
-                    self.lcd.clear()
-                    self.lcd.display("Card removed", "Waiting for reinsert", color="yellow")
-                    break
-            time.sleep(0.5)
-
-    def handle_grace_period(self, reader):
-        grace_period = int(self.db.get_setting("grace_period_seconds", default=CARD_GRACE_PERIOD_DEFAULT))
-        end_time = time.time() + grace_period
-        while time.time() < end_time:
-            remaining = int(end_time - time.time())
-            self.lcd.display("Remove detected", f"Reinsert: {remaining}s", color="yellow")
-
-
-            scan = reader.read_card()
-            if scan:
-                uid, csu_id = scan
-                if csu_id == self.active_csu_id:
-                    self.lcd.clear()
-                    self.lcd.display("Session", "resumed", color="green")
-                    time.sleep(1)
-                    self.start_session(csu_id, self.display_name)
-                    return "resumed"
-                else:
-                    self.lcd.clear()
-                    self.lcd.display("New card at grace", "Resetting...", color="red")
-                    time.sleep(LCD_LINE_DELAY)
-                    self.force_end_session()
-                    return "new_card"
-            time.sleep(1)
-
-        self.force_end_session()
-        logger.info("[SESSION] Ended after grace period.")
-        return "timeout"
+    def grace_period(self):
+        return int(self.db.get_setting("grace_period_seconds", default=CARD_GRACE_PERIOD_DEFAULT))
 
     def force_end_session(self):
         if not self.active_session_id:
@@ -119,23 +71,37 @@ class SessionManager:
         duration_sec = int(end_time - self.session_start_time)
         duration_min = max(0, round(duration_sec / 60))
 
-        self.db.end_session(self.active_session_id)
-        self.db.mark_user_inactive(self.active_csu_id)
-        self.db.update_machine_status(MACHINE_ID, STATUS_NEUTRAL)
-        self.db.update_machine_heartbeat(MACHINE_ID)
-
-        push_user_status(self.active_csu_id)
-        push_machine_status(MACHINE_ID)
-
-        sync_session_to_azure(self.active_session_id)
-        logger.info(f"[SESSION] Ended: {self.display_name} ({self.active_csu_id}), duration: {duration_min} min")
-
-        self.lcd.clear()
-        self.lcd.display("Session", "ended", color="red")
-        time.sleep(1)
+        # Session end, user, machine status and outbox rows land in a single commit
+        with sync_scheduler.critical(), self.db.transaction():
+            self.db.end_session(self.active_session_id)
+            self.db.mark_user_inactive(self.active_csu_id)
+            self.db.update_machine_status(constants.MACHINE_ID, STATUS_NEUTRAL)
+            self.db.update_machine_heartbeat(constants.MACHINE_ID)
+
+            # Machine status reaches Azure with the next heartbeat
+            enqueue(KIND_USER_STATUS, self.active_csu_id, db=self.db)
+            enqueue(KIND_SESSION, self.active_session_id, db=self.db)
+        logger.info(
+            f"[SESSION] Ended: {self.display_name} ({self.active_csu_id}), duration: {duration_min} min",
+            extra={"event": "session_end", "csu_id": self.active_csu_id, "session_id": self.active_session_id, "duration_s": duration_sec}
+        )
 
         self.active_session_id = None
         self.active_csu_id = None
         self.session_start_time = None
         self.display_name = None
         self.relay.turn_off()
+
+        self.lcd.display("Session", "ended", color="red")
+
+    def fail_safe(self):
+        # Relay off first, then record the session end if the database still allows it
+        self.relay.turn_off()
+        try:
+            self.force_end_session()
+        except Exception as e:
+            logger.error(f"[SESSION] Could not record the session end: {e}")
+            self.active_session_id = None
+            self.active_csu_id = None
+            self.session_start_time = None
+            self.display_name = None
@@ -0,0 +1,191 @@
+# relay/station.py
+"""
+File: station.py
+Description:
+  Event-driven state machine for the card station: idle, validating, in-session, grace,
+  denied and maintenance. Reader events and timers drive every transition, so holding a
+  message on the LCD never stops the station from reacting to a card.
+"""
+
+import time
+import logging
+from config.constants import CARD_REMOVAL_TIMEOUT, STARTUP_RETRY_INTERVAL, LCD_MESSAGES
+from rfid.reader_service import CARD_PRESENT, CARD_REMOVED
+
+logger = logging.getLogger("station")
+
+IDLE = "idle"
+VALIDATING = "validating"
+IN_SESSION = "in_session"
+GRACE = "grace"
+DENIED = "denied"
+MAINTENANCE = "maintenance"
+
+
+class Station:
+    def __init__(self, lcd, session_mgr, reader_service, validate, startup, clock=time.monotonic):
+        self.lcd = lcd
+        self.session_mgr = session_mgr
+        self.reader_service = reader_service
+        self.validate = validate
+        self.startup = startup
+        self.clock = clock
+        self.state = MAINTENANCE
+        self.timers = {}
+        self.grace_deadline = None
+        self._messages = []
+        self._after_messages = None
+
+    # --- Timers ---
+    def set_timer(self, name, delay, callback):
+        self.timers[name] = (self.clock() + max(0, delay), callback)
+
+    def cancel_timer(self, *names):
+        for name in names:
+            self.timers.pop(name, None)
+
+    def next_timeout(self):
+        if not self.timers:
+            return None
+        return max(0, min(deadline for deadline, _ in self.timers.values()) - self.clock())
+
+    def tick(self):
+        now = self.clock()
+        for name, timer in sorted(self.timers.items(), key=lambda item: item[1][0]):
+            # A callback may have cancelled or replaced a later timer
+            if timer[0] <= now and self.timers.get(name) is timer:
+                del self.timers[name]
+                timer[1]()
+
+    # --- LCD messages held by timers instead of sleeps ---
+    def show(self, messages, then=None):
+        self.cancel_timer("message")
+        self._messages = list(messages)
+        self._after_messages = then
+        self._next_message()
+
+    def _next_message(self):
+        if not self._messages:
+            then, self._after_messages = self._after_messages, None
+            if then:
+                then()
+            return
+        line1, line2, color, hold = self._messages.pop(0)
+        self.lcd.display(line1, line2, color=color)
+        self.set_timer("message", hold, self._next_message)
+
+    def transition(self, state):
+        if state != self.state:
+            logger.info(f"[STATION] {self.state} -> {state}")
+        self.state = state
+
+    # --- Startup / maintenance ---
+    def boot(self):
+        # startup() returns the messages to show once ready, or None to retry from maintenance
+        self.cancel_timer("retry")
+        messages = self.startup()
+        if messages is None:
+            self.transition(MAINTENANCE)
+            self.set_timer("retry", STARTUP_RETRY_INTERVAL, self.boot)
+        else:
+            self.transition(IDLE)
+            self.show(messages)
+
+    # --- Reader events ---
+    def handle_event(self, event):
+        if event.kind == CARD_PRESENT:
+            self._on_card_present(event)
+        elif event.kind == CARD_REMOVED:
+            self._on_card_removed(event)
+
+    def _on_card_present(self, event):
+        if self.state in (IDLE, DENIED):
+            self._validate(event)
+        elif self.state == IN_SESSION:
+            if event.csu_id == self.session_mgr.active_csu_id:
+                self.cancel_timer("removal")
+            else:
+                logger.info("[SESSION] New card detected mid-session.")
+                self._end_session()
+                self._validate(event)
+        elif self.state == GRACE:
+            if event.csu_id == self.session_mgr.active_csu_id:
+                self._resume_session()
+            else:
+                logger.info("[SESSION] New card detected during grace period.")
+                self._end_session()
+                self._validate(event)
+
+    def _on_card_removed(self, event):
+        if self.state == IN_SESSION and event.csu_id == self.session_mgr.active_csu_id:
+            self.set_timer("removal", CARD_REMOVAL_TIMEOUT, self._enter_grace)
+
+    # --- Transitions ---
+    def _validate(self, event):
+        self.transition(VALIDATING)
+        decision = self.validate(event.csu_id, event.uid)
+        if decision.csu_id:
+            self.cancel_timer("message")
+            self.session_mgr.start_session(decision.csu_id, decision.display_name)
+            self.transition(IN_SESSION)
+        else:
+            self.transition(DENIED)
+            self.show(decision.messages, then=self._finish_denied)
+
+    def _finish_denied(self):
+        # The user's permissions are refreshed in the background, so go straight back to scanning
+        self.transition(IDLE)
+        self.lcd.display(*LCD_MESSAGES["startup_next"])
+
+    def _enter_grace(self):
+        self.transition(GRACE)
+        self.grace_deadline = self.clock() + self.session_mgr.grace_period()
+        self._grace_tick()
+
+    def _grace_tick(self):
+        remaining = self.grace_deadline - self.clock()
+        if remaining <= 0:
+            self._end_session()
+            logger.info("[SESSION] Ended after grace period.")
+            self.transition(IDLE)
+            self.show([("Session", "ended", "red", 1), (*LCD_MESSAGES["startup_next"], "white", 0)])
+            return
+        self.lcd.display("Remove detected", f"Reinsert: {int(remaining)}s", color="yellow")
+        self.set_timer("grace", min(1, remaining), self._grace_tick)
+
+    def _resume_session(self):
+        self.cancel_timer("grace")
+        self.session_mgr.start_session(self.session_mgr.active_csu_id, self.session_mgr.display_name)
+        self.transition(IN_SESSION)
+        self.show([
+            ("Session", "resumed", "green", 1),
+            (self.session_mgr.display_name[:16], "in use", "green", 0),
+        ])
+
+    def _end_session(self):
+        self.cancel_timer("removal", "grace")
+        self.session_mgr.force_end_session()
+
+    def fail_closed(self):
+        # After an unexpected error the machine must not stay powered without a recorded session
+        self.cancel_timer("removal", "grace", "message")
+        self._messages, self._after_messages = [], None
+        self.session_mgr.fail_safe()
+        self.transition(IDLE)
+        try:
+            self.lcd.display(*LCD_MESSAGES["startup_next"])
+        except Exception as e:
+            logger.error(f"[STATION] LCD update failed: {e}")
+
+    def run(self):
+        self.reader_service.rearm()
+        self.boot()
+        while True:
+            event = self.reader_service.wait_event(timeout=self.next_timeout())
+            try:
+                if event:
+                    self.handle_event(event)
+                self.tick()
+            except Exception:
+                logger.exception(f"[STATION] Error while {self.state}, switching the machine off")
+                self.fail_closed()
@@ -6,18 +6,44 @@ Description:
   Detects card presence, extracts UID, and communicates results to the validator for access control decisions.
 """
 
-from mfrc522 import MFRC522
-import RPi.GPIO as GPIO
 import time
+import random
+import logging
+from utils import metrics
+from config.constants import RFID_UID_VERIFY_RATE
+
+logger = logging.getLogger("rfid")
 
 AUTH_KEY = [0x4A, 0x1E, 0xD9, 0x40, 0xF4, 0x4B]  # CSU card sector key
 SECTOR = 1  # Sector containing CSU ID
 
+READ_SECONDS = metrics.histogram("emec_rfid_read_seconds", "RFID reader call latency")
+SCANS = metrics.counter("emec_card_scans_total", "Cards read successfully")
+READ_ERRORS = metrics.counter("emec_rfid_errors_total", "Card sector reads that failed")
+UID_LOOKUPS = metrics.counter("emec_rfid_uid_lookups_total", "Card identifications by UID lookup result")
+
 class RFIDReader:
-    def __init__(self):
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BOARD)
-        self.reader = MFRC522()
+    def __init__(self, mfrc522=None, gpio=None, uid_lookup=None, verify_rate=RFID_UID_VERIFY_RATE, on_mismatch=None):
+        # mfrc522/gpio: driver stand-ins with the same API (see hal/). Imported here so
+        # importing this module needs no SPI/GPIO; use utils.hardware.get_reader()
+        # uid_lookup: fn(uid_num) -> csu_id or None; known cards skip the sector read except
+        # for a verify_rate sample that re-reads it to confirm the stored mapping
+        # on_mismatch: fn(uid_num, stored_csu_id, card_csu_id) when that re-read disagrees
+        if gpio is None:
+            import RPi.GPIO as gpio
+        if mfrc522 is None:
+            from mfrc522 import MFRC522
+            mfrc522 = MFRC522()
+        self.gpio = gpio
+        gpio.setwarnings(False)
+        gpio.setmode(gpio.BOARD)
+        self.reader = mfrc522
+        self.last_uid = None
+        self.last_scan = None
+        self.uid_lookup = uid_lookup
+        self.verify_rate = verify_rate
+        self.on_mismatch = on_mismatch
+        self.distrusted = set()
 
     def uid_to_number(self, uid):
         num = 0
@@ -25,36 +51,97 @@ class RFIDReader:
             num = num * 256 + byte
         return num
 
-    def read_card(self):
-        (status, uid) = self.reader.MFRC522_Request(self.reader.PICC_REQIDL)
+    def _detect(self, req_mode):
+        (status, _) = self.reader.MFRC522_Request(req_mode)
         if status != self.reader.MI_OK:
             return None
 
         (status, uid) = self.reader.MFRC522_Anticoll()
         if status != self.reader.MI_OK:
             return None
+        return uid
+
+    def _remember(self, uid, uid_num, csu_id):
+        self.last_uid = list(uid)
+        self.last_scan = (uid_num, csu_id)
+        SCANS.inc()
+        return uid_num, csu_id
+
+    def _identify(self, uid):
+        uid_num = self.uid_to_number(uid)
+        known = self.uid_lookup(uid_num) if self.uid_lookup and uid_num not in self.distrusted else None
+        if known is None:
+            UID_LOOKUPS.inc(result="miss")
+            return self._read_sector(uid)
+
+        if random.random() >= self.verify_rate:
+            # Selected as in the sector path, so the card is left ACTIVE either way
+            self.reader.MFRC522_SelectTag(uid)
+            UID_LOOKUPS.inc(result="hit")
+            logger.debug(f"[RFID] Card recognised: UID {uid_num}, CSU ID {known}",
+                         extra={"event": "card_scan", "uid": uid_num, "csu_id": known, "source": "uid_lookup"})
+            return self._remember(uid, uid_num, int(known))
 
+        scan = self._read_sector(uid)
+        if scan is not None and scan[1] != int(known):
+            # The card disagrees with Users.uid: trust the sector for this UID until the
+            # stored mapping is corrected
+            self.distrusted.add(uid_num)
+            UID_LOOKUPS.inc(result="mismatch")
+            logger.warning(f"[RFID] UID {uid_num} is stored for CSU ID {known} but the card holds {scan[1]}",
+                           extra={"event": "uid_mismatch", "uid": uid_num, "csu_id": scan[1]})
+            if self.on_mismatch:
+                try:
+                    self.on_mismatch(uid_num, known, scan[1])
+                except Exception as e:
+                    logger.error(f"[RFID] Could not correct the stored UID {uid_num}: {e}")
+        elif scan is not None:
+            UID_LOOKUPS.inc(result="verified")
+        return scan
+
+    def _read_sector(self, uid):
         self.reader.MFRC522_SelectTag(uid)
         block_addr = SECTOR * 4
 
         status = self.reader.MFRC522_Auth(self.reader.PICC_AUTHENT1A, block_addr, AUTH_KEY, uid)
         if status != self.reader.MI_OK:
-            print("[RFID] Authentication failed")
+            logger.warning("[RFID] Authentication failed", extra={"event": "card_read_error", "stage": "auth"})
+            READ_ERRORS.inc(stage="auth")
             return None
 
         data = self.reader.MFRC522_Read(block_addr)
         self.reader.MFRC522_StopCrypto1()
 
         if not data:
-            print("[RFID] Failed to read data block")
+            logger.warning("[RFID] Failed to read data block", extra={"event": "card_read_error", "stage": "read"})
+            READ_ERRORS.inc(stage="read")
             return None
 
         trimmed = data[3:8]
         csu_id = int.from_bytes(trimmed, byteorder='big') // 10
         uid_num = self.uid_to_number(uid)
 
-        print(f"[RFID] Card scanned ? UID: {uid_num}, CSU ID: {csu_id}")
-        return uid_num, csu_id
+        logger.debug(f"[RFID] Card scanned: UID {uid_num}, CSU ID {csu_id}",
+                     extra={"event": "card_scan", "uid": uid_num, "csu_id": csu_id, "source": "sector"})
+        return self._remember(uid, uid_num, csu_id)
+
+    @metrics.instrument(READ_SECONDS, op="read_card")
+    def read_card(self):
+        uid = self._detect(self.reader.PICC_REQIDL)
+        if uid is None:
+            return None
+        return self._identify(uid)
+
+    @metrics.instrument(READ_SECONDS, op="check_presence")
+    def check_presence(self):
+        # WUPA + anticollision only: a card left in READY after the previous poll drops
+        # back to IDLE on the first WUPA, so one retry is needed before declaring it absent.
+        uid = self._detect(self.reader.PICC_REQALL) or self._detect(self.reader.PICC_REQALL)
+        if uid is None:
+            return None
+        if self.last_uid == list(uid):
+            return self.last_scan
+        return self._identify(uid)
 
     def cleanup(self):
-        GPIO.cleanup()
+        self.gpio.cleanup()
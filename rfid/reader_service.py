@@ -0,0 +1,121 @@
+# rfid/reader_service.py
+"""
+File: reader_service.py
+Description:
+  Background card-monitoring service that turns RFID reads into card-present / card-removed events.
+  Wakes on the MFRC522 IRQ line when it is wired, and otherwise polls adaptively: fast right
+  after a card event, backing off towards the idle interval when nothing is happening.
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+from config.constants import (
+    RFID_IRQ_PIN, RFID_POLL_FAST, RFID_POLL_IDLE, RFID_POLL_BACKOFF, RFID_REMOVAL_MISSES
+)
+
+logger = logging.getLogger("reader_service")
+
+CARD_PRESENT = "present"
+CARD_REMOVED = "removed"
+
+CardEvent = namedtuple("CardEvent", ["kind", "uid", "csu_id", "timestamp"])
+
+
+class ReaderService(threading.Thread):
+    def __init__(self, reader, irq_pin=RFID_IRQ_PIN, fast_interval=RFID_POLL_FAST,
+                 idle_interval=RFID_POLL_IDLE, backoff=RFID_POLL_BACKOFF, removal_misses=RFID_REMOVAL_MISSES):
+        super().__init__(name="reader-service", daemon=True)
+        self.reader = reader
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.backoff = backoff
+        self.removal_misses = removal_misses
+        self.interval = fast_interval
+        self.events = queue.Queue()
+        self.current = None
+        self._misses = 0
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._rearm = threading.Event()
+        self.irq_enabled = self._setup_irq(irq_pin)
+
+    def _setup_irq(self, irq_pin):
+        if irq_pin is None:
+            return False
+        try:
+            from utils.hardware import get_gpio
+            GPIO = get_gpio()
+            GPIO.setup(irq_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(irq_pin, GPIO.FALLING, callback=lambda _pin: self._wakeup.set())
+            logger.info(f"[RFID] IRQ wakeups enabled on pin {irq_pin}")
+            return True
+        except Exception as e:
+            logger.warning(f"[RFID] IRQ unavailable, using adaptive polling: {e}")
+            return False
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def rearm(self):
+        # Forget the card currently on the reader so it is reported as present again
+        self._rearm.set()
+        self._wakeup.set()
+
+    def clear_events(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait_event(self, timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _emit(self, kind, uid, csu_id):
+        self.events.put(CardEvent(kind, uid, csu_id, time.time()))
+        self.interval = self.fast_interval
+
+    def poll_once(self):
+        if self._rearm.is_set():
+            self._rearm.clear()
+            self.current = None
+            self._misses = 0
+
+        # Readers with a cheap presence check only do the authenticated read on a UID change
+        check_presence = getattr(self.reader, "check_presence", None)
+        scan = check_presence() if check_presence else self.reader.read_card()
+        if scan:
+            self._misses = 0
+            uid, csu_id = scan
+            if self.current is None or self.current[1] != csu_id:
+                if self.current is not None:
+                    self._emit(CARD_REMOVED, *self.current)
+                self.current = (uid, csu_id)
+                self._emit(CARD_PRESENT, uid, csu_id)
+                return
+
+        elif self.current is not None:
+            self._misses += 1
+            if self._misses >= self.removal_misses:
+                self._emit(CARD_REMOVED, *self.current)
+                self.current = None
+                self._misses = 0
+                return
+
+        self.interval = min(self.interval * self.backoff, self.idle_interval)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"[RFID] Poll failed: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
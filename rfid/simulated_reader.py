@@ -0,0 +1,33 @@
+# rfid/simulated_reader.py
+"""
+File: simulated_reader.py
+Description:
+  Hardware-free stand-in for RFIDReader used in tests and off-Pi runs.
+  A card can be placed on or taken off the simulated antenna; read_card() then behaves
+  like the real reader, returning (uid, csu_id) while a card is present.
+"""
+
+import threading
+
+
+class SimulatedReader:
+    def __init__(self):
+        self._card = None
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def insert(self, uid, csu_id):
+        with self._lock:
+            self._card = (uid, csu_id)
+
+    def remove(self):
+        with self._lock:
+            self._card = None
+
+    def read_card(self):
+        with self._lock:
+            self.reads += 1
+            return self._card
+
+    def cleanup(self):
+        pass
@@ -9,46 +9,83 @@ Description:
 import time
 import logging
 from datetime import datetime
-from db.local_db import LocalDB
-from db.azure_sync import sync_local_from_azure, push_access_requests, push_user_update
-from lcd.lcd import LCD
-from config.constants import MACHINE_ID
-from relay.controller import RelayController
-from utils.startup_check import startup_sequence
-from config.constants import STATUS_IN_USE, LCD_LINE_DELAY
+from collections import namedtuple
+from db.local_db import get_local_db
+from db.auth_cache import auth_cache
+from db.outbox import enqueue, KIND_ACCESS_REQUESTS, KIND_USER_UPDATE, KIND_REFRESH_USER
+from config import constants
+from config.constants import LCD_LINE_DELAY
+from utils.offline import offline_mode
+from utils import metrics
 
 logger = logging.getLogger("validator")
-lcd = LCD()
-relay = RelayController()
-db = LocalDB()
+
+VALIDATE_SECONDS = metrics.histogram("emec_validate_seconds", "validate_card latency by outcome")
+DECISIONS = metrics.counter("emec_access_decisions_total", "Card validations by outcome")
+
+# Outcome of a scan. Granted when csu_id is set; messages are (line1, line2, color, hold_seconds)
+# for the caller to show, so validation itself never sleeps. reason labels the branch taken.
+Decision = namedtuple("Decision", ["csu_id", "display_name", "messages", "reason"])
+
+def _denied(messages, reason):
+    return Decision(None, None, messages, reason)
+
+def clear_card_uid(uid_num, stored_csu_id, card_csu_id):
+    # The reader found uid_num stored for a user whose card it isn't. Clear it there, in the
+    # cache and (through the outbox) in Azure; the card's holder gets it on their next grant.
+    db = get_local_db()
+    if db.clear_user_uid(str(stored_csu_id), uid_num):
+        auth_cache.forget_user_uid(stored_csu_id, uid_num)
+        enqueue(KIND_USER_UPDATE, stored_csu_id, db=db)
+        logger.info(f"[SYNC] UID {uid_num} cleared from {stored_csu_id}; the card belongs to {card_csu_id}")
 
 def validate_card(csu_id, uid_num):
+    start = time.perf_counter()
+    decision = _validate(csu_id, uid_num)
+    elapsed = time.perf_counter() - start
+    VALIDATE_SECONDS.observe(elapsed, outcome=decision.reason)
+    DECISIONS.inc(outcome=decision.reason)
+    logger.debug(
+        f"[VALIDATOR] {csu_id}: {decision.reason}",
+        extra={"event": "validate", "csu_id": csu_id, "outcome": decision.reason, "latency_ms": round(elapsed * 1000, 3)}
+    )
+    return decision
+
+def _validate(csu_id, uid_num):
     logger.info(f"[VALIDATOR] Card scanned: {csu_id}")
-    user = db.get_user(csu_id)
+    db = get_local_db()
+    user = auth_cache.get_user(csu_id)
+
+    # CASE 0: Offline too long to trust the local snapshot
+    if offline_mode.active and offline_mode.is_stale():
+        logger.warning(f"[ACCESS] Denied: {csu_id}, local snapshot older than {offline_mode.max_staleness}s",
+                       extra={"event": "access_denied", "csu_id": csu_id, "reason": "stale_snapshot"})
+        return _denied([("Offline too long", "Access paused", "red", LCD_LINE_DELAY)], "stale_snapshot")
 
     # CASE 1: Unknown or unauthorized user
-    if not user or not db.has_permission(csu_id, MACHINE_ID):
-        lcd.display("Access Denied", "Raising req",  color="red")
-        time.sleep(3)
-        if db.access_request_exists(csu_id, MACHINE_ID):
-            lcd.display("Already sent", "Please wait", color="red")
-            logger.info(f"[ACCESS] Request already exists for {csu_id}")
+    if not user or not auth_cache.has_permission(csu_id):
+        messages = [("Access Denied", "Raising req", "red", 3)]
+        if auth_cache.access_request_exists(csu_id):
+            messages.append(("Already sent", "Please wait", "red", LCD_LINE_DELAY))
+            logger.info(f"[ACCESS] Request already exists for {csu_id}",
+                        extra={"event": "access_denied", "csu_id": csu_id, "reason": "no_permission"})
         else:
-            db.insert_access_request(csu_id, MACHINE_ID, uid_fallback=uid_num)
-            push_access_requests()
-            lcd.display("Request raised", "Please wait", color="yellow")
-            logger.info(f"[ACCESS] Request raised for {csu_id}")
-        time.sleep(LCD_LINE_DELAY)
+            db.insert_access_request(csu_id, constants.MACHINE_ID, uid_fallback=uid_num)
+            auth_cache.note_access_request(csu_id)
+            enqueue(KIND_ACCESS_REQUESTS, db=db)
+            messages.append(("Request raised", "Please wait", "yellow", LCD_LINE_DELAY))
+            logger.info(f"[ACCESS] Request raised for {csu_id}",
+                        extra={"event": "access_requested", "csu_id": csu_id, "reason": "no_permission"})
 
-        # After request sync, re-sync system data
-        startup_sequence()
-        return None, None
+        # Pull just this user's rows in the background once the request is pushed
+        enqueue(KIND_REFRESH_USER, csu_id, db=db)
+        return _denied(messages, "no_permission")
 
     # CASE 2: Valid user with permission
     display_name = user["name"] if user["name"] else str(csu_id)
 
     # ENFORCE AFTER-HOURS CHECK
-    lab_open, lab_close = db.get_open_close_times()
+    lab_open, lab_close = auth_cache.get_open_close_times()
     if lab_open and lab_close:
         fmt = "%H:%M"
         try:
@@ -57,23 +94,20 @@ def validate_card(csu_id, uid_num):
             close_time = datetime.strptime(lab_close, fmt).time()
 
             # only check if not "After Hours"
-            if not db.user_has_level(csu_id, "After Hours"):
+            if not auth_cache.user_has_level(csu_id, "After Hours"):
                 if not (open_time <= now <= close_time):
-                    lcd.display("Access Denied", "Outside hours", color="red")
-                    logger.warning(f"[ACCESS] Denied: {csu_id} outside lab hours")
-                    time.sleep(LCD_LINE_DELAY)
-                    return None, None
+                    logger.warning(f"[ACCESS] Denied: {csu_id} outside lab hours",
+                                   extra={"event": "access_denied", "csu_id": csu_id, "reason": "outside_hours"})
+                    return _denied([("Access Denied", "Outside hours", "red", LCD_LINE_DELAY)], "outside_hours")
         except Exception as e:
             logger.error(f"[VALIDATOR] Time parse error: {e}")
 
     # ENSURE UID IS STORED
-    if db.ensure_user_uid(csu_id, uid_num):
+    if not (user["uid"] or "").strip() and db.ensure_user_uid(csu_id, uid_num):
+        auth_cache.note_user_uid(csu_id, uid_num)
         logger.info(f"[SYNC] UID updated for {csu_id}, syncing to Azure")
-        push_user_update(csu_id)
-
-    logger.info(f"[ACCESS] Granted to {csu_id} - {display_name}")
-    db.mark_user_active(csu_id)
-    db.update_machine_status(MACHINE_ID, STATUS_IN_USE)
-    db.update_machine_heartbeat(MACHINE_ID)
-    relay.turn_on()
-    return csu_id, display_name
+        enqueue(KIND_USER_UPDATE, csu_id, db=db)
+
+    logger.info(f"[ACCESS] Granted to {csu_id} - {display_name}", extra={"event": "access_granted", "csu_id": csu_id})
+    # The session manager switches the relay on once the session row is committed
+    return Decision(csu_id, display_name, [], "granted")
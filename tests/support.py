@@ -0,0 +1,77 @@
+# tests/support.py
+"""
+File: support.py
+Description:
+  Shared fixtures for the tests. LocalDBTestCase runs each test in a fresh temporary
+  directory, so data/local.db starts empty, with MACHINE_ID pinned. AzureTestCase adds the
+  MySQL stand-in from benchmarks/ behind azure_sync's connection pool, and seed_azure fills
+  it with two machines, their users and permissions.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from config import constants
+from db import azure_sync
+from db.azure_pool import AzureConnectionPool
+from db.local_db import get_local_db, close_local_db
+from db.auth_cache import auth_cache
+from benchmarks.mysql_standin import MySQLStandIn
+
+
+class LocalDBTestCase(unittest.TestCase):
+    machine_id = "M1"
+
+    def setUp(self):
+        cwd = os.getcwd()
+        workdir = tempfile.mkdtemp(prefix="emec-test-")
+        os.chdir(workdir)
+        os.makedirs("data")
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        self.addCleanup(os.chdir, cwd)
+        self.addCleanup(auth_cache.invalidate)
+        self.addCleanup(close_local_db)
+        self.patch(constants, "MACHINE_ID", self.machine_id)
+        self.db = get_local_db()
+
+    def patch(self, target, name, value):
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def local_rows(self, query, *args):
+        self.db.cursor.execute(query, args)
+        return [tuple(row) for row in self.db.cursor.fetchall()]
+
+
+class AzureTestCase(LocalDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.azure = MySQLStandIn(rtt=0, connect_rtts=0)
+        self.patch(azure_sync, "azure_pool", AzureConnectionPool(self.azure.connect))
+
+    def azure_execute(self, query, *args):
+        self.azure.db.execute(query, args)
+        self.azure.db.commit()
+
+    def azure_rows(self, query, *args):
+        return [tuple(row) for row in self.azure.db.execute(query, args).fetchall()]
+
+
+def seed_azure(case):
+    # Users 1-3 may use M1 and users 4-5 may use M2; user 6 has no permissions
+    for machine_id in ("M1", "M2"):
+        case.azure_execute(
+            "INSERT INTO Machine (machine_id, machine_name, machine_type, machine_status) VALUES (?, ?, 'lathe', 'neutral')",
+            machine_id, f"Lathe {machine_id}"
+        )
+    for csu_id in range(1, 7):
+        case.azure_execute("INSERT INTO Users (csu_id, uid, name) VALUES (?, ?, ?)", str(csu_id), str(1000 + csu_id), f"User {csu_id}")
+        case.azure_execute("INSERT INTO User_Access (csu_id, level_name) VALUES (?, 'basic')", str(csu_id))
+    for csu_id, machine_id in (("1", "M1"), ("2", "M1"), ("3", "M1"), ("4", "M2"), ("5", "M2")):
+        case.azure_execute("INSERT INTO Machine_Permissions (csu_id, machine_id) VALUES (?, ?)", csu_id, machine_id)
+    case.azure_execute("INSERT INTO Access_Levels (level_name) VALUES ('basic')")
+    case.azure_execute("INSERT INTO System_Settings (setting, value) VALUES ('grace_period_seconds', '10')")
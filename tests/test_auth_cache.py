@@ -0,0 +1,76 @@
+# tests/test_auth_cache.py
+"""
+File: test_auth_cache.py
+Description:
+  Auth cache kept current by Azure pulls: the sync listener rebuilding changed sections and
+  refresh_user patching a single user's entries.
+  Usage: python -m pytest tests
+"""
+
+import unittest
+
+from db import azure_sync
+from db.auth_cache import auth_cache
+from tests.support import AzureTestCase, seed_azure
+
+
+class AuthCacheSyncTest(AzureTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_azure(self)
+        azure_sync.sync_local_from_azure()
+        # The first pull is full, so the listener has loaded every section
+        self.assertTrue(auth_cache.has_permission("3"))
+
+    def test_revoke_from_pull_is_visible_to_next_lookup(self):
+        self.azure_execute("DELETE FROM Machine_Permissions WHERE csu_id = '3'")
+        azure_sync.sync_local_from_azure()
+
+        self.assertFalse(auth_cache.has_permission("3"))
+        self.assertIsNone(auth_cache.get_user("3"))
+        self.assertIsNone(auth_cache.get_csu_id_by_uid("1003"))
+
+    def test_delta_pull_rebuilds_only_changed_sections(self):
+        permissions, levels = auth_cache.permissions, auth_cache.levels
+        self.azure_execute("UPDATE Users SET name = 'Renamed' WHERE csu_id = '2'")
+        azure_sync.sync_local_from_azure()
+
+        self.assertEqual(auth_cache.get_user("2")["name"], "Renamed")
+        self.assertIs(auth_cache.permissions, permissions)
+        self.assertIs(auth_cache.levels, levels)
+
+    def test_refresh_user_grants_without_rebuilding(self):
+        users, misses = auth_cache.users, auth_cache.misses
+        self.azure_execute("INSERT INTO Machine_Permissions (csu_id, machine_id) VALUES ('6', 'M1')")
+
+        self.assertTrue(azure_sync.refresh_user_from_azure("6"))
+
+        self.assertTrue(auth_cache.has_permission("6"))
+        self.assertEqual(auth_cache.get_user("6")["name"], "User 6")
+        self.assertEqual(auth_cache.get_csu_id_by_uid("1006"), "6")
+        self.assertTrue(auth_cache.user_has_level("6", "basic"))
+        # Patched in place: the other users' entries were not reloaded
+        self.assertIs(auth_cache.users, users)
+        self.assertEqual(auth_cache.misses, misses)
+
+    def test_refresh_user_revokes(self):
+        self.azure_execute("DELETE FROM Machine_Permissions WHERE csu_id = '2'")
+
+        self.assertTrue(azure_sync.refresh_user_from_azure("2"))
+
+        self.assertFalse(auth_cache.has_permission("2"))
+        self.assertIsNone(auth_cache.get_csu_id_by_uid("1002"))
+        self.assertTrue(auth_cache.has_permission("1"))
+
+    def test_unchanged_refresh_leaves_cache_alone(self):
+        self.db.mark_user_active("1")
+        auth_cache.rebuild(["users"])
+        users = auth_cache.users
+        # Local status columns differ from Azure's, but they are not a change to pull
+        self.assertTrue(azure_sync.refresh_user_from_azure("1"))
+        self.assertIs(auth_cache.users, users)
+        self.assertEqual(auth_cache.get_user("1")["is_active"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
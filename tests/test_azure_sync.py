@@ -0,0 +1,259 @@
+# tests/test_azure_sync.py
+"""
+File: test_azure_sync.py
+Description:
+  Pushes and pulls between the local database and the Azure stand-in from benchmarks/.
+  Usage: python -m pytest tests
+"""
+
+import unittest
+
+from config import constants
+from db import azure_sync
+from tests.support import AzureTestCase, seed_azure
+
+AZURE_REQUEST = (
+    "INSERT INTO Access_Requests (request_id, uid, csu_id, machine_id, requested_on, status) "
+    "VALUES (?, ?, ?, ?, '2026-01-01 09:00:00', 'under review')"
+)
+
+
+class AccessRequestPushTest(AzureTestCase):
+    def pending(self):
+        return self.local_rows("SELECT request_id, csu_id FROM Access_Requests WHERE synced = 0")
+
+    def test_local_request_takes_a_placeholder_id(self):
+        self.db.insert_access_request("5", "M1", "1005")
+        self.db.insert_access_request("6", "M1", "1006")
+        self.assertEqual(sorted(self.pending()), [(-2, "6"), (-1, "5")])
+
+    def test_push_takes_the_id_azure_assigns(self):
+        self.azure_execute(AZURE_REQUEST, 2001, "1900", "900", "M2")
+        self.db.insert_access_request("5", "M1", "1005")
+
+        self.assertTrue(azure_sync.push_access_requests())
+
+        self.assertEqual(
+            self.azure_rows("SELECT request_id, csu_id, machine_id, uid FROM Access_Requests ORDER BY request_id"),
+            [(2001, "900", "M2", "1900"), (2002, "5", "M1", "1005")]
+        )
+        self.assertEqual(self.pending(), [])
+        self.assertEqual(self.local_rows("SELECT request_id, csu_id FROM Access_Requests"), [(2002, "5")])
+
+    def test_scoped_station_leaves_other_machines_requests_alone(self):
+        # Under the machine scope this station never sees request 2001, which belongs to M2
+        self.assertEqual(azure_sync.sync_scope(), "M1")
+        self.azure_execute(AZURE_REQUEST, 2000, "1800", "800", "M1")
+        self.azure_execute(AZURE_REQUEST, 2001, "1900", "900", "M2")
+        azure_sync.sync_local_from_azure(full=True)
+        self.db.insert_access_request("5", "M1", "1005")
+
+        self.assertTrue(azure_sync.push_access_requests())
+        azure_sync.sync_local_from_azure()
+
+        self.assertEqual(
+            self.azure_rows("SELECT request_id, csu_id, machine_id, uid, status FROM Access_Requests ORDER BY request_id"),
+            [(2000, "800", "M1", "1800", "under review"), (2001, "900", "M2", "1900", "under review"),
+             (2002, "5", "M1", "1005", "under review")]
+        )
+        self.assertEqual(self.local_rows("SELECT request_id, csu_id, synced FROM Access_Requests ORDER BY request_id"),
+                         [(2000, "800", 1), (2002, "5", 1)])
+
+    def test_push_matches_a_request_azure_already_has(self):
+        # An upload that reached Azure but not the local re-key is matched, not inserted twice
+        self.db.insert_access_request("5", "M1", "1005")
+        [(requested_on,)] = self.local_rows("SELECT requested_on FROM Access_Requests")
+        self.azure_execute(
+            "INSERT INTO Access_Requests (request_id, uid, csu_id, machine_id, requested_on) VALUES (7, '1005', '5', 'M1', ?)",
+            requested_on
+        )
+
+        self.assertTrue(azure_sync.push_access_requests())
+
+        self.assertEqual(self.azure_rows("SELECT request_id FROM Access_Requests"), [(7,)])
+        self.assertEqual(self.local_rows("SELECT request_id, synced FROM Access_Requests"), [(7, 1)])
+
+    def test_settle_replaces_a_copy_pulled_under_the_new_id(self):
+        self.db.insert_access_request("5", "M1", "1005")
+        self.db.cursor.execute(
+            "INSERT INTO Access_Requests (request_id, csu_id, machine_id, synced) VALUES (2002, '5', 'M1', 1)"
+        )
+        self.db.settle_access_request(-1, 2002)
+        self.assertEqual(self.local_rows("SELECT request_id, synced FROM Access_Requests"), [(2002, 1)])
+
+    def test_pull_keeps_pending_request(self):
+        for request_id in (1, 2, 3):
+            self.azure_execute(AZURE_REQUEST, request_id, "1900", "900", "M1")
+        self.db.insert_access_request("5", "M1", "1005")
+
+        azure_sync.sync_local_from_azure(full=True)
+        self.assertEqual(self.pending(), [(-1, "5")])
+        self.azure_execute(AZURE_REQUEST, 4, "1900", "900", "M1")
+        azure_sync.sync_local_from_azure()
+        self.assertEqual(self.pending(), [(-1, "5")])
+
+        self.assertTrue(azure_sync.push_access_requests())
+        self.assertEqual(self.azure_rows("SELECT request_id, csu_id FROM Access_Requests WHERE request_id = 5"), [(5, "5")])
+
+
+class SeededTestCase(AzureTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_azure(self)
+        azure_sync.sync_local_from_azure()
+
+
+class PullTest(SeededTestCase):
+    def users(self):
+        return [csu_id for (csu_id,) in self.local_rows("SELECT csu_id FROM Users ORDER BY csu_id")]
+
+    def log_writes(self, *tables):
+        # Records every row the next pull inserts, updates or deletes in these tables
+        self.db.cursor.execute("CREATE TABLE Write_Log (table_name TEXT, op TEXT)")
+        for table in tables:
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                self.db.cursor.execute(
+                    f"CREATE TRIGGER log_{table}_{op} AFTER {op} ON {table} "
+                    f"BEGIN INSERT INTO Write_Log VALUES ('{table}', '{op}'); END"
+                )
+        self.db.conn.commit()
+
+    def writes(self):
+        return self.local_rows("SELECT table_name, op FROM Write_Log")
+
+    def test_first_pull_is_full_and_scoped_to_this_machine(self):
+        self.assertEqual(self.users(), ["1", "2", "3"])
+        self.assertEqual(
+            self.local_rows("SELECT csu_id, machine_id FROM Machine_Permissions ORDER BY csu_id"),
+            [("1", "M1"), ("2", "M1"), ("3", "M1")]
+        )
+        self.assertEqual(self.local_rows("SELECT machine_id FROM Machine"), [("M1",)])
+
+    def test_row_change_is_applied(self):
+        self.log_writes("Users", "User_Access", "Machine_Permissions")
+        self.azure_execute("UPDATE Users SET name = 'Renamed' WHERE csu_id = '2'")
+
+        changes = azure_sync.sync_local_from_azure()
+
+        self.assertEqual(changes["Users"], 1)
+        self.assertEqual(self.db.get_user("2")["name"], "Renamed")
+        self.assertEqual(self.writes(), [("Users", "INSERT")])
+
+    def test_revoke_deletes_the_row(self):
+        self.azure_execute("DELETE FROM Machine_Permissions WHERE csu_id = '3'")
+
+        changes = azure_sync.sync_local_from_azure()
+
+        self.assertEqual(changes["Machine_Permissions"], 1)
+        self.assertFalse(self.db.has_permission("3", "M1"))
+        # The user and their levels fall out of the machine scope with the permission
+        self.assertEqual(self.users(), ["1", "2"])
+        self.assertEqual(self.local_rows("SELECT csu_id FROM User_Access WHERE csu_id = '3'"), [])
+
+    def test_new_permission_pulls_the_user_in(self):
+        self.azure_execute("INSERT INTO Machine_Permissions (csu_id, machine_id) VALUES ('6', 'M1')")
+        azure_sync.sync_local_from_azure()
+        self.assertTrue(self.db.has_permission("6", "M1"))
+        self.assertEqual(self.users(), ["1", "2", "3", "6"])
+
+    def test_unsynced_request_survives_delta_and_full_pulls(self):
+        self.db.insert_access_request("6", "M1", "1006")
+        self.azure_execute(AZURE_REQUEST, 1, "1002", "2", "M1")
+        azure_sync.sync_local_from_azure()
+        azure_sync.sync_local_from_azure(full=True)
+        self.assertEqual(
+            self.local_rows("SELECT request_id, csu_id, synced FROM Access_Requests ORDER BY request_id"),
+            [(-1, "6", 0), (1, "2", 1)]
+        )
+
+    def test_scope_change_trims_users_out_of_scope(self):
+        self.patch(constants, "SYNC_SCOPE", "all")
+        azure_sync.sync_local_from_azure()
+        self.assertEqual(self.users(), ["1", "2", "3", "4", "5", "6"])
+
+        self.patch(constants, "SYNC_SCOPE", "machine")
+        azure_sync.sync_local_from_azure()
+        self.assertEqual(self.users(), ["1", "2", "3"])
+        self.assertEqual(self.local_rows("SELECT DISTINCT machine_id FROM Machine_Permissions"), [("M1",)])
+        self.assertEqual(self.local_rows("SELECT DISTINCT scope FROM Sync_State WHERE table_name = 'Users'"), [("M1",)])
+
+    def test_unchanged_hashes_write_no_rows(self):
+        self.log_writes(*azure_sync.SYNC_TABLES)
+        # Status columns the stations push themselves are not part of the row hash
+        self.azure_execute("UPDATE Users SET is_active = 1, last_used = '2026-01-01 10:00:00' WHERE csu_id = '1'")
+        self.azure_execute("UPDATE Machine SET last_heartbeat = '2026-01-01 10:00:00', device_ip = '10.0.0.9'")
+        before = self.azure.round_trips
+
+        changes = azure_sync.sync_local_from_azure()
+
+        self.assertEqual(set(changes.values()), {0})
+        self.assertEqual(self.writes(), [])
+        # One checksum query per table and nothing else
+        self.assertEqual(self.azure.round_trips - before, len(azure_sync.SYNC_TABLES))
+
+
+class RowHashTest(SeededTestCase):
+    def stored_hashes(self, table):
+        return dict(self.local_rows("SELECT row_key, row_hash FROM Sync_Row_Hash WHERE table_name = ?", table))
+
+    def azure_hashes(self, table):
+        spec = azure_sync.SYNC_TABLES[table]
+        columns = azure_sync._hash_columns(self.db.cursor, table, spec)
+        query, args = azure_sync.scoped_select(
+            table, spec, "M1" if spec.get("scope") else None,
+            columns=", ".join(f"t.{col}" for col in spec["key"]) + f", {azure_sync._row_hash_sql(columns)}"
+        )
+        return {azure_sync.row_key(row[:-1]): row[-1] for row in self.azure_rows(query.replace("%s", "?"), *args)}
+
+    def assert_in_step(self):
+        for table in azure_sync.SYNC_TABLES:
+            hashes = self.stored_hashes(table)
+            self.assertEqual(hashes, self.azure_hashes(table), table)
+            [(checksum,)] = self.local_rows("SELECT checksum FROM Sync_State WHERE table_name = ?", table)
+            self.assertEqual(checksum, azure_sync.table_checksum(hashes.values()), table)
+
+    def test_full_pull_records_a_hash_per_row(self):
+        self.assert_in_step()
+        self.assertEqual(set(self.stored_hashes("Users")), {'["1"]', '["2"]', '["3"]'})
+        self.assertEqual(set(self.stored_hashes("Machine_Permissions")), {'["1","M1"]', '["2","M1"]', '["3","M1"]'})
+
+    def test_changed_row_replaces_only_its_hash(self):
+        before = self.stored_hashes("Users")
+        self.azure_execute("UPDATE Users SET name = 'Renamed' WHERE csu_id = '2'")
+        azure_sync.sync_local_from_azure()
+
+        after = self.stored_hashes("Users")
+        self.assertNotEqual(after['["2"]'], before['["2"]'])
+        self.assertEqual({key: after[key] for key in ('["1"]', '["3"]')}, {key: before[key] for key in ('["1"]', '["3"]')})
+        self.assert_in_step()
+
+    def test_deleted_rows_drop_their_hashes(self):
+        self.azure_execute("DELETE FROM Machine_Permissions WHERE csu_id = '3'")
+        self.azure_execute("DELETE FROM System_Settings")
+        azure_sync.sync_local_from_azure()
+
+        self.assertNotIn('["3","M1"]', self.stored_hashes("Machine_Permissions"))
+        self.assertNotIn('["3"]', self.stored_hashes("Users"))
+        self.assertEqual(self.stored_hashes("System_Settings"), {})
+        self.assert_in_step()
+
+    def test_full_pull_discards_stale_hashes(self):
+        self.db.cursor.execute("INSERT INTO Sync_Row_Hash VALUES ('Users', '[\"99\"]', 1)")
+        self.db.conn.commit()
+        azure_sync.sync_local_from_azure(full=True)
+        self.assert_in_step()
+
+    def test_pending_request_has_no_hash(self):
+        self.db.insert_access_request("6", "M1", "1006")
+        self.azure_execute(AZURE_REQUEST, 1, "1002", "2", "M1")
+        azure_sync.sync_local_from_azure()
+        self.assertEqual(set(self.stored_hashes("Access_Requests")), {'["1"]'})
+        self.assert_in_step()
+
+    def test_sync_state_has_no_high_water_column(self):
+        self.db.cursor.execute("PRAGMA table_info(Sync_State)")
+        self.assertEqual([row[1] for row in self.db.cursor.fetchall()], ["table_name", "checksum", "scope", "last_synced"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# tests/test_create_local_db.py
+"""
+File: test_create_local_db.py
+Description:
+  Schema migrations: a station database from before the synced markers is upgraded to the
+  current version, keeps the rows it should, and ends up with the same schema as a fresh one.
+  Usage: python -m pytest tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from create_local_db import MIGRATIONS, SCHEMA_VERSION, connect_local_db, migrate
+
+# Access_Requests and Machine_Usage as stations created them before the synced markers
+LEGACY_TABLES = """
+CREATE TABLE Access_Requests (
+    request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT,
+    csu_id TEXT,
+    machine_id TEXT,
+    machine_type TEXT,
+    requested_on TEXT,
+    status TEXT DEFAULT 'under review',
+    reviewed_by TEXT,
+    reviewed_at TEXT
+);
+CREATE TABLE Machine_Usage (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    csu_id TEXT,
+    machine_id TEXT,
+    machine_type TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    duration INTEGER
+);
+"""
+
+
+def migrate_to(conn, target):
+    for version, _, apply in MIGRATIONS:
+        if version <= target:
+            apply(conn)
+    conn.execute(f"PRAGMA user_version = {target}")
+    conn.commit()
+
+
+def schema_of(conn):
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    columns = {table: [tuple(row[1:]) for row in conn.execute(f"PRAGMA table_info({table})")] for table in tables}
+    indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name")]
+    return columns, indexes
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp(prefix="emec-test-")
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        self.conn = connect_local_db(os.path.join(workdir, "station.db"))
+        self.addCleanup(self.conn.close)
+        self.fresh = connect_local_db(os.path.join(workdir, "fresh.db"))
+        self.addCleanup(self.fresh.close)
+        migrate(self.fresh)
+
+    def rows(self, query):
+        return [tuple(row) for row in self.conn.execute(query)]
+
+    def test_v1_database_upgrades_to_current_schema(self):
+        self.conn.executescript(LEGACY_TABLES)
+        migrate_to(self.conn, 1)
+        self.conn.executescript("""
+            INSERT INTO Access_Requests (request_id, csu_id, machine_id, status) VALUES (5, '101', 'M1', 'under review');
+            INSERT INTO Access_Requests (request_id, csu_id, machine_id, status) VALUES (6, '102', 'M1', 'approved');
+            INSERT INTO Machine_Usage (session_id, csu_id, end_time) VALUES ('s1', '101', '2026-01-01 10:00:00');
+            INSERT INTO Sync_State (table_name, checksum, high_water, scope) VALUES ('Users', '3:1:1', '2026-01-01', 'M1');
+        """)
+
+        migrate(self.conn)
+
+        self.assertEqual(self.conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertEqual(schema_of(self.conn), schema_of(self.fresh))
+        # Pending requests are marked unsynced and moved to placeholder ids; reviewed ones stay
+        self.assertEqual(
+            self.rows("SELECT request_id, csu_id, synced FROM Access_Requests ORDER BY request_id"),
+            [(-5, "101", 0), (6, "102", 1)]
+        )
+        # Sessions from before the synced marker have not been uploaded
+        self.assertEqual(self.rows("SELECT session_id, synced FROM Machine_Usage"), [("s1", 0)])
+        self.assertEqual(self.rows("SELECT table_name, checksum, scope FROM Sync_State"), [("Users", "3:1:1", "M1")])
+
+    def test_synced_defaults(self):
+        migrate(self.conn)
+        self.conn.execute("INSERT INTO Access_Requests (csu_id) VALUES ('101')")
+        self.conn.execute("INSERT INTO Machine_Usage (session_id) VALUES ('s1')")
+        # Rows pulled from Azure are already there; sessions recorded here are not
+        self.assertEqual(self.rows("SELECT synced FROM Access_Requests"), [(1,)])
+        self.assertEqual(self.rows("SELECT synced FROM Machine_Usage"), [(0,)])
+
+    def test_uploaded_sessions_are_pruned(self):
+        migrate_to(self.conn, 4)
+        self.conn.executescript("""
+            INSERT INTO Machine_Usage (session_id, synced) VALUES ('uploaded', 1);
+            INSERT INTO Machine_Usage (session_id, synced) VALUES ('pending', 0);
+        """)
+
+        migrate(self.conn)
+
+        self.assertEqual(self.rows("SELECT session_id FROM Machine_Usage"), [("pending",)])
+
+    def test_migrate_is_idempotent(self):
+        migrate(self.conn)
+        self.conn.execute("INSERT INTO Access_Requests (request_id, csu_id, status, synced) VALUES (-1, '101', 'under review', 0)")
+        self.conn.commit()
+        migrate(self.conn)
+        self.assertEqual(self.rows("SELECT request_id FROM Access_Requests"), [(-1,)])
+        self.assertEqual(schema_of(self.conn), schema_of(self.fresh))
+
+
+if __name__ == "__main__":
+    unittest.main()
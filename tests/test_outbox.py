@@ -0,0 +1,123 @@
+# tests/test_outbox.py
+"""
+File: test_outbox.py
+Description:
+  Durable outbox: coalescing of repeated updates, retries with backoff after a failed push,
+  and queued items surviving a crash. Push handlers are replaced with recorders.
+  Usage: python -m pytest tests
+"""
+
+import unittest
+from unittest import mock
+
+from config.constants import OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX
+from db import local_db, outbox
+from db.outbox import OutboxWorker, enqueue, backoff_delay, KIND_USER_STATUS, KIND_SESSION
+from tests.support import LocalDBTestCase
+
+
+class OutboxTest(LocalDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pushed = []
+        self.results = []
+        handlers = mock.patch.dict(outbox.HANDLERS, {KIND_USER_STATUS: self.push, KIND_SESSION: self.push})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        self.worker = OutboxWorker()
+
+    def push(self, item_key):
+        self.pushed.append(item_key)
+        result = self.results.pop(0) if self.results else True
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def queued(self):
+        return self.local_rows("SELECT kind, item_key, version, attempts, last_error FROM Sync_Outbox ORDER BY outbox_id")
+
+    def make_due(self):
+        self.db.reset_outbox_backoff()
+
+    # --- Coalescing ---
+    def test_repeated_updates_collapse_into_one_item(self):
+        for _ in range(3):
+            enqueue(KIND_USER_STATUS, "101", db=self.db)
+        enqueue(KIND_USER_STATUS, "202", db=self.db)
+
+        self.assertEqual(self.queued(), [(KIND_USER_STATUS, "101", 3, 0, None), (KIND_USER_STATUS, "202", 1, 0, None)])
+        self.assertEqual(self.worker.drain_once(self.db), 2)
+        self.assertEqual(self.pushed, ["101", "202"])
+        self.assertEqual(self.queued(), [])
+
+    def test_update_during_push_is_pushed_again(self):
+        enqueue(KIND_USER_STATUS, "101", db=self.db)
+
+        def push_while_user_changes(item_key):
+            enqueue(KIND_USER_STATUS, item_key, db=self.db)
+            return self.push(item_key)
+        outbox.HANDLERS[KIND_USER_STATUS] = push_while_user_changes
+
+        self.worker.drain_once(self.db)
+        # The version moved on while the push ran, so the item stays for the newer state
+        self.assertEqual(self.queued(), [(KIND_USER_STATUS, "101", 2, 0, None)])
+
+        outbox.HANDLERS[KIND_USER_STATUS] = self.push
+        self.worker.drain_once(self.db)
+        self.assertEqual(self.pushed, ["101", "101"])
+        self.assertEqual(self.queued(), [])
+
+    # --- Retries ---
+    def test_failed_push_is_retried_after_backoff(self):
+        enqueue(KIND_SESSION, db=self.db)
+        self.results = [False, RuntimeError("Azure unreachable"), True]
+
+        self.assertEqual(self.worker.drain_once(self.db), 0)
+        self.assertEqual(self.queued(), [(KIND_SESSION, "*", 1, 1, "push returned failure")])
+        # Not due until the backoff has passed
+        self.assertEqual(self.worker.drain_once(self.db), 0)
+        self.assertEqual(len(self.pushed), 1)
+
+        self.make_due()
+        self.worker.drain_once(self.db)
+        self.assertEqual(self.queued(), [(KIND_SESSION, "*", 1, 2, "Azure unreachable")])
+
+        self.make_due()
+        self.assertEqual(self.worker.drain_once(self.db), 1)
+        self.assertEqual(len(self.pushed), 3)
+        self.assertEqual(self.queued(), [])
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([backoff_delay(n) for n in (1, 2, 3)], [OUTBOX_RETRY_BASE, OUTBOX_RETRY_BASE * 2, OUTBOX_RETRY_BASE * 4])
+        self.assertEqual(backoff_delay(50), OUTBOX_RETRY_MAX)
+
+    def test_unknown_kind_is_dropped(self):
+        enqueue("retired_kind", "1", db=self.db)
+        self.worker.drain_once(self.db)
+        self.assertEqual(self.queued(), [])
+
+    # --- Durability ---
+    def test_queued_items_survive_a_crash(self):
+        enqueue(KIND_USER_STATUS, "101", db=self.db)
+        enqueue(KIND_SESSION, db=self.db)
+        # Drop the connection without closing it, as a power cut would
+        crashed = local_db._shared_db
+        self.addCleanup(crashed.conn.close)
+        local_db._shared_db = None
+
+        self.db = local_db.get_local_db()
+        self.assertIsNot(self.db, crashed)
+        self.assertEqual(OutboxWorker().drain_once(self.db), 2)
+        self.assertEqual(self.pushed, ["101", "*"])
+
+    def test_enqueue_rolls_back_with_its_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.mark_user_active("101")
+                enqueue(KIND_USER_STATUS, "101", db=self.db)
+                raise RuntimeError("session write failed")
+        self.assertEqual(self.queued(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# tests/test_snapshot.py
+"""
+File: test_snapshot.py
+Description:
+  Snapshot publish and install against the Azure stand-in, with the snapshot server replaced
+  by the builder's output directory. Covers signed manifests, checksum mismatches and the
+  rejection of manifests that can't be authenticated.
+  Usage: python -m pytest tests
+"""
+
+import os
+import json
+import unittest
+import urllib.request
+
+from config import constants
+from db.snapshot import build_snapshots, install_snapshot, MANIFEST_NAME
+from tests.support import AzureTestCase, seed_azure
+
+KEY = "test-key"
+
+
+class SnapshotInstallTest(AzureTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_azure(self)
+        self.patch(constants, "SNAPSHOT_KEY", None)
+        self.out_dir = os.path.abspath("snapshots")
+        self.manifest = build_snapshots(self.out_dir, ["M1"], key=KEY, master_path="master/master.db")["M1"]
+        self.fetched = []
+        self.patch(urllib.request, "urlopen", self.urlopen)
+
+    def urlopen(self, url, timeout=None):
+        # Serves the builder's output for any host, as the static file server would
+        self.fetched.append(url)
+        return open(os.path.join(self.out_dir, *url.split("/")[3:]), "rb")
+
+    def scope_path(self, name):
+        return os.path.join(self.out_dir, "M1", name)
+
+    def rewrite_manifest(self, **fields):
+        self.manifest.update(fields)
+        with open(self.scope_path(MANIFEST_NAME), "w") as f:
+            json.dump(self.manifest, f)
+
+    def users(self):
+        return self.local_rows("SELECT csu_id FROM Users ORDER BY csu_id")
+
+    def assert_rejected(self, **kwargs):
+        self.assertFalse(install_snapshot(db=self.db, **kwargs))
+        self.assertEqual(self.users(), [])
+        self.assertFalse(os.path.exists(os.path.join("data", "snapshot.download")))
+
+    def test_signed_snapshot_installs(self):
+        self.assertIn("signature", self.manifest)
+        self.assertTrue(install_snapshot("http://snapshots.local", db=self.db, key=KEY))
+        self.assertEqual(self.users(), [("1",), ("2",), ("3",)])
+
+    def test_checksum_mismatch_is_rejected(self):
+        with open(self.scope_path(self.manifest["file"]), "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+
+        self.assert_rejected(base_url="http://snapshots.local", key=KEY)
+        # The file was fetched, and failed the checksum
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_manifest_edited_after_signing_is_rejected(self):
+        self.rewrite_manifest(sha256="0" * 64)
+        self.assert_rejected(base_url="http://snapshots.local", key=KEY)
+        # The file is never fetched on an untrusted manifest
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_wrong_key_is_rejected(self):
+        self.assert_rejected(base_url="http://snapshots.local", key="other-key")
+
+    def test_unsigned_manifest_needs_https(self):
+        self.rewrite_manifest(signature=None)
+        self.assert_rejected(base_url="http://snapshots.local")
+        self.assertTrue(install_snapshot("https://snapshots.local", db=self.db))
+        self.assertEqual(self.users(), [("1",), ("2",), ("3",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_startup_check.py
+"""
+File: test_startup_check.py
+Description:
+  Startup sequence with the network checks and Azure calls replaced, on fake hardware.
+  Usage: python -m pytest tests
+"""
+
+import time
+import types
+import unittest
+from datetime import datetime, timedelta
+
+from config import constants
+from config.constants import LCD_MESSAGES, STATUS_MAINTENANCE, STATUS_NEUTRAL
+from db import snapshot
+from utils import hardware, startup_check
+from utils.network import CheckResult
+from tests.support import LocalDBTestCase
+
+
+class StartupTestCase(LocalDBTestCase):
+    def setUp(self):
+        super().setUp()
+        hardware.use_fakes()
+        self.addCleanup(hardware.reset)
+        self.patch(startup_check, "run_checks", lambda checks: {
+            "azure": CheckResult("azure", True, True, 0, None),
+            "public_ip": CheckResult("public_ip", True, "10.0.0.5", 0, None),
+        })
+        self.patch(startup_check, "upload_backlog", lambda: True)
+        self.patch(startup_check, "sync_local_from_azure", lambda: {})
+        self.patch(startup_check, "push_machine_status", lambda machine_id: True)
+        # Any hold must be left to the station's timers
+        self.patch(startup_check, "time", types.SimpleNamespace(monotonic=time.monotonic, sleep=self.fail_on_sleep))
+        self.patch(startup_check, "_snapshot_tried", False)
+
+    def fail_on_sleep(self, seconds):
+        self.fail(f"startup_sequence slept for {seconds}s")
+
+
+class StartupSequenceTest(StartupTestCase):
+    def test_ready_messages_are_returned_not_slept_on(self):
+        messages = startup_check.startup_sequence()
+
+        self.assertEqual([message[:2] for message in messages], [tuple(LCD_MESSAGES["start"]), tuple(LCD_MESSAGES["startup_next"])])
+        self.assertEqual(self.db.get_machine("M1")["machine_status"], STATUS_NEUTRAL)
+
+    def test_maintenance_returns_none(self):
+        self.db.insert_machine_if_missing("M1", "Lathe", "lathe")
+        self.db.cursor.execute("UPDATE Machine SET machine_status = ? WHERE machine_id = 'M1'", (STATUS_MAINTENANCE,))
+        self.db.conn.commit()
+        self.assertIsNone(startup_check.startup_sequence())
+
+
+class SnapshotGateTest(StartupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.installs = 0
+        self.patch(constants, "SNAPSHOT_URL", "http://snapshots.local")
+        self.patch(snapshot, "install_snapshot", self.install_snapshot)
+
+    def install_snapshot(self, db=None):
+        self.installs += 1
+        return False
+
+    def synced(self, hours_ago):
+        last_synced = (datetime.now() - timedelta(hours=hours_ago)).strftime("%Y-%m-%d %H:%M:%S")
+        self.db.cursor.execute("INSERT OR REPLACE INTO Sync_State (table_name, last_synced) VALUES ('Users', ?)", (last_synced,))
+        self.db.conn.commit()
+
+    def test_retries_skip_the_snapshot_while_local_data_is_fresh(self):
+        self.synced(hours_ago=1)
+        startup_check.startup_sequence()
+        startup_check.startup_sequence()
+        self.assertEqual(self.installs, 1)
+
+    def test_retries_fetch_the_snapshot_while_local_data_is_stale(self):
+        self.synced(hours_ago=constants.OFFLINE_MAX_STALENESS_HOURS + 1)
+        startup_check.startup_sequence()
+        startup_check.startup_sequence()
+        self.assertEqual(self.installs, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,297 @@
+# tests/test_station.py
+"""
+File: test_station.py
+Description:
+  Transition tests for the station state machine on the simulated hardware backend. Cards are
+  placed on a SimMFRC522 and reach the station through the real reader, ReaderService and
+  validator; the relay drives SimGPIO; a fake clock fires the removal, grace and message timers.
+  Each test runs against a fresh local database in a temporary directory.
+  Usage: python -m pytest tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from config import constants
+from config.constants import RELAY_PIN, CARD_REMOVAL_TIMEOUT, STARTUP_RETRY_INTERVAL, LCD_LINE_DELAY
+from utils import hardware
+from db.local_db import get_local_db, close_local_db
+from db.auth_cache import auth_cache
+from rfid.reader_service import ReaderService
+from rfid.validator import validate_card
+from relay.session_manager import SessionManager
+from relay.station import Station, IDLE, VALIDATING, IN_SESSION, GRACE, DENIED, MAINTENANCE
+
+PERMITTED = 101
+NOT_PERMITTED = 202
+OTHER_PERMITTED = 303
+GRACE_SECONDS = 10
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StationTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp(prefix="emec-test-")
+        os.chdir(self.workdir)
+        os.makedirs("data")
+        hardware.set_backend(hardware.BACKEND_SIM)
+
+        self.db = get_local_db()
+        self.db.insert_machine_if_missing(constants.MACHINE_ID, "Test", "test")
+        with self.db.transaction():
+            for csu_id in (PERMITTED, NOT_PERMITTED, OTHER_PERMITTED):
+                self.db.cursor.execute("INSERT INTO Users (csu_id, name) VALUES (?, ?)", (str(csu_id), f"User {csu_id}"))
+            for csu_id in (PERMITTED, OTHER_PERMITTED):
+                self.db.cursor.execute(
+                    "INSERT INTO Machine_Permissions (csu_id, machine_id) VALUES (?, ?)", (str(csu_id), constants.MACHINE_ID)
+                )
+            self.db.cursor.execute(
+                "INSERT INTO System_Settings (setting, value) VALUES ('grace_period_seconds', ?)", (str(GRACE_SECONDS),)
+            )
+        auth_cache.invalidate()
+
+        self.field = hardware.get("mfrc522")
+        self.gpio = hardware.get_gpio()
+        self.lcd = hardware.get_lcd()
+        self.service = ReaderService(hardware.get_reader(), irq_pin=None)
+        self.session_mgr = SessionManager()
+        self.clock = FakeClock()
+        self.startup_ok = True
+        self.ready_messages = []
+        self.station = Station(
+            self.lcd, self.session_mgr, self.service,
+            validate=validate_card, startup=self.startup, clock=self.clock
+        )
+        self.station.boot()
+
+    def startup(self):
+        return list(self.ready_messages) if self.startup_ok else None
+
+    def tearDown(self):
+        self.lcd.flush(1)
+        close_local_db()
+        hardware.reset()
+        auth_cache.invalidate()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    # --- Drivers ---
+    def pump(self):
+        while True:
+            event = self.service.wait_event(timeout=0)
+            if event is None:
+                return
+            self.station.handle_event(event)
+
+    def tap(self, csu_id):
+        self.field.place(csu_id)
+        self.service.poll_once()
+        self.pump()
+
+    def lift(self):
+        self.field.remove()
+        for _ in range(self.service.removal_misses):
+            self.service.poll_once()
+        self.pump()
+
+    def advance(self, seconds):
+        # One tick per second so the per-second grace countdown runs as it would live
+        end = self.clock.now + seconds
+        while self.clock.now < end:
+            self.clock.now = min(end, self.clock.now + 1)
+            self.station.tick()
+
+    # --- Observations ---
+    def relay_on(self):
+        return self.gpio.input(RELAY_PIN) == self.gpio.HIGH
+
+    def sessions(self):
+        self.db.cursor.execute("SELECT session_id, csu_id, end_time FROM Machine_Usage ORDER BY log_id")
+        return [tuple(row) for row in self.db.cursor.fetchall()]
+
+    def lcd_lines(self):
+        return tuple(line.strip() for line in self.lcd.display_thread.latest.lines)
+
+    # --- Startup ---
+    def test_boot_failure_retries_from_maintenance(self):
+        self.startup_ok = False
+        self.station.boot()
+        self.assertEqual(self.station.state, MAINTENANCE)
+
+        self.startup_ok = True
+        self.advance(STARTUP_RETRY_INTERVAL - 1)
+        self.assertEqual(self.station.state, MAINTENANCE)
+        self.advance(1)
+        self.assertEqual(self.station.state, IDLE)
+
+    def test_ready_messages_are_held_on_timers(self):
+        self.ready_messages = [("All Clear.", "Welcome", "white", 2), ("Scan CSU ID", "to start", "white", 0)]
+        self.station.boot()
+        self.assertEqual(self.station.state, IDLE)
+        self.assertEqual(self.lcd_lines(), ("All Clear.", "Welcome"))
+        self.advance(2)
+        self.assertEqual(self.lcd_lines(), ("Scan CSU ID", "to start"))
+
+    def test_card_tapped_during_ready_messages_is_validated(self):
+        self.ready_messages = [("All Clear.", "Welcome", "white", 2), ("Scan CSU ID", "to start", "white", 0)]
+        self.station.boot()
+        self.tap(PERMITTED)
+        self.advance(2)
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertEqual(self.lcd_lines(), ("User 101", "in use"))
+
+    # --- Grant / deny ---
+    def test_granted_card_starts_session_and_closes_relay(self):
+        self.assertFalse(self.relay_on())
+        self.tap(PERMITTED)
+
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertTrue(self.relay_on())
+        [(session_id, csu_id, end_time)] = self.sessions()
+        self.assertEqual((csu_id, end_time), (str(PERMITTED), None))
+        self.assertEqual(self.session_mgr.active_session_id, session_id)
+
+    def test_relay_stays_off_when_session_row_cannot_be_written(self):
+        def broken_insert(*args):
+            raise RuntimeError("disk I/O error")
+        self.db.insert_session = broken_insert
+
+        with self.assertRaises(RuntimeError):
+            self.tap(PERMITTED)
+        self.assertFalse(self.relay_on())
+        self.assertIsNone(self.session_mgr.active_session_id)
+
+    def test_denied_card_shows_messages_then_returns_to_idle(self):
+        self.tap(NOT_PERMITTED)
+        self.assertEqual(self.station.state, DENIED)
+        self.assertFalse(self.relay_on())
+        self.assertEqual(self.lcd_lines(), ("Access Denied", "Raising req"))
+
+        self.advance(3)
+        self.assertEqual(self.station.state, DENIED)
+        self.assertEqual(self.lcd_lines(), ("Request raised", "Please wait"))
+        self.advance(LCD_LINE_DELAY)
+        self.assertEqual(self.station.state, IDLE)
+        self.assertEqual(self.sessions(), [])
+
+    def test_card_tapped_while_denied_is_validated(self):
+        self.tap(NOT_PERMITTED)
+        self.lift()
+        self.tap(PERMITTED)
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertTrue(self.relay_on())
+
+    # --- Removal and grace ---
+    def test_brief_removal_keeps_session(self):
+        self.tap(PERMITTED)
+        self.lift()
+        self.advance(CARD_REMOVAL_TIMEOUT - 1)
+        self.tap(PERMITTED)
+        self.advance(CARD_REMOVAL_TIMEOUT)
+
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertTrue(self.relay_on())
+        self.assertEqual(len(self.sessions()), 1)
+
+    def test_removal_enters_grace_with_countdown(self):
+        self.tap(PERMITTED)
+        self.lift()
+        self.advance(CARD_REMOVAL_TIMEOUT)
+
+        self.assertEqual(self.station.state, GRACE)
+        self.assertTrue(self.relay_on())
+        self.assertEqual(self.lcd_lines(), ("Remove detected", f"Reinsert: {GRACE_SECONDS}s"))
+        self.advance(4)
+        self.assertEqual(self.lcd_lines(), ("Remove detected", f"Reinsert: {GRACE_SECONDS - 4}s"))
+
+    def test_reinsert_during_grace_resumes_same_session(self):
+        self.tap(PERMITTED)
+        session_id = self.session_mgr.active_session_id
+        self.lift()
+        self.advance(CARD_REMOVAL_TIMEOUT + GRACE_SECONDS - 1)
+        self.tap(PERMITTED)
+
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertEqual(self.session_mgr.active_session_id, session_id)
+        self.assertEqual(self.sessions(), [(session_id, str(PERMITTED), None)])
+        self.advance(GRACE_SECONDS)
+        self.assertEqual(self.station.state, IN_SESSION)
+
+    def test_grace_expiry_ends_session_and_opens_relay(self):
+        self.tap(PERMITTED)
+        self.lift()
+        self.advance(CARD_REMOVAL_TIMEOUT + GRACE_SECONDS)
+
+        self.assertEqual(self.station.state, IDLE)
+        self.assertFalse(self.relay_on())
+        [(_, _, end_time)] = self.sessions()
+        self.assertIsNotNone(end_time)
+        self.assertIsNone(self.session_mgr.active_session_id)
+
+    # --- Card swaps ---
+    def test_other_card_mid_session_ends_and_starts_session(self):
+        self.tap(PERMITTED)
+        self.tap(OTHER_PERMITTED)
+
+        self.assertEqual(self.station.state, IN_SESSION)
+        self.assertTrue(self.relay_on())
+        first, second = self.sessions()
+        self.assertEqual(first[1], str(PERMITTED))
+        self.assertIsNotNone(first[2])
+        self.assertEqual((second[1], second[2]), (str(OTHER_PERMITTED), None))
+
+    def test_unpermitted_card_during_grace_ends_session(self):
+        self.tap(PERMITTED)
+        self.lift()
+        self.advance(CARD_REMOVAL_TIMEOUT)
+        self.tap(NOT_PERMITTED)
+
+        self.assertEqual(self.station.state, DENIED)
+        self.assertFalse(self.relay_on())
+        [(_, _, end_time)] = self.sessions()
+        self.assertIsNotNone(end_time)
+
+    # --- Failures ---
+    def test_error_in_run_loop_fails_closed(self):
+        self.tap(PERMITTED)
+        self.assertTrue(self.relay_on())
+
+        def broken_validate(csu_id, uid):
+            raise RuntimeError("database is locked")
+        self.station.validate = broken_validate
+        self.field.place(OTHER_PERMITTED)
+        self.service.poll_once()
+
+        class Stop(Exception):
+            pass
+        wait_event = self.service.wait_event
+        def one_event(timeout=None):
+            event = wait_event(timeout=0)
+            if event is None:
+                raise Stop()
+            return event
+        self.service.wait_event = one_event
+        self.station.boot = lambda: None
+        with self.assertRaises(Stop):
+            self.station.run()
+
+        self.assertEqual(self.station.state, IDLE)
+        self.assertFalse(self.relay_on())
+        self.assertIsNone(self.session_mgr.active_session_id)
+        [(_, _, end_time)] = self.sessions()
+        self.assertIsNotNone(end_time)
+        self.assertNotIn(VALIDATING, self.station.timers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_validator.py
+"""
+File: test_validator.py
+Description:
+  A card whose UID is stored for another user: the reader's verifying sector read catches the
+  mismatch and clear_card_uid removes the stale UID locally, from the auth cache and, through
+  the outbox, from the Azure stand-in. Runs on the simulated MFRC522.
+  Usage: python -m pytest tests
+"""
+
+import unittest
+
+from config.constants import SIM_LATENCY
+from db import azure_sync
+from db.auth_cache import auth_cache
+from db.outbox import OutboxWorker, KIND_USER_UPDATE
+from hal.sim_gpio import SimGPIO
+from hal.sim_mfrc522 import SimCard, SimMFRC522
+from rfid.reader import RFIDReader
+from rfid.validator import clear_card_uid
+from tests.support import AzureTestCase, seed_azure
+
+NO_LATENCY = {op: 0 for op in SIM_LATENCY}
+
+
+class ClearCardUidTest(AzureTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_azure(self)
+        self.field = SimMFRC522(latency=NO_LATENCY)
+        self.reader = RFIDReader(
+            mfrc522=self.field, gpio=SimGPIO(latency=NO_LATENCY),
+            uid_lookup=auth_cache.get_csu_id_by_uid, verify_rate=1, on_mismatch=clear_card_uid
+        )
+        # User 2's card, as the reader numbers it
+        self.uid = self.reader.uid_to_number(SimCard(2, uid=1002).uid)
+        self.azure_execute("UPDATE Users SET uid = ? WHERE csu_id = '2'", str(self.uid))
+        azure_sync.sync_local_from_azure()
+
+    def queued(self):
+        return self.local_rows("SELECT kind, item_key FROM Sync_Outbox")
+
+    def test_mismatched_uid_is_cleared_everywhere(self):
+        # User 3's new card reuses the UID still stored for user 2
+        self.field.place(3, uid=1002)
+        self.assertEqual(auth_cache.get_csu_id_by_uid(self.uid), "2")
+
+        self.assertEqual(self.reader.read_card(), (self.uid, 3))
+
+        self.assertEqual(self.local_rows("SELECT uid FROM Users WHERE csu_id = '2'"), [(None,)])
+        self.assertIsNone(auth_cache.get_csu_id_by_uid(self.uid))
+        self.assertIsNone(auth_cache.get_user("2")["uid"])
+        self.assertEqual(self.queued(), [(KIND_USER_UPDATE, "2")])
+
+        self.assertEqual(OutboxWorker().drain_once(self.db), 1)
+        self.assertEqual(self.azure_rows("SELECT uid FROM Users WHERE csu_id = '2'"), [(None,)])
+        self.assertEqual(self.azure_rows("SELECT uid FROM Users WHERE csu_id = '3'"), [("1003",)])
+
+    def test_matching_card_is_left_alone(self):
+        self.field.place(2, uid=1002)
+
+        self.assertEqual(self.reader.read_card(), (self.uid, 2))
+
+        self.assertEqual(self.local_rows("SELECT uid FROM Users WHERE csu_id = '2'"), [(str(self.uid),)])
+        self.assertEqual(auth_cache.get_csu_id_by_uid(self.uid), "2")
+        self.assertEqual(self.queued(), [])
+
+    def test_uid_already_moved_is_not_cleared(self):
+        # Azure gave user 2 another card before the mismatch was reported
+        self.db.cursor.execute("UPDATE Users SET uid = '2002' WHERE csu_id = '2'")
+        self.db.conn.commit()
+
+        clear_card_uid(self.uid, "2", 3)
+
+        self.assertEqual(self.local_rows("SELECT uid FROM Users WHERE csu_id = '2'"), [("2002",)])
+        self.assertEqual(self.queued(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
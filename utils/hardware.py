@@ -0,0 +1,136 @@
+# utils/hardware.py
+"""
+File: hardware.py
+Description:
+  Registry for the station's hardware: LCD, relay and RFID reader, plus the GPIO, I2C and
+  MFRC522 drivers under them. Each device is built lazily on first use and only once per
+  process, so importing modules never touches I2C, SPI or GPIO. The "sim" backend
+  (EMEC_HARDWARE=sim) swaps the drivers for the latency-modelling simulators in hal/.
+  Tests can also register fakes before anything asks for hardware.
+"""
+
+import time
+import logging
+import threading
+from config.constants import HARDWARE_BACKEND
+
+logger = logging.getLogger("hardware")
+
+BACKEND_PI = "pi"
+BACKEND_SIM = "sim"
+
+backend = HARDWARE_BACKEND
+
+
+# --- Drivers ---
+def _make_gpio():
+    if backend == BACKEND_SIM:
+        from hal.sim_gpio import SimGPIO
+        return SimGPIO()
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+def _make_i2c():
+    if backend == BACKEND_SIM:
+        from hal.sim_smbus import SimSMBus
+        return SimSMBus(1)
+    from smbus import SMBus
+    return SMBus(1)
+
+
+def _make_mfrc522():
+    if backend == BACKEND_SIM:
+        from hal.sim_mfrc522 import SimMFRC522
+        return SimMFRC522()
+    from mfrc522 import MFRC522
+    return MFRC522()
+
+
+# --- Devices ---
+def _make_lcd():
+    from lcd.lcd import LCD, LCD_COLS, LCD_ROWS
+    from lcd.RGB1602 import RGB1602
+    return LCD(panel=RGB1602(LCD_COLS, LCD_ROWS, bus=get("i2c")))
+
+
+def _make_relay():
+    from relay.controller import RelayController
+    return RelayController(gpio=get("gpio"))
+
+
+def _make_reader():
+    from rfid.reader import RFIDReader
+    from db.auth_cache import auth_cache
+    from rfid.validator import clear_card_uid
+    return RFIDReader(
+        mfrc522=get("mfrc522"), gpio=get("gpio"),
+        uid_lookup=auth_cache.get_csu_id_by_uid, on_mismatch=clear_card_uid
+    )
+
+
+FACTORIES = {
+    "gpio": _make_gpio,
+    "i2c": _make_i2c,
+    "mfrc522": _make_mfrc522,
+    "lcd": _make_lcd,
+    "relay": _make_relay,
+    "reader": _make_reader,
+}
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def get(name):
+    with _lock:
+        if name not in _instances:
+            start = time.monotonic()
+            _instances[name] = FACTORIES[name]()
+            logger.info(f"[HARDWARE] {name} initialised in {(time.monotonic() - start) * 1000:.0f} ms")
+        return _instances[name]
+
+
+def get_gpio():
+    return get("gpio")
+
+
+def get_lcd():
+    return get("lcd")
+
+
+def get_relay():
+    return get("relay")
+
+
+def get_reader():
+    return get("reader")
+
+
+def register(name, instance):
+    with _lock:
+        _instances[name] = instance
+
+
+def use_fakes():
+    from lcd.lcd import LCD
+    from lcd.fake_panel import FakePanel
+    from relay.fake_relay import FakeRelay
+    from rfid.simulated_reader import SimulatedReader
+    register("lcd", LCD(panel=FakePanel()))
+    register("relay", FakeRelay())
+    register("reader", SimulatedReader())
+
+
+def set_backend(name):
+    global backend
+    if name not in (BACKEND_PI, BACKEND_SIM):
+        raise ValueError(f"Unknown hardware backend: {name}")
+    with _lock:
+        backend = name
+        _instances.clear()
+
+
+def reset():
+    with _lock:
+        _instances.clear()
@@ -0,0 +1,85 @@
+# utils/network.py
+"""
+File: network.py
+Description:
+  Network checks used at startup and while offline. Checks run concurrently with hard timeouts,
+  reachability is tested against the Azure MySQL endpoint itself, and the public IP is cached
+  for PUBLIC_IP_TTL so startup retries don't look it up again.
+"""
+
+import time
+import socket
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import constants
+from config.constants import NETWORK_PROBE_TIMEOUT, PUBLIC_IP_URL, PUBLIC_IP_TTL
+
+logger = logging.getLogger("network")
+
+CheckResult = namedtuple("CheckResult", ["name", "ok", "value", "latency", "error"])
+
+_ip_cache = {"value": None, "fetched_at": 0}
+_ip_lock = threading.Lock()
+
+
+def azure_reachable(timeout=NETWORK_PROBE_TIMEOUT):
+    # TCP connect to the MySQL port covers DNS, routing and firewall in one step
+    azure = constants.AZURE_ENV_KEYS
+    with socket.create_connection((azure["host"], azure["port"]), timeout=timeout):
+        return True
+
+
+def check_azure():
+    try:
+        return azure_reachable()
+    except (OSError, TypeError):
+        return False
+
+
+def get_public_ip(timeout=NETWORK_PROBE_TIMEOUT, ttl=PUBLIC_IP_TTL):
+    with _ip_lock:
+        if _ip_cache["value"] and time.time() - _ip_cache["fetched_at"] < ttl:
+            return _ip_cache["value"]
+    import urllib.request  # ~40 ms to import; only needed once the cache is empty
+    try:
+        with urllib.request.urlopen(PUBLIC_IP_URL, timeout=timeout) as response:
+            ip = response.read().decode().strip()
+    except Exception as e:
+        # A stale address is more useful to the dashboard than none
+        logger.warning(f"[NETWORK] Public IP lookup failed: {e}")
+        return _ip_cache["value"]
+    with _ip_lock:
+        _ip_cache["value"] = ip
+        _ip_cache["fetched_at"] = time.time()
+    return ip
+
+
+def _timed(name, check):
+    start = time.monotonic()
+    try:
+        value = check()
+        return CheckResult(name, bool(value), value, time.monotonic() - start, None)
+    except Exception as e:
+        return CheckResult(name, False, None, time.monotonic() - start, str(e))
+
+
+def run_checks(checks, timeout=NETWORK_PROBE_TIMEOUT):
+    # checks: {name: callable}. Returns {name: CheckResult}; anything still running at the
+    # deadline is reported as timed out and left to finish in the background.
+    pool = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="net-check")
+    futures = {name: pool.submit(_timed, name, check) for name, check in checks.items()}
+    wait(futures.values(), timeout=timeout)
+    pool.shutdown(wait=False)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            results[name] = CheckResult(name, False, None, timeout, "timed out")
+        result = results[name]
+        status = "ok" if result.ok else f"failed ({result.error or 'no result'})"
+        logger.info(f"[NETWORK] {name}: {status} in {result.latency * 1000:.0f} ms")
+    return results
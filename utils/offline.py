@@ -0,0 +1,101 @@
+# utils/offline.py
+"""
+File: offline.py
+Description:
+  Offline operating mode for when Azure is unreachable at startup.
+  Lets the station keep validating cards against the last-synced local snapshot (within a
+  maximum staleness), and reconciles queued work in the background once connectivity returns.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+from config import constants
+from config.constants import OFFLINE_MAX_STALENESS_HOURS, OFFLINE_RECONNECT_INTERVAL
+from db.local_db import get_local_db
+from db.azure_sync import sync_local_from_azure
+from db.outbox import enqueue, KIND_MACHINE_STATUS, KIND_ACCESS_REQUESTS
+from utils import metrics
+
+logger = logging.getLogger("offline")
+
+
+class OfflineMode:
+    def __init__(self):
+        self.active = False
+        self.since = None
+        self.snapshot_time = None
+        self.max_staleness = OFFLINE_MAX_STALENESS_HOURS * 3600
+        self._monitor = None
+        self._lock = threading.Lock()
+
+    def snapshot_age(self):
+        if self.snapshot_time is None:
+            return None
+        return (datetime.now() - self.snapshot_time).total_seconds()
+
+    def is_stale(self):
+        age = self.snapshot_age()
+        return age is None or age > self.max_staleness
+
+    def enter(self, db, probe):
+        last_synced = db.last_synced()
+        self.snapshot_time = datetime.strptime(last_synced, "%Y-%m-%d %H:%M:%S") if last_synced else None
+        hours = float(db.get_setting("offline_max_staleness_hours", default=OFFLINE_MAX_STALENESS_HOURS))
+        self.max_staleness = hours * 3600
+
+        if self.is_stale():
+            logger.error(f"[OFFLINE] Local snapshot too old or missing (last sync: {last_synced}).")
+            return False
+
+        with self._lock:
+            if not self.active:
+                self.active = True
+                self.since = time.time()
+                logger.warning(f"[OFFLINE] Running on local snapshot from {last_synced}.")
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = ReconnectMonitor(self, probe)
+                self._monitor.start()
+        return True
+
+    def leave(self):
+        with self._lock:
+            if self.active:
+                logger.info(f"[OFFLINE] Back online after {int(time.time() - self.since)}s.")
+            self.active = False
+            self.since = None
+            self.snapshot_time = None
+
+
+class ReconnectMonitor(threading.Thread):
+    def __init__(self, mode, probe, interval=OFFLINE_RECONNECT_INTERVAL):
+        super().__init__(name="reconnect-monitor", daemon=True)
+        self.mode = mode
+        self.probe = probe
+        self.interval = interval
+
+    def reconcile(self):
+        sync_local_from_azure()
+        db = get_local_db()
+        # Retry everything queued while offline now rather than waiting out its backoff
+        with db.transaction():
+            db.reset_outbox_backoff()
+            enqueue(KIND_MACHINE_STATUS, constants.MACHINE_ID, db=db)
+            enqueue(KIND_ACCESS_REQUESTS, db=db)
+
+    def run(self):
+        while self.mode.active:
+            time.sleep(self.interval)
+            if not self.probe():
+                continue
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"[OFFLINE] Reconcile failed, staying offline: {e}")
+                continue
+            self.mode.leave()
+
+
+offline_mode = OfflineMode()
+metrics.gauge("emec_offline", "1 while running on the local snapshot", lambda: int(offline_mode.active))
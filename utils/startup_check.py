@@ -8,89 +8,118 @@ Description:
 
 import os
 import time
-import socket
-import subprocess
 import logging
-from lcd.lcd import LCD
+from datetime import datetime
+from config import constants
 from config.constants import (
     LCD_MESSAGES,
     STATUS_MAINTENANCE,
     STATUS_NEUTRAL,
-    MACHINE_ID,
-    MACHINE_NAME,
-    MACHINE_TYPE,
-    LCD_LINE_DELAY,
-    DEVICE_ID as device_id
+    LCD_LINE_DELAY
 )
-from db.local_db import LocalDB
-from db.azure_sync import sync_local_from_azure, push_machine_status
+from db.local_db import get_local_db
+from db.azure_sync import sync_local_from_azure, push_machine_status, upload_backlog
+from db.outbox import enqueue, KIND_MACHINE_STATUS
+from utils.offline import offline_mode
+from utils.network import run_checks, check_azure, get_public_ip
+from utils.hardware import get_lcd
 
 
 logger = logging.getLogger("startup")
 
-def check_internet():
-    try:
-        return socket.gethostbyname("google.com")
-    except:
-        return False
-
-def get_public_ip():
-    try:
-        result = subprocess.check_output("curl -s ifconfig.me", shell=True)
-        return result.decode().strip()
-    except:
-        return "0.0.0.0"
-
+BOOT_TIME = time.monotonic()
+_snapshot_tried = False
+
+def _want_snapshot(db):
+    # The first boot always asks for a snapshot; maintenance retries only ask again while the
+    # local data is missing or too old to run offline on
+    if not _snapshot_tried:
+        return True
+    last_synced = db.last_synced()
+    if not last_synced:
+        return True
+    age = (datetime.now() - datetime.strptime(last_synced, "%Y-%m-%d %H:%M:%S")).total_seconds()
+    return age > offline_mode.max_staleness
+
+# Returns the LCD messages (line1, line2, color, hold) for the station to show once it is
+# ready, or None when it can't start; the station holds them on timers, so nothing here sleeps.
 def startup_sequence():
-    lcd = LCD()
-    db = LocalDB()
+    global _snapshot_tried
+    started = time.monotonic()
+    lcd = get_lcd()
+    db = get_local_db()
 
     logger.info("[STEP] Starting system checks...")
 
-    if not check_internet():
-        lcd.display("\n".join(LCD_MESSAGES["internet_error"]), color="red")
-        logger.error("[FAIL] No Internet")
-        return False
-
-    logger.info("[PASS] Internet check passed.")
-    device_ip = get_public_ip()
-    logger.info(f"[PASS] Public IP: {device_ip}")
-
-    try:
-        lcd.display("Syncing online")
-        sync_local_from_azure()
-        logger.info("[PASS] Azure sync complete.")
-    except Exception as e:
-        lcd.display("\n".join(LCD_MESSAGES["azure_error"]), color="red")
-        logger.error(f"[ERROR] Azure sync failed: {e}")
-        return False
-
-    machine = db.get_machine(MACHINE_ID)
+    online = False
+    device_ip = None
+    failure_message = LCD_MESSAGES["internet_error"]
+    checks = run_checks({"azure": check_azure, "public_ip": get_public_ip})
+    if constants.SNAPSHOT_URL and _want_snapshot(db):
+        # A prebuilt snapshot turns the first pull into a delta; skipped when unchanged
+        from db.snapshot import install_snapshot
+        lcd.display("Loading snapshot")
+        install_snapshot(db=db)
+        _snapshot_tried = True
+    if not checks["azure"].ok:
+        logger.error("[FAIL] Azure endpoint unreachable")
+    else:
+        logger.info("[PASS] Azure endpoint reachable.")
+        device_ip = checks["public_ip"].value or "0.0.0.0"
+        logger.info(f"[PASS] Public IP: {device_ip}")
+
+        try:
+            lcd.display("Syncing online")
+            sync_start = time.monotonic()
+            upload_backlog()
+            sync_local_from_azure()
+            logger.info(f"[PASS] Azure sync complete in {time.monotonic() - sync_start:.2f}s.")
+            online = True
+        except Exception as e:
+            failure_message = LCD_MESSAGES["azure_error"]
+            logger.error(f"[ERROR] Azure sync failed: {e}")
+
+    ready = []
+    if online:
+        offline_mode.leave()
+    elif offline_mode.enter(db, probe=check_azure):
+        ready.append((*LCD_MESSAGES["offline"], "yellow", LCD_LINE_DELAY))
+        logger.warning("[WARN] Continuing in offline mode.")
+    else:
+        lcd.display("\n".join(failure_message), color="red")
+        return None
+
+    machine = db.get_machine(constants.MACHINE_ID)
     if not machine:
-        lcd.display(f"Machine {MACHINE_ID}", "not registered", color="red")
-        db.insert_machine_if_missing(MACHINE_ID, MACHINE_NAME, MACHINE_TYPE)
-        push_machine_status(MACHINE_ID)
-        logger.warning(f"[WARN] Machine {MACHINE_ID} not found. Inserting default.")
+        lcd.display(f"Machine {constants.MACHINE_ID}", "not registered", color="red")
+        db.insert_machine_if_missing(constants.MACHINE_ID, constants.MACHINE_NAME, constants.MACHINE_TYPE)
+        enqueue(KIND_MACHINE_STATUS, constants.MACHINE_ID, db=db)
+        logger.warning(f"[WARN] Machine {constants.MACHINE_ID} not found. Inserting default.")
 
-    machine = db.get_machine(MACHINE_ID)
+    machine = db.get_machine(constants.MACHINE_ID)
     if machine["machine_status"] == STATUS_MAINTENANCE:
-        lcd.display("\n".join(LCD_MESSAGES["maintenance"]), color="yellow")
+        lcd.display("\n".join(LCD_MESSAGES["maintenance"]).format(machine_name=constants.MACHINE_NAME), color="yellow")
         logger.warning("[HALT] Machine in maintenance mode.")
-        return False
-
-    db.update_machine_status(MACHINE_ID, STATUS_NEUTRAL)
-    db.update_machine_heartbeat(MACHINE_ID)
-    db.update_machine_device(MACHINE_ID, device_id)
-    logger.info(f"[PASS] Machine {MACHINE_ID} status updated to neutral.")
+        return None
+
+    with db.transaction():
+        db.update_machine_status(constants.MACHINE_ID, STATUS_NEUTRAL)
+        db.update_machine_heartbeat(constants.MACHINE_ID)
+        db.update_machine_device(constants.MACHINE_ID, constants.DEVICE_ID)
+        if online:
+            db.update_machine_ip(constants.MACHINE_ID, device_ip)
+    logger.info(f"[PASS] Machine {constants.MACHINE_ID} status updated to neutral.")
     logger.info(f"[PASS] Machine heartbeat updated.")
 
-    db.update_machine_ip(MACHINE_ID, device_ip)
-    push_machine_status(MACHINE_ID)
+    if online:
+        push_machine_status(constants.MACHINE_ID)
+    else:
+        enqueue(KIND_MACHINE_STATUS, constants.MACHINE_ID, db=db)
     logger.info(f"[PASS] Machine Status updated")
 
-    lcd.display(*LCD_MESSAGES["start"])
-    time.sleep(2)
-    lcd.display(*LCD_MESSAGES["startup_next"])
+    ready.append((*LCD_MESSAGES["start"], "white", LCD_LINE_DELAY))
+    ready.append((*LCD_MESSAGES["startup_next"], "white", 0))
 
-    time.sleep(LCD_LINE_DELAY)
-    return True
+    now = time.monotonic()
+    logger.info(f"[READY] Startup checks took {now - started:.2f}s, boot-to-ready {now - BOOT_TIME:.2f}s")
+    return ready
@@ -0,0 +1,131 @@
+# utils/structured_log.py
+"""
+File: structured_log.py
+Description:
+  Asynchronous JSON-lines logging. Logger calls only put the record on a bounded queue;
+  a background listener thread formats it and writes it to the rotating log file, so the
+  reader, validator and session code never wait on the SD card. When the queue fills up,
+  DEBUG records are dropped first, INFO is dropped rather than blocking, and WARNING and
+  above wait briefly for space. Per-module levels come from EMEC_LOG_LEVELS.
+"""
+
+import os
+import re
+import copy
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from config import constants
+from config.constants import (
+    LOG_PATH, LOG_BACKUP_DAYS, LOG_LEVEL, LOG_LEVELS,
+    LOG_QUEUE_SIZE, LOG_DEBUG_HIGH_WATER, LOG_BLOCK_TIMEOUT
+)
+from utils import metrics
+
+DROPPED = metrics.counter("emec_log_dropped_total", "Log records dropped because the queue was full, by level")
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+_TAG = re.compile(r"^\[([A-Z_]+)\]\s*")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    # One object per line: ts, level, logger, event, message, machine_id, then any extra
+    # fields (csu_id, session_id, latency_ms, ...). event defaults to the message's [TAG].
+    def format(self, record):
+        message = record.getMessage()
+        tag = _TAG.match(message)
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "event": tag.group(1).lower() if tag else record.name,
+            "message": message[tag.end():] if tag else message,
+            "machine_id": constants.MACHINE_ID,
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RESERVED)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    def __init__(self, maxsize=LOG_QUEUE_SIZE, debug_high_water=LOG_DEBUG_HIGH_WATER, block_timeout=LOG_BLOCK_TIMEOUT):
+        super().__init__(queue.Queue(maxsize))
+        self.debug_limit = int(maxsize * debug_high_water)
+        self.block_timeout = block_timeout
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the caller's thread; the writer must not
+        # touch objects the caller may still be changing
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if record.levelno <= logging.DEBUG and self.queue.qsize() >= self.debug_limit:
+            DROPPED.inc(level=record.levelname)
+            return
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc(level=record.levelname)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for the writer instead of raising
+        self.queue.put(self._sentinel)
+
+
+def parse_levels(spec):
+    # "azure_sync=DEBUG,rfid=WARNING" -> {"azure_sync": "DEBUG", "rfid": "WARNING"}
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(path=LOG_PATH, level=LOG_LEVEL, levels=LOG_LEVELS):
+    global _listener
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = TimedRotatingFileHandler(path, when="D", interval=1, backupCount=LOG_BACKUP_DAYS)
+    file_handler.setFormatter(JsonFormatter())
+
+    handler = BoundedQueueHandler()
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = _Listener(handler.queue, file_handler)
+    _listener.start()
+    # The writer is a daemon thread; drain it on any interpreter exit, not just the signal handler
+    atexit.register(stop_logging)
+    metrics.gauge("emec_log_queue_depth", "Log records waiting for the writer thread", handler.queue.qsize)
+    return handler
+
+
+def stop_logging():
+    # Drains the queue to disk; call last on shutdown. Safe to call more than once
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None